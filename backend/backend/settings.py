@@ -15,6 +15,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 
 import os
@@ -65,9 +66,12 @@ INSTALLED_APPS = [
    'predictor',
 ]
 CORS_ALLOW_ALL_ORIGINS = True  # for hackathon demo
+CORS_ALLOW_HEADERS = (*default_headers, "x-canvas-token")  # per-student Canvas token
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-Prompt-Tokens"]  # readable by the frontend (see ServerTimingMiddleware)
 
 
 MIDDLEWARE = [
+   "predictor.middleware.ServerTimingMiddleware",
    "corsheaders.middleware.CorsMiddleware",
    'django.middleware.security.SecurityMiddleware',
    'django.contrib.sessions.middleware.SessionMiddleware',
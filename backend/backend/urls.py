@@ -2,11 +2,17 @@ from django.contrib import admin
 from django.urls import path
 from predictor.views import (
     health_check,
+    metrics_view,
     explain_prediction,
     get_canvas_courses,
     get_canvas_category_grades,
     get_canvas_all_data,   # NEW
+    get_canvas_sync_status,
     predict_grade,
+    predict_grade_stream,
+    predict_grade_batch,
+    search_professor,
+    get_prediction_history,
 )
 
 urlpatterns = [
@@ -14,6 +20,8 @@ urlpatterns = [
 
     # Health + Explain
     path("api/health/", health_check),
+    path("api/metrics", metrics_view),
+    path("api/metrics/", metrics_view),
     path("api/explain/", explain_prediction),
 
     # Canvas
@@ -21,5 +29,13 @@ urlpatterns = [
     path("api/canvas/<int:course_id>/grades/", get_canvas_category_grades),
     path("api/canvas/all-data", get_canvas_all_data),
     path("api/canvas/all-data/", get_canvas_all_data),
+    path("api/canvas/sync/<str:job_id>/", get_canvas_sync_status),
+
+    # Professors
+    path("api/professors/search/", search_professor),
+
     path("api/predict-grade/", predict_grade),
+    path("api/predict-grade/stream/", predict_grade_stream),
+    path("api/predict-grade/batch/", predict_grade_batch),
+    path("api/predictions/history/", get_prediction_history),
 ]
@@ -1,16 +1,118 @@
 import json
+import os
 from openai import OpenAI
-from .utils import normalize_weights, clamp
+from .scoring import score_strengths, score_prediction, has_extra_credit
+from .syllabus_parser import parse_grading_breakdown
+from .llm_cache import get_cache, cache_key, LLM_CACHE_ENABLED
+from .singleflight import coalesce, get_group
+from .prompt_compaction import (
+    compact_json, fit_messages, messages_tokens, prompt_budget, relevant_syllabus, estimate_tokens,
+)
+from . import metrics
 
 client = OpenAI()  # env var automatically loads API key
 
+MODEL = "gpt-4o-mini"
+
+# bump a template's version whenever its prompt text changes so stale
+# cached completions are not served for the new prompt
+PROMPT_VERSIONS = {"strengths": 2, "weights": 2, "advice": 2}
+# templates answered in JSON mode
+JSON_TEMPLATES = ("strengths", "weights")
+
+# "local" (default) scores strengths with the NumPy engine; "llm" restores
+# the gpt-4o-mini round trip.
+STRENGTHS_MODE = os.getenv("STRENGTHS_MODE", "local")
+
+# parsed syllabus breakdowns at or above this confidence skip the LLM
+SYLLABUS_PARSER_MIN_CONFIDENCE = float(os.getenv("SYLLABUS_PARSER_MIN_CONFIDENCE", "0.8"))
+
+
+# ------------------ Cached Completions ------------------
+def _cache_key(template, inputs, params):
+    return cache_key(MODEL, template, PROMPT_VERSIONS[template], {"inputs": inputs, "params": params})
+
+
+# how inputs used to be serialized; only used to report what compaction saved
+def _indented_json(value):
+    return json.dumps(value, indent=2)
+
+
+def _record_usage(template, usage):
+    if usage is not None:
+        metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, template=template, kind="prompt")
+        metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, template=template, kind="completion")
+
+
+class ChatRequest:
+    """
+    One chat completion exactly as it is sent: messages held to the
+    template's token budget (prompt_budget) and the cache key it completes.
+    raw_tokens is the estimated size of the uncompacted prompt, for the
+    before/after report.
+    """
+
+    def __init__(self, template, inputs, messages, raw_tokens=None, **params):
+        self.template = template
+        self.messages = fit_messages(messages, prompt_budget(template))
+        self.raw_tokens = raw_tokens if raw_tokens is not None else messages_tokens(self.messages)
+        self.params = params
+        self.key = _cache_key(template, inputs, params)
+
+    def body(self):
+        return {"model": MODEL, "messages": self.messages, **self.params}
+
+
+def cache_completion(template, key, content):
+    """Store a completion obtained elsewhere (the Batch API) under its ChatRequest key."""
+    if template in JSON_TEMPLATES:
+        json.loads(content)  # never cache a completion we can't parse
+    get_cache().set(key, content)
+
+
+def _complete(request, llm_cache):
+    metrics.record_prompt_tokens(request.template, request.raw_tokens, messages_tokens(request.messages))
+    with metrics.upstream("openai"):
+        completion = client.chat.completions.create(**request.body())
+    _record_usage(request.template, completion.usage)
+    content = completion.choices[0].message.content
+    if request.template in JSON_TEMPLATES:
+        json.loads(content)  # never cache a completion we can't parse
+
+    if llm_cache is not None:
+        llm_cache.set(request.key, content)
+    return content
+
+
+def _chat(request):
+    """
+    One chat completion, served from the content-addressed cache when the
+    same (model, template version, inputs) was already completed (live, or
+    loaded by the precompute_llm_cache command). Identical completions
+    already in flight are joined rather than requested again.
+    """
+    llm_cache = get_cache() if LLM_CACHE_ENABLED else None
+
+    if llm_cache is not None:
+        cached = llm_cache.get(request.key)
+        if cached is not None:
+            return cached
+
+    return get_group("openai").do(request.key, _complete, request, llm_cache)
+
 
 # ------------------ 1. Compute Strengths ------------------
-def compute_strengths(category_means, default_overall):
-    strengths_prompt = f"""
+def compute_strengths(category_means, default_overall, mode=None):
+    if (mode or STRENGTHS_MODE) == "llm":
+        return _compute_strengths_llm(category_means, default_overall)
+    return score_strengths(category_means, default_overall)
+
+
+def _strengths_prompt(category_means, default_overall, dumps=compact_json):
+    return f"""
 You are given a student's historical Canvas performance by category (percent 0-100), possibly with nulls:
 
-{json.dumps(category_means, indent=2)}
+{dumps(category_means)}
 
 Return pure JSON with:
 - "category_strengths": object with keys "projects","assignments","exams","participation" (0-100 floats).
@@ -23,129 +125,118 @@ Rules:
 - Do NOT include any extra fields or prose. JSON only.
 """
 
+
+def _compute_strengths_llm(category_means, default_overall):
+    strengths_prompt = _strengths_prompt(category_means, default_overall)
+    raw_prompt = _strengths_prompt(category_means, default_overall, dumps=_indented_json)
+
     try:
-        stage = client.chat.completions.create(
-            model="gpt-4o-mini",
+        content = _chat(ChatRequest(
+            "strengths",
+            {"category_means": category_means, "default_overall": default_overall},
             messages=[
                 {"role": "system", "content": "Return JSON only."},
                 {"role": "user", "content": strengths_prompt},
             ],
+            raw_tokens=messages_tokens([{"content": "Return JSON only."}, {"content": raw_prompt}]),
             response_format={"type": "json_object"},
-        )
-        return json.loads(stage.choices[0].message.content)
+        ))
+        return json.loads(content)
 
     except Exception as e:
-        cs = {
-            k: (category_means[k] if category_means[k] is not None else default_overall)
-            for k in ["projects", "assignments", "exams", "participation"]
-        }
         return {
-            "category_strengths": cs,
-            "overall_strength": float(sum(cs.values()) / 4.0),
-            "punctual_strength": 100.0,
+            **score_strengths(category_means, default_overall),
             "_note": f"AI strengths fallback due to: {e}",
         }
 
 
 # ------------------ 2. Compute Prediction ------------------
-def compute_prediction(strengths, syllabus_text, rmp_pack):
-    prediction_prompt = """
-Use the provided data to produce a JSON object with:
-- "projects","assignments","exams","participation": syllabus weights as percentages (floats), each 0–100, sum ≈ 100.
-- "final_score": number (0–100)
-- "margin_of_error": number (e.g., 3,4,6)
-- "range": [low, high] (floats, clamped 0–100)
-
-Inputs:
-1) strengths: student's category_strengths (0–100), overall_strength, punctual_strength.
-2) syllabus: free text that may mention grading breakdowns.
-3) rmp: { "avg_difficulty": 0–5 or null, "would_take_again_percent": 0–100 or null }.
-
-Method:
-- Parse syllabus text to infer weights. If unclear, use defaults: projects=25, assignments=35, exams=35, participation=5.
-- Normalize weights to sum to 100.
-- Base score = sum(strength[cat] * weight[cat]/100 for each category).
-- Difficulty drag: if rmp.avg_difficulty:
-    4.0–5.0  => -3
-    3.3–3.99 => -2
-    2.7–3.29 => -1
-    else     => 0
-- Punctual bonus: if punctual_strength > 90 => +2, else +0.
-- Extra credit: if syllabus text explicitly mentions "extra credit" => +3.
-- Margin of error:
-    if rmp.would_take_again_percent is null => 5
-    elif <30 => 6
-    elif 30–100 => 4
-    else => 3
-- Clamp final_score to 0–100; range = [final_score - margin, final_score + margin] clamped to 0–100.
+# The grading formula (base score, difficulty drag, bonuses, margin bands,
+# clamping) runs locally in scoring.py; the model is only asked for the one
+# fuzzy part, pulling the grading breakdown out of free-form syllabus text.
+WEIGHTS_PROMPT = """
+Extract the grading breakdown from the syllabus below as a JSON object with keys
+"projects", "assignments", "exams", "participation": percentages (floats, 0-100).
+
+Map each syllabus component to the closest key:
+- exams: exams, midterms, finals, quizzes, tests
+- projects: projects, capstones, labs
+- participation: participation, attendance, discussion, polls, peer review
+- assignments: homework, assignments and anything else
 
+If the syllabus does not state a breakdown, return null for every key.
 Return JSON only.
 """
-    ai_inputs = {
-        "strengths": strengths,
-        "rmp": rmp_pack,
-        "syllabus": syllabus_text,
-    }
 
-    try:
-        stage2 = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Return JSON only."},
-                {"role": "user", "content": prediction_prompt},
-                {"role": "user", "content": json.dumps(ai_inputs, indent=2)},
-            ],
-            response_format={"type": "json_object"},
-        )
-        final = json.loads(stage2.choices[0].message.content)
 
-    except Exception as e:
-        defaults = {"projects": 25.0, "assignments": 35.0, "exams": 35.0, "participation": 5.0}
-        cs = strengths.get("category_strengths", {})
-        base = sum(float(cs.get(k, 85.0)) * (defaults[k] / 100.0) for k in defaults)
-        margin = 5.0
-        final = {
-            **defaults,
-            "final_score": clamp(base),
-            "margin_of_error": margin,
-            "range": [clamp(base - margin), clamp(base + margin)],
-            "_note": f"prediction fallback due to: {e}",
-        }
+def parsed_weights(syllabus_text):
+    """The locally parsed breakdown when the parser is confident, else None (the model is asked)."""
+    # most syllabi state the breakdown literally
+    parsed = parse_grading_breakdown(syllabus_text)
+    if parsed.weights and parsed.confidence >= SYLLABUS_PARSER_MIN_CONFIDENCE:
+        return parsed.weights
+    return None
 
-    # Normalize weights exactly as original
-    weights = {}
-    for k in ["projects", "assignments", "exams", "participation"]:
-        try:
-            weights[k] = float(final.get(k)) if final.get(k) is not None else None
-        except Exception:
-            weights[k] = None
 
-    if any(v is None for v in weights.values()):
-        weights = {"projects": 25.0, "assignments": 35.0, "exams": 35.0, "participation": 5.0}
+def weights_request(syllabus_text):
+    # only the grading-relevant passages go to the model (and into the cache
+    # key, so syllabi differing only in office hours share a completion)
+    relevant = relevant_syllabus(syllabus_text, prompt_budget("weights") - estimate_tokens(WEIGHTS_PROMPT) - 12)
+    return ChatRequest(
+        "weights",
+        {"syllabus": relevant},
+        messages=[
+            {"role": "system", "content": "Return JSON only."},
+            {"role": "user", "content": WEIGHTS_PROMPT},
+            {"role": "user", "content": relevant},
+        ],
+        raw_tokens=messages_tokens([{"content": "Return JSON only."}, {"content": WEIGHTS_PROMPT},
+                                    {"content": syllabus_text}]),
+        response_format={"type": "json_object"},
+    )
 
-    weights = normalize_weights(weights)
 
-    final["projects"] = round(weights["projects"], 2)
-    final["assignments"] = round(weights["assignments"], 2)
-    final["exams"] = round(weights["exams"], 2)
-    final["participation"] = round(weights["participation"], 2)
+def extract_weights(syllabus_text):
+    """Returns (weights or None, source, note or None)."""
+    if not syllabus_text:
+        return None, "default", None
 
+    weights = parsed_weights(syllabus_text)
+    if weights:
+        return weights, "parser", None
+
+    try:
+        content = _chat(weights_request(syllabus_text))
+        return json.loads(content), "llm", None
+
+    except Exception as e:
+        return None, "default", f"weight extraction fallback due to: {e}"
+
+
+@coalesce("prediction")
+def compute_prediction(strengths, syllabus_text, rmp_pack):
+    weights, source, note = extract_weights(syllabus_text)
+    final = score_prediction(strengths, weights, rmp_pack, extra_credit=has_extra_credit(syllabus_text))
+    final["weights_source"] = source
+    if note:
+        final["_note"] = note
     return final
 
 
 # ------------------ 3. Compute Advice ------------------
-def compute_advice(final, strengths, course_name, rmp_pack):
-    advice_prompt = f"""
+ADVICE_MAX_TOKENS = 600
+
+
+def _advice_prompt(final, strengths, course_name, rmp_pack, dumps=compact_json):
+    # null fields carry nothing the model can use
+    professor = {k: v for k, v in rmp_pack.items() if v is not None} if isinstance(rmp_pack, dict) else rmp_pack
+    weights = {k: final.get(k) for k in ("projects", "assignments", "exams", "participation")}
+    return f"""
 A student is considering "{course_name}".
 Predicted grade: {final.get("final_score")} ±{final.get("margin_of_error")}.
-Strengths: {json.dumps(strengths.get("category_strengths"), indent=2)}.
-Syllabus weights: {{
-  projects: {final.get("projects")},
-  assignments: {final.get("assignments")},
-  exams: {final.get("exams")},
-  participation: {final.get("participation")}
-}}
-Professor info: {rmp_pack}.
+Strengths: {dumps(strengths.get("category_strengths"))}.
+Syllabus weights: {dumps(weights)}
+Professor info: {dumps(professor)}.
 
 Write advice in 3 sections. Each section must be 5–6 sentences minimum:
 
@@ -159,13 +250,67 @@ Final Verdict:
 ...
 Do NOT use markdown. No bullet points. Plain text only.
 """
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": advice_prompt}],
-            max_tokens=600,
+
+
+def advice_request(final, strengths, course_name, rmp_pack):
+    advice_prompt = _advice_prompt(final, strengths, course_name, rmp_pack)
+    raw_prompt = _advice_prompt(final, strengths, course_name, rmp_pack, dumps=_indented_json)
+    return ChatRequest(
+        "advice",
+        {"prompt": advice_prompt},
+        messages=[{"role": "user", "content": advice_prompt}],
+        raw_tokens=messages_tokens([{"content": raw_prompt}]),
+        max_tokens=ADVICE_MAX_TOKENS,
+    )
+
+
+def compute_advice(final, strengths, course_name, rmp_pack):
+    # errors propagate: the caller decides on the placeholder text (and
+    # predict-grade doesn't memoize a response without real advice)
+    return _chat(advice_request(final, strengths, course_name, rmp_pack)).strip()
+
+
+def compute_advice_stream(final, strengths, course_name, rmp_pack, prompt_tokens=None):
+    """
+    Yield advice text as it is generated (OpenAI streaming API). A cached
+    completion is yielded in one piece; a freshly streamed one is cached
+    once it has finished. Errors propagate, possibly after some text.
+
+    The stream is consumed after the response headers are sent, so the
+    caller can pass a `prompt_tokens` dict to receive the advice prompt's
+    (before, after) token counts instead of X-Prompt-Tokens.
+    """
+    request = advice_request(final, strengths, course_name, rmp_pack)
+    llm_cache = get_cache() if LLM_CACHE_ENABLED else None
+
+    cached = llm_cache.get(request.key) if llm_cache is not None else None
+    if cached is not None:
+        yield cached.strip()
+        return
+
+    sent_tokens = messages_tokens(request.messages)
+    metrics.record_prompt_tokens("advice", request.raw_tokens, sent_tokens)
+    if prompt_tokens is not None:
+        prompt_tokens["advice"] = (request.raw_tokens, sent_tokens)
+    parts = []
+    # timed up to the first byte; the rest is the client reading the stream
+    with metrics.upstream("openai"):
+        stream = client.chat.completions.create(
+            **request.body(),
+            stream=True,
+            stream_options={"include_usage": True},
         )
-        return completion.choices[0].message.content.strip()
+    for chunk in stream:
+        _record_usage("advice", getattr(chunk, "usage", None))
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            # hold back leading whitespace, like .strip() on the blocking path
+            if not parts:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            parts.append(delta)
+            yield delta
 
-    except Exception as e:
-        return f"(Advice unavailable due to error: {e})"
+    if llm_cache is not None and parts:
+        llm_cache.set(request.key, "".join(parts))
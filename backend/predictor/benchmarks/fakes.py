@@ -0,0 +1,519 @@
+"""
+Local stand-ins for every upstream the backend talks to, for benchmarks.
+
+Canvas, OpenAI and Supabase are real HTTP servers on 127.0.0.1 (so the
+actual clients, connection pools and retries are exercised); RMP is patched
+in-process because RateMyProfessor_Database_APIs hard-codes its endpoints.
+Every fake counts the calls it serves and can add a fixed latency per call.
+"""
+import json
+import re
+import threading
+import time
+import types
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import RateMyProfessor_Database_APIs
+
+
+# ------------------ HTTP Base ------------------
+class FakeUpstream:
+    """Threaded HTTP/1.1 server on an ephemeral port; subclasses implement route()."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else None
+                if body and (self.headers.get("Content-Type") or "").startswith("application/json"):
+                    body = json.loads(body)
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                status, headers, payload = fake.route(method, parsed.path, parse_qs(parsed.query), body, self.headers)
+                fake.count(method, parsed.path)
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+
+                if isinstance(payload, types.GeneratorType):
+                    # streamed responses are delimited by closing the connection
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for chunk in payload:
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+                    self.close_connection = True
+                    return
+
+                if isinstance(payload, bytes):
+                    data = payload
+                else:
+                    data = b"" if payload is None else json.dumps(payload).encode()
+                    if data:
+                        self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def count(self, method, path):
+        with self._lock:
+            self.calls[f"{method} {self.route_name(path)}"] += 1
+
+    def route_name(self, path):
+        return path
+
+    @property
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def route(self, method, path, query, body, headers):
+        raise NotImplementedError
+
+
+# ------------------ Canvas ------------------
+CANVAS_GROUPS = ["Exams", "Homework", "Projects", "Participation"]
+
+
+class FakeCanvas(FakeUpstream):
+    """
+    Canvas REST API for one student: `courses` courses (half of them
+    concluded), each with CANVAS_GROUPS assignment groups. List endpoints
+    are paginated at `page_size` with Link headers, and assignment_groups
+    honours If-None-Match.
+    """
+
+    def __init__(self, courses=20, assignments_per_group=6, page_size=10, latency=0.0):
+        super().__init__(latency)
+        self.page_size = page_size
+        self.assignments_per_group = assignments_per_group
+        past = (datetime.now(timezone.utc) - timedelta(days=90)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        future = (datetime.now(timezone.utc) + timedelta(days=90)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.courses = [
+            {
+                "id": 1000 + i,
+                "name": f"Benchmark Course {i}",
+                "course_code": f"{['CS', 'MATH', 'STAT', 'ENGCMP'][i % 4]} {100 + i}",
+                "term": {"name": f"Term {i % 3}", "end_at": past if i % 2 else future},
+            }
+            for i in range(courses)
+        ]
+        self._by_id = {c["id"]: c for c in self.courses}
+
+    def route_name(self, path):
+        parts = path.rstrip("/").split("/")
+        return "/".join(":id" if p.isdigit() else p for p in parts)
+
+    def _page(self, items, path, query):
+        per_page = min(int(query.get("per_page", [self.page_size])[0]), self.page_size)
+        page = int(query.get("page", ["1"])[0])
+        start = (page - 1) * per_page
+        headers = {}
+        if start + per_page < len(items):
+            next_query = {k: v for k, v in query.items() if k not in ("page", "per_page")}
+            next_query.update(page=[str(page + 1)], per_page=[str(per_page)])
+            headers["Link"] = f'<{self.url}{path}?{urlencode(next_query, doseq=True)}>; rel="next"'
+        return 200, headers, items[start:start + per_page]
+
+    def _groups(self, cid):
+        return [
+            {
+                "id": cid * 10 + g,
+                "name": name,
+                "group_weight": 25,
+                "assignments": [
+                    {"id": (cid * 10 + g) * 100 + a, "name": f"{name} {a}", "points_possible": 10}
+                    for a in range(self.assignments_per_group)
+                ],
+            }
+            for g, name in enumerate(CANVAS_GROUPS)
+        ]
+
+    def _submissions(self, cid):
+        return [
+            {"assignment_id": a["id"], "score": 6 + (a["id"] % 5), "graded_at": "2024-01-01T00:00:00Z"}
+            for g in self._groups(cid)
+            for a in g["assignments"]
+        ]
+
+    def route(self, method, path, query, body, headers):
+        parts = path.rstrip("/").split("/")
+        if path.rstrip("/").endswith("/courses"):
+            return self._page(self.courses, path, query)
+
+        cid = int(parts[parts.index("courses") + 1])
+        course = self._by_id.get(cid)
+        if course is None:
+            return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+
+        tail = parts[-1]
+        if tail == "assignment_groups":
+            etag = f'"groups-{cid}"'
+            if headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, None
+            status, page_headers, items = self._page(self._groups(cid), path, query)
+            return status, {**page_headers, "ETag": etag}, items
+        if tail == "submissions":
+            subs = self._submissions(cid)
+            since = query.get("graded_since", [None])[0]
+            if since:
+                subs = [s for s in subs if s["graded_at"] > since]
+            return self._page(subs, path, query)
+        if tail == "enrollments":
+            return 200, {}, [{"grades": {"current_score": 88.5, "current_grade": "B+"}}]
+        return 200, {}, {k: course[k] for k in ("id", "name", "course_code")}
+
+
+# ------------------ OpenAI ------------------
+FAKE_WEIGHTS = {"projects": 20, "assignments": 30, "exams": 40, "participation": 10}
+FAKE_ADVICE = "Keep up with the weekly work, start projects early and review before every exam."
+
+
+class FakeOpenAI(FakeUpstream):
+    """
+    /v1/chat/completions in JSON, text and streamed (SSE) modes, plus the
+    Batch API (/v1/files, /v1/batches): a batch reports in_progress for
+    `batch_polls` status checks, then completed with one output line per
+    request.
+    """
+
+    def __init__(self, latency=0.0, batch_polls=1):
+        super().__init__(latency)
+        self.batch_polls = batch_polls
+        self.files = {}
+        self.batches = {}
+
+    def route_name(self, path):
+        return re.sub(r"/(file|batch)-[0-9a-f]+", r"/{\1_id}", path)
+
+    def route(self, method, path, query, body, headers):
+        if path.endswith("/files") and method == "POST":
+            return self._upload(body, headers)
+        if path.endswith("/batches") and method == "POST":
+            return self._create_batch(body)
+        match = re.search(r"/batches/(batch-[0-9a-f]+)$", path)
+        if match and match.group(1) in self.batches:
+            return 200, {}, self._poll_batch(match.group(1))
+        match = re.search(r"/files/(file-[0-9a-f]+)/content$", path)
+        if match and match.group(1) in self.files:
+            return 200, {"Content-Type": "application/octet-stream"}, self.files[match.group(1)]
+        if not path.endswith("/chat/completions"):
+            return 404, {}, {"error": {"message": f"unknown path {path}"}}
+        return self._completion(body)
+
+    def _completion(self, body):
+        model = body.get("model")
+        # roughly 4 characters per token
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return 200, {"Content-Type": "text/event-stream"}, self._stream(model, prompt_tokens if include_usage else None)
+
+        content = json.dumps(FAKE_WEIGHTS) if body.get("response_format") else FAKE_ADVICE
+        return 200, {}, {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": self._usage(prompt_tokens, content),
+        }
+
+    def _store(self, data):
+        file_id = f"file-{uuid.uuid4().hex}"
+        with self._lock:
+            self.files[file_id] = data
+        return file_id
+
+    def _upload(self, body, headers):
+        # multipart/form-data with a "purpose" field and a "file" part
+        boundary = headers.get("Content-Type", "").partition("boundary=")[2].strip('"').encode()
+        data = b""
+        for part in body.split(b"--" + boundary):
+            head, _, content = part.partition(b"\r\n\r\n")
+            if b'name="file"' in head:
+                data = content[:-2] if content.endswith(b"\r\n") else content
+        file_id = self._store(data)
+        return 200, {}, {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                         "filename": "batch.jsonl", "purpose": "batch", "status": "processed"}
+
+    def _create_batch(self, body):
+        batch_id = f"batch-{uuid.uuid4().hex}"
+        lines = [json.loads(line) for line in self.files.get(body["input_file_id"], b"").splitlines() if line.strip()]
+        output = []
+        for line in lines:
+            status, _, response = self._completion(line["body"])
+            output.append({"id": f"batch_req-{uuid.uuid4().hex}", "custom_id": line["custom_id"],
+                           "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": response},
+                           "error": None})
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "metadata": body.get("metadata"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            "_output": "".join(json.dumps(o) + "\n" for o in output).encode(),
+            "_polls": 0,
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        return 200, {}, self._public(batch)
+
+    def _poll_batch(self, batch_id):
+        with self._lock:
+            batch = self.batches[batch_id]
+            batch["_polls"] += 1
+            finished = batch["_polls"] > self.batch_polls and batch["status"] != "completed"
+        if finished:
+            batch.update(status="completed", completed_at=int(time.time()), output_file_id=self._store(batch["_output"]),
+                         request_counts={**batch["request_counts"], "completed": batch["request_counts"]["total"]})
+        elif batch["status"] == "validating":
+            batch["status"] = "in_progress"
+        return self._public(batch)
+
+    @staticmethod
+    def _public(batch):
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    @staticmethod
+    def _usage(prompt_tokens, content):
+        completion_tokens = len(content) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _stream(self, model, prompt_tokens=None):
+        for word in FAKE_ADVICE.split(" "):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        if prompt_tokens is not None:
+            usage = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [], "usage": self._usage(prompt_tokens, FAKE_ADVICE)}
+            yield f"data: {json.dumps(usage)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+
+# ------------------ Supabase ------------------
+def _postgrest_split(text):
+    # split on top-level commas, respecting (...) nesting and "quoted" values
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _postgrest_value(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _postgrest_compare(actual, op, expected):
+    if actual is None:
+        return False
+    try:
+        a, b = float(actual), float(expected)
+    except (TypeError, ValueError):
+        a, b = str(actual), expected
+    return {"eq": a == b, "neq": a != b, "lt": a < b, "lte": a <= b, "gt": a > b, "gte": a >= b}[op]
+
+
+def _postgrest_match(row, condition):
+    """One condition: "col.op.value", "and(...)" or "or(...)"."""
+    for group, combine in (("and(", all), ("or(", any)):
+        if condition.startswith(group):
+            return combine(_postgrest_match(row, c) for c in _postgrest_split(condition[len(group):-1]))
+    column, op, value = condition.split(".", 2)
+    return _postgrest_compare(row.get(column), op, _postgrest_value(value))
+
+
+class FakeSupabase(FakeUpstream):
+    """
+    PostgREST subset: bulk POST /rest/v1/<table> (filling in id/timestamp
+    like column defaults) and GET with select, column filters (eq, lt, ...),
+    or=(...), order and limit.
+
+    Integer columns refuse values that aren't integers, failing the whole
+    insert like PostgreSQL does; `available = False` answers every call
+    with a 503 until it is set back.
+    """
+
+    INTEGER_COLUMNS = ("id", "professor_id")
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.tables = {}
+        self.available = True
+        self._next_id = 1
+
+    @staticmethod
+    def _bad_integer(value):
+        if value is None or isinstance(value, int):
+            return False
+        try:
+            int(str(value))
+            return False
+        except ValueError:
+            return True
+
+    def route(self, method, path, query, body, headers):
+        if not self.available:
+            return 503, {}, {"code": "PGRST001", "message": "Could not connect with the database", "hint": None,
+                             "details": None}
+        table = path.rstrip("/").split("/")[-1]
+        rows = self.tables.setdefault(table, [])
+        if method == "POST":
+            batch = body if isinstance(body, list) else [body]
+            for row in batch:
+                for column in self.INTEGER_COLUMNS:
+                    if self._bad_integer(row.get(column)):
+                        return 400, {}, {"code": "22P02", "hint": None, "details": None,
+                                         "message": f'invalid input syntax for type bigint: "{row[column]}"'}
+            with self._lock:
+                for row in batch:
+                    row.setdefault("id", self._next_id)
+                    row.setdefault("timestamp", datetime.now(timezone.utc).isoformat())
+                    self._next_id += 1
+                rows.extend(batch)
+            return 201, {}, batch
+
+        with self._lock:
+            result = list(rows)
+        for name, values in query.items():
+            if name in ("select", "order", "limit", "offset"):
+                continue
+            for value in values:
+                condition = f"or({value[1:-1]})" if name == "or" else f"{name}.{value}"
+                result = [r for r in result if _postgrest_match(r, condition)]
+
+        for spec in reversed(query.get("order", [""])[0].split(",")):
+            if spec:
+                column, _, direction = spec.partition(".")
+                result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction.startswith("desc"))
+        if "limit" in query:
+            result = result[:int(query["limit"][0])]
+
+        columns = [c for c in query.get("select", ["*"])[0].split(",") if c]
+        if columns and columns != ["*"]:
+            result = [{c: r.get(c) for c in columns} for r in result]
+        return 200, {}, result
+
+    @property
+    def rows_written(self):
+        return sum(len(rows) for rows in self.tables.values())
+
+
+# ------------------ RMP ------------------
+class FakeRMP:
+    """Replaces the RateMyProfessor_Database_APIs fetchers in-process."""
+
+    def __init__(self, latency=0.0, school_size=500):
+        self.latency = latency
+        self.school_size = school_size
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._originals = None
+
+    def professor(self, legacy_id, school_id=1381):
+        legacy_id = int(legacy_id)
+        return types.SimpleNamespace(
+            legacy_id=legacy_id,
+            first_name=["Ada", "Grace", "Alan", "Barbara", "Edsger"][legacy_id % 5],
+            last_name=f"Prof{legacy_id}",
+            department="Computer Science",
+            school={"legacyId": school_id, "name": "Benchmark University"},
+            avg_rating=3.0 + (legacy_id % 20) / 10,
+            avg_difficulty=2.0 + (legacy_id % 25) / 10,
+            num_ratings=legacy_id % 80,
+            would_take_again_percent=float(legacy_id % 100),
+        )
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def fetch_a_professor(self, professor_id):
+        self._call("fetch_a_professor")
+        return self.professor(professor_id)
+
+    def fetch_all_professors_from_a_school(self, school_id):
+        self._call("fetch_all_professors_from_a_school")
+        return [self.professor(i, int(school_id)) for i in range(1, self.school_size + 1)]
+
+    @property
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def start(self):
+        module = RateMyProfessor_Database_APIs
+        self._originals = (module.fetch_a_professor, module.fetch_all_professors_from_a_school)
+        module.fetch_a_professor = self.fetch_a_professor
+        module.fetch_all_professors_from_a_school = self.fetch_all_professors_from_a_school
+        return self
+
+    def stop(self):
+        if self._originals:
+            module = RateMyProfessor_Database_APIs
+            module.fetch_a_professor, module.fetch_all_professors_from_a_school = self._originals
+            self._originals = None
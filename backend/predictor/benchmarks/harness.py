@@ -0,0 +1,235 @@
+"""
+Offline load harness: points the backend at the fakes in fakes.py, drives
+the Django endpoints through the test client and reports latency
+percentiles, throughput and upstream call counts per scenario.
+"""
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.test import Client
+from openai import OpenAI
+
+from predictor import (
+    ai_service, canvas_client, canvas_store, llm_cache, prediction_cache, professor_search, rmp_store, singleflight,
+    supabase_service, sync_jobs, views,
+)
+
+# a PostgREST-shaped key; the fake never checks it
+FAKE_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark"
+
+
+# ------------------ Environment ------------------
+class OfflineEnvironment:
+    """
+    Context manager that starts the fakes and rewires every module-level
+    client, store path and singleton to them (and a temp dir), restoring
+    the originals on exit.
+    """
+
+    def __init__(self, canvas, openai, rmp, supabase, use_llm_cache=False, use_prediction_cache=False):
+        self.canvas = canvas
+        self.openai = openai
+        self.rmp = rmp
+        self.supabase = supabase
+        self.use_llm_cache = use_llm_cache
+        self.use_prediction_cache = use_prediction_cache
+        self._patched = []
+        self._tmp = None
+
+    def _patch(self, obj, name, value):
+        self._patched.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def __enter__(self):
+        for fake in (self.canvas, self.openai, self.rmp, self.supabase):
+            fake.start()
+        self._tmp = tempfile.TemporaryDirectory(prefix="predictor-bench-")
+        tmp = Path(self._tmp.name)
+
+        self._patch(canvas_client, "_client", canvas_client.CanvasClient(
+            canvas_client.CanvasSettings(base_url=f"{self.canvas.url}/api/v1", token="bench"),
+        ))
+        canvas_client.close_async_client()
+        # the scenarios send no X-Canvas-Token: one student, CANVAS_TOKEN
+        self._patch(canvas_client, "CANVAS_SINGLE_USER", True)
+        self._patch(sync_jobs, "_runner", None)
+        self._patch(canvas_store, "STORE_PATH", tmp / "canvas_store.sqlite3")
+        self._patch(canvas_store, "CANVAS_STORE_DIR", tmp / "canvas_users")
+        canvas_store.invalidate()
+
+        self._patch(ai_service, "client", OpenAI(base_url=f"{self.openai.url}/v1", api_key="bench", max_retries=0))
+        self._patch(ai_service, "LLM_CACHE_ENABLED", self.use_llm_cache)
+        self._patch(llm_cache, "_cache", llm_cache.LLMCache(persistent=llm_cache.SQLiteBackend(tmp / "llm_cache.sqlite3")))
+        self._patch(views, "PREDICTION_CACHE_ENABLED", self.use_prediction_cache)
+        self._patch(prediction_cache, "_cache", prediction_cache.PredictionCache())
+
+        self._patch(rmp_store, "RMP_STORE_PATH", tmp / "rmp_store.sqlite3")
+        self._patch(rmp_store, "_local", threading.local())
+        self._patch(professor_search, "_index", None)
+
+        self._patch(supabase_service, "SUPABASE_URL", self.supabase.url)
+        self._patch(supabase_service, "SUPABASE_KEY", FAKE_SUPABASE_KEY)
+        self._patch(supabase_service, "_read_client", None)
+        self._patch(supabase_service, "_history_cache", llm_cache.MemoryLRU(ttl=supabase_service.HISTORY_CACHE_TTL))
+        self._patch(supabase_service, "_writer", supabase_service.PredictionLogWriter(
+            client_factory=supabase_service.get_supabase,
+            flush_interval=0.1,
+            spool=supabase_service.LogSpool(tmp / "prediction_spool.sqlite3"),
+        ))
+        return self
+
+    def __exit__(self, *exc):
+        supabase_service.get_log_writer().flush(5.0)
+        canvas_client.close_async_client()
+        for obj, name, value in reversed(self._patched):
+            setattr(obj, name, value)
+        canvas_store.invalidate()
+        for fake in (self.canvas, self.openai, self.rmp, self.supabase):
+            fake.stop()
+        self._tmp.cleanup()
+
+    def upstream_calls(self):
+        supabase_service.get_log_writer().flush(5.0)
+        return {
+            "canvas": self.canvas.total_calls,
+            "openai": self.openai.total_calls,
+            "rmp": self.rmp.total_calls,
+            "supabase": self.supabase.total_calls,
+            "coalesced": sum(g["coalesced"] for g in singleflight.stats().values()),
+        }
+
+
+# ------------------ Load ------------------
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run_load(env, name, make_request, requests, concurrency):
+    """
+    Fire `requests` calls of make_request(client, i) from `concurrency`
+    threads (one test client each). A call counts as an error when the
+    response status is not 2xx.
+    """
+    local = threading.local()
+
+    def one(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = Client(HTTP_HOST="localhost")
+        start = time.perf_counter()
+        try:
+            response = make_request(client, i)
+            ok = 200 <= response.status_code < 300
+            if getattr(response, "streaming", False):
+                b"".join(response.streaming_content)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    before = env.upstream_calls()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+    after = env.upstream_calls()
+
+    latencies = [s for s, _ in samples]
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, ok in samples if not ok),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": requests / wall if wall else None,
+        "upstream": {k: after[k] - before[k] for k in after},
+    }
+
+
+# ------------------ Scenarios ------------------
+PARSEABLE_SYLLABUS = "Grading: Exams {e}%, Projects {p}%, Homework {h}%, Participation 5%."
+FREEFORM_SYLLABUS = (
+    "Course {i}. Your grade reflects the instructor's overall judgement of your exams, "
+    "projects and weekly problem sets; see the course site for details."
+)
+
+
+def syllabi(count):
+    texts = []
+    for i in range(count):
+        if i % 2 == 0:
+            exams = 30 + (i % 4) * 5
+            texts.append(PARSEABLE_SYLLABUS.format(e=exams, p=35 - (i % 4) * 5, h=30))
+        else:
+            texts.append(FREEFORM_SYLLABUS.format(i=i))
+    return texts
+
+
+def predict_payload(i, course_ids, professors, texts):
+    return {
+        "professor_id": 1 + i % professors,
+        "syllabus_text": texts[i % len(texts)],
+        "canvas_course_id": course_ids[i % len(course_ids)],
+    }
+
+
+def run_scenarios(env, scenarios, requests=100, concurrency=8, professors=5, syllabus_count=4, sync_runs=3,
+                  batch_size=5):
+    texts = syllabi(syllabus_count)
+    course_ids = [c["id"] for c in env.canvas.courses]
+    results = []
+
+    def post_json(client, path, payload):
+        return client.post(path, json.dumps(payload), content_type="application/json")
+
+    # a Canvas sync always runs first: predictions need the stored history
+    results.append(run_load(env, "all-data (full)", lambda c, i: c.get("/api/canvas/all-data/?full=1&wait=25"), 1, 1))
+    if "all-data" in scenarios:
+        results.append(run_load(
+            env, "all-data (incremental)", lambda c, i: c.get("/api/canvas/all-data/?wait=25"), sync_runs, 1,
+        ))
+
+    if "predict" in scenarios:
+        results.append(run_load(
+            env, "predict-grade",
+            lambda c, i: post_json(c, "/api/predict-grade/", predict_payload(i, course_ids, professors, texts)),
+            requests, concurrency,
+        ))
+
+    if "predict-stream" in scenarios:
+        results.append(run_load(
+            env, "predict-grade/stream",
+            lambda c, i: post_json(c, "/api/predict-grade/stream/", predict_payload(i, course_ids, professors, texts)),
+            requests, concurrency,
+        ))
+
+    if "predict-batch" in scenarios:
+        results.append(run_load(
+            env, f"predict-grade/batch x{batch_size}",
+            lambda c, i: post_json(c, "/api/predict-grade/batch/", {
+                "items": [predict_payload(i * batch_size + j, course_ids, professors, texts) for j in range(batch_size)]
+            }),
+            max(1, requests // batch_size), concurrency,
+        ))
+
+    return results
+
+
+def format_report(results):
+    header = f"{'scenario':<28}{'n':>5}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}   upstream calls"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        upstream = " ".join(f"{k}={v}" for k, v in r["upstream"].items())
+        lines.append(
+            f"{r['scenario']:<28}{r['requests']:>5}{r['errors']:>5}"
+            f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['throughput_rps']:>8.1f}   {upstream}"
+        )
+    return "\n".join(lines)
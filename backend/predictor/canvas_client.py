@@ -0,0 +1,361 @@
+import asyncio
+import copy
+import functools
+import hashlib
+import os
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import metrics
+
+CANVAS_API_URL = os.getenv("CANVAS_API_URL", "https://canvas.pitt.edu/api/v1")
+CANVAS_TOKEN = os.getenv("CANVAS_TOKEN")
+
+# store key of the account behind CANVAS_TOKEN (the single-user setup)
+DEFAULT_ACCOUNT = "default"
+# requests without their own token act as the CANVAS_TOKEN account only when
+# this is on; otherwise anyone could read (and re-sync) the operator's data
+CANVAS_SINGLE_USER = os.getenv("CANVAS_SINGLE_USER", "false").lower() in ("1", "true", "yes")
+
+# Upper bound on Canvas requests in flight at once; also the keep-alive pool size.
+CANVAS_MAX_CONCURRENCY = int(os.getenv("CANVAS_MAX_CONCURRENCY", "16"))
+CANVAS_MAX_RETRIES = int(os.getenv("CANVAS_MAX_RETRIES", "4"))
+CANVAS_BACKOFF_FACTOR = float(os.getenv("CANVAS_BACKOFF_FACTOR", "0.5"))
+CANVAS_TIMEOUT = float(os.getenv("CANVAS_TIMEOUT", "30"))
+CANVAS_PER_PAGE = 100
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CanvasSettings:
+    """Where and how to reach Canvas; shared by the sync and async clients."""
+
+    def __init__(self, base_url=CANVAS_API_URL, token=CANVAS_TOKEN, pool_size=CANVAS_MAX_CONCURRENCY,
+                 max_retries=CANVAS_MAX_RETRIES, backoff_factor=CANVAS_BACKOFF_FACTOR, timeout=CANVAS_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+
+class CanvasClient:
+    """Keep-alive Canvas REST client with retries and Link-header pagination."""
+
+    def __init__(self, settings=None):
+        self.settings = settings = settings or CanvasSettings()
+        self.base_url = settings.base_url
+        self.token = settings.token
+        self.timeout = settings.timeout
+
+        # exponential backoff on 429/5xx, honouring Canvas's Retry-After
+        retry = Retry(
+            total=settings.max_retries,
+            backoff_factor=settings.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.pool_size, max_retries=retry)
+
+        self.auth = _auth_headers(self.token)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path: str, params=None, headers=None) -> requests.Response:
+        with metrics.upstream("canvas"):
+            return self.session.get(
+                self.url(path), params=params, headers={**self.auth, **(headers or {})}, timeout=self.timeout,
+            )
+
+    def for_token(self, token):
+        """Same connection pool, another user's token."""
+        return _with_token(self, token)
+
+    def get_json(self, path: str, params=None):
+        return self.get(path, params=params).json()
+
+    def iter_pages(self, path: str, params=None):
+        """Yield each page's JSON body, following Link: rel="next" until exhausted."""
+        params = {"per_page": CANVAS_PER_PAGE, **(params or {})}
+        yield from self._follow(self.get(path, params=params))
+
+    def _follow(self, response):
+        while True:
+            yield response.json()
+
+            # the next link already carries every query parameter
+            next_url = response.links.get("next", {}).get("url")
+            if not next_url:
+                return
+            response = self.get(next_url)
+
+    def get_all(self, path: str, params=None):
+        """Collect every page into one list (an error body is returned as-is)."""
+        items = []
+        for page in self.iter_pages(path, params):
+            if not isinstance(page, list):
+                return page if not items else items
+            items.extend(page)
+        return items
+
+    def get_all_if_changed(self, path: str, params=None, validators=None):
+        """
+        Conditional get_all. Sends the stored ETag / Last-Modified with the
+        first page; returns (None, validators) on 304, otherwise
+        (data, new_validators).
+        """
+        validators = validators or {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        params = {"per_page": CANVAS_PER_PAGE, **(params or {})}
+        response = self.get(path, params=params, headers=headers)
+        if response.status_code == 304:
+            return None, validators
+
+        new_validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        items = []
+        for page in self._follow(response):
+            if not isinstance(page, list):
+                return (page if not items else items), {}
+            items.extend(page)
+        return items, new_validators
+
+
+def _auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _with_token(client, token):
+    # a shallow copy shares the session/pool; only the auth header differs
+    clone = copy.copy(client)
+    clone.token = token
+    clone.auth = _auth_headers(token)
+    return clone
+
+
+# ------------------ Async Client ------------------
+class AsyncCanvasClient:
+    """
+    asyncio counterpart of CanvasClient (httpx) for the async views: same
+    pagination, conditional GETs and 429/5xx backoff, but a request waiting
+    on Canvas holds no thread, so one worker can have hundreds in flight.
+    """
+
+    def __init__(self, settings=None):
+        settings = settings or CanvasSettings()
+        self.base_url = settings.base_url
+        self.token = settings.token
+        self.max_retries = settings.max_retries
+        self.backoff_factor = settings.backoff_factor
+        self.auth = _auth_headers(self.token)
+        # requests beyond pool_size queue for a connection instead of failing
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=settings.pool_size, max_keepalive_connections=settings.pool_size),
+            timeout=httpx.Timeout(settings.timeout, pool=None),
+        )
+
+    @classmethod
+    def from_client(cls, client):
+        return cls(client.settings)
+
+    def url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    def for_token(self, token):
+        return _with_token(self, token)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * (2 ** attempt)
+
+    async def get(self, path: str, params=None, headers=None) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                with metrics.upstream("canvas"):
+                    response = await self.http.get(
+                        self.url(path), params=params, headers={**self.auth, **(headers or {})},
+                    )
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    async def get_json(self, path: str, params=None):
+        return (await self.get(path, params=params)).json()
+
+    async def iter_pages(self, path: str, params=None):
+        params = {"per_page": CANVAS_PER_PAGE, **(params or {})}
+        async for page in self._follow(await self.get(path, params=params)):
+            yield page
+
+    async def _follow(self, response):
+        while True:
+            yield response.json()
+
+            next_url = response.links.get("next", {}).get("url")
+            if not next_url:
+                return
+            response = await self.get(next_url)
+
+    async def get_all(self, path: str, params=None):
+        items = []
+        async for page in self.iter_pages(path, params):
+            if not isinstance(page, list):
+                return page if not items else items
+            items.extend(page)
+        return items
+
+    async def get_all_if_changed(self, path: str, params=None, validators=None):
+        validators = validators or {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        params = {"per_page": CANVAS_PER_PAGE, **(params or {})}
+        response = await self.get(path, params=params, headers=headers)
+        if response.status_code == 304:
+            return None, validators
+
+        new_validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        items = []
+        async for page in self._follow(response):
+            if not isinstance(page, list):
+                return (page if not items else items), {}
+            items.extend(page)
+        return items, new_validators
+
+
+# ------------------ Shared Client ------------------
+_client = None
+_client_lock = threading.Lock()
+
+
+def _shared_client() -> CanvasClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = CanvasClient()
+    return _client
+
+
+def get_client(account=None) -> CanvasClient:
+    """
+    Process-wide client so every Canvas call reuses pooled connections;
+    with an account, a view of it that authenticates as that user.
+    """
+    client = _shared_client()
+    return client.for_token(account.token) if account is not None else client
+
+
+# ------------------ Canvas Event Loop ------------------
+# httpx connections belong to the event loop that opened them, and under
+# WSGI (runserver) asgiref runs every async view on a fresh loop, so a
+# client per request loop would never reuse a connection. All async Canvas
+# work runs on one long-lived loop in a daemon thread instead (the sync
+# jobs too) with one AsyncCanvasClient, whichever way the app is served.
+_loop = None
+_loop_lock = threading.Lock()
+_async_client = None
+
+
+def canvas_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="predictor-canvas", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def on_canvas_loop(func):
+    """Decorator: a coroutine function that always runs on canvas_loop(), awaitable from any loop."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = canvas_loop()
+        if asyncio.get_running_loop() is loop:
+            return await func(*args, **kwargs)
+        # the task inherits this context, so upstream timings still reach the request
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop))
+    return wrapper
+
+
+def get_async_client(account=None) -> AsyncCanvasClient:
+    """The shared async client (configured like the sync one); only usable on canvas_loop()."""
+    global _async_client
+    if asyncio.get_running_loop() is not canvas_loop():
+        raise RuntimeError("AsyncCanvasClient is bound to canvas_loop(); wrap the caller in @on_canvas_loop")
+    if _async_client is None:
+        _async_client = AsyncCanvasClient.from_client(_shared_client())
+    return _async_client.for_token(account.token) if account is not None else _async_client
+
+
+def close_async_client():
+    """Close the shared async client's connections (benchmarks, shutdown)."""
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None and _loop is not None:
+        asyncio.run_coroutine_threadsafe(client.http.aclose(), _loop).result()
+
+
+# ------------------ Accounts ------------------
+class CanvasAccount:
+    """
+    Whose Canvas data a call reads: the user's token plus a stable key for
+    their store shard and job/coalescing identity. Only the key is ever
+    printed or serialized, never the token.
+    """
+
+    def __init__(self, token, key):
+        self.token = token
+        self.key = key
+
+    @classmethod
+    def for_token(cls, token):
+        if not token or token == CANVAS_TOKEN:
+            return default_account()
+        digest = hashlib.sha256(f"{CANVAS_API_URL}\0{token}".encode()).hexdigest()[:32]
+        return cls(token, digest)
+
+    def __str__(self):
+        return self.key
+
+    def __repr__(self):
+        return f"CanvasAccount({self.key!r})"
+
+
+def default_account() -> CanvasAccount:
+    return CanvasAccount(_shared_client().token, DEFAULT_ACCOUNT)
@@ -1,40 +1,51 @@
-import os
-import pandas as pd
-import requests
-from pathlib import Path
+import asyncio
+from datetime import datetime, timezone
+from .canvas_client import canvas_loop, get_client, get_async_client, on_canvas_loop
+from .utils import standardize_category
+from . import canvas_store
+from .singleflight import coalesce
+from . import metrics
 
-CACHE_PATH = Path("canvas_data_cache.csv")
 
-CANVAS_API_URL = os.getenv("CANVAS_API_URL", "https://canvas.pitt.edu/api/v1")
-CANVAS_TOKEN = os.getenv("CANVAS_TOKEN")
-headers = {"Authorization": f"Bearer {CANVAS_TOKEN}"}
+# ------------------ Fetch All Courses ------------------
+# `account` (canvas_client.CanvasAccount) selects whose token and store are
+# used; None is the single-user CANVAS_TOKEN account. The plain functions
+# run on the pooled requests client for sync callers (shell, management
+# commands, scripts); the views use the *_async versions.
+@coalesce("canvas")
+def fetch_courses(account=None):
+    return get_client(account).get_all("courses")
 
 
-# ------------------ Fetch All Courses ------------------
-def fetch_courses():
-    url = f"{CANVAS_API_URL}/courses"
-    response = requests.get(url, headers=headers)
-    return response.json()
+@on_canvas_loop
+@coalesce("canvas")
+async def fetch_courses_async(account=None):
+    return await get_async_client(account).get_all("courses")
 
 
 # ------------------ Fetch Category Grades for 1 Course ------------------
-def fetch_category_grades(course_id: int):
-    # identical to old get_canvas_category_grades response logic
-    course_url = f"{CANVAS_API_URL}/courses/{course_id}"
-    course_info = requests.get(course_url, headers=headers).json()
-
-    groups = requests.get(
-        f"{CANVAS_API_URL}/courses/{course_id}/assignment_groups",
-        headers=headers,
-        params={"include[]": "assignments"},
-    ).json()
-
-    submissions = requests.get(
-        f"{CANVAS_API_URL}/courses/{course_id}/students/submissions",
-        headers=headers,
-        params={"student_ids[]": "self"},
-    ).json()
-
+@coalesce("canvas")
+def fetch_category_grades(course_id: int, account=None):
+    client = get_client(account)
+    course_info = client.get_json(f"courses/{course_id}")
+    groups = client.get_all(f"courses/{course_id}/assignment_groups", params={"include[]": "assignments"})
+    submissions = client.get_all(f"courses/{course_id}/students/submissions", params={"student_ids[]": "self"})
+    return _category_grades(course_info, groups, submissions)
+
+
+@on_canvas_loop
+@coalesce("canvas")
+async def fetch_category_grades_async(course_id: int, account=None):
+    client = get_async_client(account)
+    course_info, groups, submissions = await asyncio.gather(
+        client.get_json(f"courses/{course_id}"),
+        client.get_all(f"courses/{course_id}/assignment_groups", params={"include[]": "assignments"}),
+        client.get_all(f"courses/{course_id}/students/submissions", params={"student_ids[]": "self"}),
+    )
+    return _category_grades(course_info, groups, submissions)
+
+
+def _category_grades(course_info, groups, submissions):
     submission_map = {s.get("assignment_id"): s for s in submissions if isinstance(s, dict)}
 
     results = []
@@ -82,116 +93,228 @@ def fetch_category_grades(course_id: int):
 
 
 # ------------------ Fetch ALL Canvas Data & Cache ------------------
-def fetch_all_data():
-    courses_url = f"{CANVAS_API_URL}/courses"
-    params = {
-        "enrollment_state[]": ["active", "completed", "invited_or_pending"],
-        "per_page": 100,
-        "include[]": ["term"],
-    }
+def _aggregate_course(course, detail, enrollments, groups, submissions):
+    cid = course.get("id")
+    term = (course.get("term") or {}).get("name", "")
 
-    courses = requests.get(courses_url, headers=headers, params=params).json()
+    grades = enrollments[0].get("grades", {}) if isinstance(enrollments, list) and enrollments else {}
+    final_grade = grades.get("final_grade") or grades.get("current_grade")
+    final_score = grades.get("final_score") or grades.get("current_score")
 
-    all_data, csv_rows = [], []
+    submission_map = {s.get("assignment_id"): s for s in submissions if isinstance(s, dict)}
 
-    def standardize_category(name: str) -> str:
-        n = (name or "").lower()
-        if any(k in n for k in ["exam", "midterm", "final", "quiz", "test"]): return "exams"
-        if any(k in n for k in ["project", "capstone", "lab"]): return "projects"
-        if any(k in n for k in ["participation","attendance","discussion","poll","peer"]): return "participation"
-        return "assignments"
+    categories = []
+    cat_percents = {"projects": None, "assignments": None, "exams": None, "participation": None}
+    cat_points = {}
 
-    for course in courses:
-        try:
-            cid = course.get("id")
-            if not cid:
+    for g in groups:
+        earned_points, total_points = 0, 0
+
+        for a in g.get("assignments", []):
+            points_possible = a.get("points_possible") or 0
+            sub = submission_map.get(a["id"])
+            score = sub.get("score") if sub else None
+
+            if score is not None and points_possible > 0:
+                earned_points += score
+                total_points += points_possible
+
+        percent = (earned_points / total_points * 100) if total_points > 0 else None
+        std_cat = standardize_category(g["name"])
+
+        if total_points > 0:
+            earned, total = cat_points.get(std_cat, [0, 0])
+            cat_points[std_cat] = [earned + earned_points, total + total_points]
+
+        if percent is not None:
+            if cat_percents[std_cat] is None:
+                cat_percents[std_cat] = percent
+            else:
+                cat_percents[std_cat] = (cat_percents[std_cat] + percent) / 2
+
+        categories.append({
+            "category": g["name"],
+            "standardized": std_cat,
+            "percent": percent
+        })
+
+    course_data = {
+        "id": cid,
+        "name": detail.get("name"),
+        "course_code": detail.get("course_code"),
+        "term": term,
+        "final_grade": final_grade,
+        "final_score": final_score,
+        "categories": categories,
+        "standardized_percents": cat_percents,
+    }
+
+    csv_row = {
+        "course_id": cid,
+        "name": detail.get("name"),
+        "course_code": detail.get("course_code"),
+        "term": term,
+        "final_grade": final_grade,
+        "final_score": final_score,
+        **cat_percents,
+        "points": cat_points,
+    }
+
+    return course_data, csv_row
+
+
+def _is_completed(course) -> bool:
+    # concluded courses (or courses whose term has ended) can never change again
+    if course.get("concluded") or course.get("workflow_state") == "completed":
+        return True
+    end_at = (course.get("term") or {}).get("end_at")
+    return bool(end_at) and end_at < _utcnow()
+
+
+def _utcnow() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _keep_previous(prev, cid, sync_state, csv_rows):
+    # a course that failed this time keeps its last good history instead of
+    # dropping out of the store until the next sync
+    if prev:
+        sync_state[str(cid)] = prev
+        csv_rows.append(prev["csv_row"])
+
+
+def _graded_hwm(submissions, fallback):
+    graded = [s.get("graded_at") for s in submissions if isinstance(s, dict) and s.get("graded_at")]
+    return max(graded + [fallback])
+
+
+COURSE_LIST_PARAMS = {
+    "enrollment_state[]": ["active", "completed", "invited_or_pending"],
+    "include[]": ["term", "concluded"],
+}
+
+
+# Each course is one coroutine (probe, then full fetch if it changed), all
+# courses run at once and the client's connection pool (capped by
+# CANVAS_MAX_CONCURRENCY) limits how many requests are on the wire.
+#
+# With incremental=True, per-course sync state from the previous run is
+# used to skip work: completed courses cost no requests at all, and active
+# courses cost a two-request probe (a conditional assignment_groups GET and
+# new gradings only); only courses whose probe reports a change are
+# re-fetched and re-aggregated.
+#
+# `progress`, if given, is told the course count once the list is in
+# (progress.start(total)) and every course as it finishes
+# (progress.advance(course_id, error)); see sync_jobs.SyncJob.
+@on_canvas_loop
+async def fetch_all_data_async(incremental: bool = True, progress=None, account=None):
+    with metrics.stage("canvas_sync"):
+        client = get_async_client(account)
+        account_key = account.key if account is not None else None
+        courses = await client.get_all("courses", params=COURSE_LIST_PARAMS)
+
+        stored = (await asyncio.to_thread(canvas_store.load_sync_state, account_key))["courses"]
+        previous = stored if incremental else {}
+        synced_at = _utcnow()
+        courses = [c for c in courses if c.get("id")]
+        if progress is not None:
+            progress.start(len(courses))
+
+        async def sync_course(course):
+            try:
+                result = await _sync_course_async(client, course, previous.get(str(course["id"])), synced_at)
+            except Exception as e:
+                if progress is not None:
+                    progress.advance(course["id"], str(e))
+                raise
+            if progress is not None:
+                progress.advance(course["id"])
+            return result
+
+        results = await asyncio.gather(*(sync_course(course) for course in courses), return_exceptions=True)
+
+        sync_state = {}
+        all_data, csv_rows = [], []
+        for course, result in zip(courses, results):
+            cid = course["id"]
+            if isinstance(result, Exception):
+                all_data.append({"course": {"id": cid}, "error": str(result)})
+                _keep_previous(stored.get(str(cid)), cid, sync_state, csv_rows)
                 continue
+            course_data, csv_row, entry = result
+            sync_state[str(cid)] = entry
+            all_data.append(course_data)
+            csv_rows.append(csv_row)
 
-            detail_url = f"{CANVAS_API_URL}/courses/{cid}"
-            detail = requests.get(detail_url, headers=headers).json()
-            term = (course.get("term") or {}).get("name", "")
-
-            enrollments = requests.get(
-                f"{CANVAS_API_URL}/courses/{cid}/enrollments",
-                headers=headers,
-                params={"user_id": "self", "type[]": "StudentEnrollment"},
-            ).json()
-
-            grades = enrollments[0].get("grades", {}) if isinstance(enrollments, list) and enrollments else {}
-            final_grade = grades.get("final_grade") or grades.get("current_grade")
-            final_score = grades.get("final_score") or grades.get("current_score")
-
-            groups = requests.get(
-                f"{CANVAS_API_URL}/courses/{cid}/assignment_groups",
-                headers=headers,
-                params={"include[]": "assignments"},
-            ).json()
-
-            submissions = requests.get(
-                f"{CANVAS_API_URL}/courses/{cid}/students/submissions",
-                headers=headers,
-                params={"student_ids[]": "self"},
-            ).json()
-            submission_map = {s.get("assignment_id"): s for s in submissions if isinstance(s, dict)}
-
-            categories = []
-            cat_percents = {"projects": None, "assignments": None, "exams": None, "participation": None}
-
-            for g in groups:
-                earned_points, total_points = 0, 0
-
-                for a in g.get("assignments", []):
-                    points_possible = a.get("points_possible") or 0
-                    sub = submission_map.get(a["id"])
-                    score = sub.get("score") if sub else None
-
-                    if score is not None and points_possible > 0:
-                        earned_points += score
-                        total_points += points_possible
-
-                percent = (earned_points / total_points * 100) if total_points > 0 else None
-                std_cat = standardize_category(g["name"])
-
-                if percent is not None:
-                    if cat_percents[std_cat] is None:
-                        cat_percents[std_cat] = percent
-                    else:
-                        cat_percents[std_cat] = (cat_percents[std_cat] + percent) / 2
-
-                categories.append({
-                    "category": g["name"],
-                    "standardized": std_cat,
-                    "percent": percent
-                })
-
-            all_data.append({
-                "id": cid,
-                "name": detail.get("name"),
-                "course_code": detail.get("course_code"),
-                "term": term,
-                "final_grade": final_grade,
-                "final_score": final_score,
-                "categories": categories,
-                "standardized_percents": cat_percents,
-            })
+        await asyncio.to_thread(canvas_store.save_sync, csv_rows, sync_state, account_key)
+        return all_data
 
-            csv_rows.append({
-                "course_id": cid,
-                "name": detail.get("name"),
-                "course_code": detail.get("course_code"),
-                "term": term,
-                "final_grade": final_grade,
-                "final_score": final_score,
-                **cat_percents
-            })
 
-        except Exception as e:
-            all_data.append({"course": {"id": course.get("id")}, "error": str(e)})
+def fetch_all_data(incremental: bool = True, progress=None, account=None):
+    """
+    Blocking fetch_all_data_async for sync callers. The per-course sync is
+    only implemented once; it runs on canvas_loop() and this thread waits.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        future = asyncio.run_coroutine_threadsafe(fetch_all_data_async(incremental, progress, account), canvas_loop())
+        return future.result()
+    raise RuntimeError("fetch_all_data would block the running event loop; await fetch_all_data_async instead")
 
-    pd.DataFrame(csv_rows).to_csv(CACHE_PATH, index=False)
-    return all_data
+
+async def _sync_course_async(client, course, prev, synced_at):
+    cid = course["id"]
+    fetched = None
+
+    if prev and not prev.get("completed"):
+        try:
+            (groups, validators), newly_graded = await asyncio.gather(
+                client.get_all_if_changed(
+                    f"courses/{cid}/assignment_groups",
+                    {"include[]": "assignments"},
+                    prev.get("groups_validators"),
+                ),
+                client.get_all(
+                    f"courses/{cid}/students/submissions",
+                    {"student_ids[]": "self", "graded_since": prev["graded_hwm"]},
+                ),
+            )
+            changed = groups is not None or (isinstance(newly_graded, list) and len(newly_graded) > 0)
+        except Exception:
+            groups, validators, changed = None, None, True
+
+        if changed:
+            prev = None
+            fetched = (groups, validators) if groups is not None else None
+
+    if prev:
+        entry = {**prev, "completed": prev.get("completed") or _is_completed(course)}
+        return prev["course_data"], prev["csv_row"], entry
+
+    async def groups_request():
+        if fetched is not None:
+            return fetched
+        return await client.get_all_if_changed(f"courses/{cid}/assignment_groups", {"include[]": "assignments"})
+
+    detail, enrollments, (groups, validators), submissions = await asyncio.gather(
+        client.get_json(f"courses/{cid}"),
+        client.get_all(f"courses/{cid}/enrollments", {"user_id": "self", "type[]": "StudentEnrollment"}),
+        groups_request(),
+        client.get_all(f"courses/{cid}/students/submissions", {"student_ids[]": "self"}),
+    )
+    course_data, csv_row = _aggregate_course(course, detail, enrollments, groups, submissions)
+    entry = {
+        "completed": _is_completed(course),
+        "groups_validators": validators,
+        "graded_hwm": _graded_hwm(submissions, synced_at),
+        "course_data": course_data,
+        "csv_row": csv_row,
+    }
+    return course_data, csv_row, entry
 
 
 # ------------------ Cache Helper ------------------
-def load_cache_if_exists():
-    return pd.read_csv(CACHE_PATH) if CACHE_PATH.exists() else None
+def load_cache_if_exists(account=None):
+    return canvas_store.get_snapshot(account.key if account is not None else None)
@@ -0,0 +1,397 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .canvas_client import DEFAULT_ACCOUNT
+from . import metrics
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# the single-user (CANVAS_TOKEN) store; every other account gets its own
+# file under CANVAS_STORE_DIR, sharded by key prefix
+STORE_PATH = Path(os.getenv("CANVAS_STORE_PATH", BASE_DIR / "canvas_store.sqlite3"))
+CANVAS_STORE_DIR = Path(os.getenv("CANVAS_STORE_DIR", BASE_DIR / "canvas_users"))
+LEGACY_CSV_PATH = BASE_DIR / "canvas_data_cache.csv"
+
+# bytes of course history kept in memory across all accounts
+CANVAS_CACHE_MEMORY_BUDGET = int(os.getenv("CANVAS_CACHE_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+
+CATEGORIES = ["projects", "assignments", "exams", "participation"]
+COURSE_COLUMNS = ["course_id", "name", "course_code", "term", "final_grade", "final_score", *CATEGORIES, "points"]
+
+# wildcard used for the "all terms" / "all subjects" aggregate slices
+ALL = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_id INTEGER PRIMARY KEY,
+    name TEXT,
+    course_code TEXT,
+    term TEXT,
+    final_grade TEXT,
+    final_score REAL,
+    projects REAL,
+    assignments REAL,
+    exams REAL,
+    participation REAL,
+    points TEXT
+);
+CREATE TABLE IF NOT EXISTS category_aggregates (
+    term TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    category TEXT NOT NULL,
+    sum_percent REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    earned_points REAL NOT NULL DEFAULT 0,
+    total_points REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (term, subject, category)
+);
+CREATE TABLE IF NOT EXISTS course_sync (
+    course_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def store_path(account_key=None) -> Path:
+    if account_key in (None, DEFAULT_ACCOUNT):
+        return STORE_PATH
+    return CANVAS_STORE_DIR / account_key[:2] / f"{account_key}.sqlite3"
+
+
+def _connect(path=None):
+    path = Path(path or STORE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+
+def _migrate(conn):
+    # stores created before per-category points were tracked
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(courses)")}
+    if "points" not in columns:
+        conn.execute("ALTER TABLE courses ADD COLUMN points TEXT")
+        _rebuild_aggregates(conn)
+        conn.commit()
+
+
+def _to_float(val):
+    try:
+        return float(val) if val not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _course_params(row):
+    points = row.get("points")
+    return (
+        int(row["course_id"]),
+        row.get("name"),
+        row.get("course_code"),
+        row.get("term"),
+        row.get("final_grade") or None,
+        _to_float(row.get("final_score")),
+        *(_to_float(row.get(c)) for c in CATEGORIES),
+        json.dumps(points, sort_keys=True) if isinstance(points, dict) else points,
+    )
+
+
+def course_subject(course_code) -> str:
+    # "2241 CMPINF 0401 SEC1100" -> "CMPINF"
+    for token in (course_code or "").split():
+        if token.isalpha():
+            return token.upper()
+    return ""
+
+
+# ------------------ Category Aggregates ------------------
+# Per (term, subject, category) running sums of category percents and of
+# earned/possible points. Each course contributes to four slices: its own
+# (term, subject), (term, *), (*, subject) and the global (*, *) row, so
+# any of those lookups is a single row read. Syncs apply the difference
+# between a course's old and new contribution instead of rescanning.
+def _contribution(params):
+    row = dict(zip(COURSE_COLUMNS, params))
+    points = json.loads(row["points"]) if row["points"] else {}
+    term, subject = row["term"] or "", course_subject(row["course_code"])
+
+    deltas = []
+    for cat in CATEGORIES:
+        percent = row[cat]
+        earned, total = points.get(cat, [0, 0])
+        if percent is None and not total:
+            continue
+        for t, sub in ((term, subject), (term, ALL), (ALL, subject), (ALL, ALL)):
+            deltas.append((
+                t, sub, cat,
+                percent if percent is not None else 0.0,
+                1 if percent is not None else 0,
+                float(earned), float(total),
+            ))
+    return deltas
+
+
+def _apply_contribution(conn, params, sign):
+    conn.executemany(
+        "INSERT INTO category_aggregates (term, subject, category, sum_percent, count, earned_points, total_points) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(term, subject, category) DO UPDATE SET "
+        "sum_percent = sum_percent + excluded.sum_percent, count = count + excluded.count, "
+        "earned_points = earned_points + excluded.earned_points, total_points = total_points + excluded.total_points",
+        [(t, sub, cat, sign * p, sign * n, sign * e, sign * tot) for t, sub, cat, p, n, e, tot in _contribution(params)],
+    )
+
+
+def _rebuild_aggregates(conn):
+    conn.execute("DELETE FROM category_aggregates")
+    for row in conn.execute(f"SELECT {', '.join(COURSE_COLUMNS)} FROM courses").fetchall():
+        _apply_contribution(conn, tuple(row), +1)
+
+
+def _bump_version(conn):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+# ------------------ Writes ------------------
+def save_sync(rows, sync_state, account_key=None):
+    """
+    Make the stored course history match `rows` and replace the sync state,
+    in one transaction. Only courses that were added, changed or removed
+    touch the category aggregates.
+    """
+    new = {p[0]: p for p in (_course_params(r) for r in rows)}
+
+    with _connect(store_path(account_key)) as conn:
+        old = {r["course_id"]: tuple(r) for r in conn.execute(f"SELECT {', '.join(COURSE_COLUMNS)} FROM courses")}
+
+        for cid, params in old.items():
+            if new.get(cid) != params:
+                _apply_contribution(conn, params, -1)
+                conn.execute("DELETE FROM courses WHERE course_id = ?", (cid,))
+        for cid, params in new.items():
+            if old.get(cid) != params:
+                _apply_contribution(conn, params, +1)
+                conn.execute(
+                    f"INSERT INTO courses ({', '.join(COURSE_COLUMNS)}) VALUES ({', '.join('?' * len(COURSE_COLUMNS))})",
+                    params,
+                )
+        conn.execute("DELETE FROM category_aggregates WHERE count <= 0 AND total_points < 1e-9")
+
+        conn.execute("DELETE FROM course_sync")
+        conn.executemany(
+            "INSERT INTO course_sync (course_id, state) VALUES (?, ?)",
+            [(int(cid), json.dumps(state)) for cid, state in sync_state.items()],
+        )
+        _bump_version(conn)
+    conn.close()
+    invalidate(account_key or DEFAULT_ACCOUNT)
+
+
+def import_legacy_csv(csv_path=LEGACY_CSV_PATH):
+    """One-time migration of an existing canvas_data_cache.csv into the store."""
+    with open(csv_path, newline="") as f:
+        rows = [r for r in csv.DictReader(f) if r.get("course_id")]
+    with _connect() as conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO courses ({', '.join(COURSE_COLUMNS)}) VALUES ({', '.join('?' * len(COURSE_COLUMNS))})",
+            [_course_params(r) for r in rows],
+        )
+        _rebuild_aggregates(conn)
+        _bump_version(conn)
+    conn.close()
+    invalidate(DEFAULT_ACCOUNT)
+
+
+# ------------------ Reads ------------------
+def load_sync_state(account_key=None):
+    path = store_path(account_key)
+    if not path.exists():
+        return {"courses": {}}
+    conn = _connect(path)
+    try:
+        rows = conn.execute("SELECT course_id, state FROM course_sync").fetchall()
+        return {"courses": {str(r["course_id"]): json.loads(r["state"]) for r in rows}}
+    finally:
+        conn.close()
+
+
+class CourseSnapshot:
+    """Immutable in-memory view of the store, indexed by course_id."""
+
+    def __init__(self, version, rows, aggregates=None):
+        self.version = version
+        self.rows = rows
+        self.by_id = {r["course_id"]: r for r in rows}
+        self.aggregates = aggregates or {}
+        self.nbytes = _deep_sizeof(rows) + _deep_sizeof(self.aggregates)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_course(self, course_id):
+        try:
+            return self.by_id.get(int(course_id))
+        except (TypeError, ValueError):
+            return None
+
+    def category_means(self, term=ALL, subject=ALL):
+        """Mean category percent for a slice, e.g. term="Fall 2023-2024" or subject="CMPINF"."""
+        slice_ = self.aggregates.get((term, subject), {})
+        return {
+            cat: (slice_[cat]["sum_percent"] / slice_[cat]["count"]) if slice_.get(cat, {}).get("count") else None
+            for cat in CATEGORIES
+        }
+
+    def point_weighted_means(self, term=ALL, subject=ALL):
+        """Earned / possible points per category for a slice, as a percent."""
+        slice_ = self.aggregates.get((term, subject), {})
+        return {
+            cat: (100.0 * slice_[cat]["earned_points"] / slice_[cat]["total_points"])
+            if slice_.get(cat, {}).get("total_points") else None
+            for cat in CATEGORIES
+        }
+
+
+def _deep_sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(v) for v in obj)
+    return size
+
+
+# ------------------ In-process Hot Cache ------------------
+# One CourseSnapshot per account, re-read only when that account's store
+# file changed (mtime/size) and its version counter moved, so the prediction
+# path is a stat() plus a dict lookup. Snapshots share one memory budget;
+# the least recently used accounts are dropped when it is exceeded and
+# simply re-read from their file (which other worker processes also read
+# and write) on their next request.
+class SnapshotCache:
+    def __init__(self, budget=CANVAS_CACHE_MEMORY_BUDGET):
+        self.budget = budget
+        self._entries = OrderedDict()  # account key -> (stamp, snapshot)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def get(self, account_key, path):
+        stamp = _file_stamp(path)
+        if stamp is None:
+            self.invalidate(account_key)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(account_key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(account_key)
+                self.counters["hits"] += 1
+                return entry[1]
+
+        # read outside the lock so one cold account doesn't stall the others
+        snapshot = _read_snapshot(path, entry[1] if entry else None)
+        with self._lock:
+            self.counters["loads"] += 1
+            self._discard(account_key)
+            self._entries[account_key] = (stamp, snapshot)
+            self._bytes += snapshot.nbytes
+            while self._bytes > self.budget and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.counters["evictions"] += 1
+        return snapshot
+
+    def _discard(self, account_key):
+        entry = self._entries.pop(account_key, None)
+        if entry is not None:
+            self._bytes -= entry[1].nbytes
+
+    def invalidate(self, account_key=None):
+        with self._lock:
+            if account_key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._discard(account_key)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "accounts": len(self._entries), "bytes": self._bytes, "budget": self.budget}
+
+
+_cache = SnapshotCache()
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+metrics.REGISTRY.register_collector(
+    "predictor_canvas_snapshots", "In-memory per-account Canvas history cache.", "stat", cache_stats
+)
+
+
+_invalidation_listeners = []
+
+
+def on_invalidate(func):
+    """Call func(account_key) whenever an account's history changes (None: every account)."""
+    _invalidation_listeners.append(func)
+
+
+def invalidate(account_key=None):
+    """Drop one account's in-memory snapshot (every account's when None)."""
+    _cache.invalidate(account_key)
+    for listener in _invalidation_listeners:
+        listener(account_key)
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+def _read_snapshot(path, current=None):
+    conn = _connect(path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        version = int(row["value"]) if row else 0
+        if current is not None and current.version == version:
+            return current
+        rows = [dict(r) for r in conn.execute(f"SELECT {', '.join(COURSE_COLUMNS)} FROM courses ORDER BY rowid")]
+
+        aggregates = {}
+        for r in conn.execute("SELECT * FROM category_aggregates"):
+            aggregates.setdefault((r["term"], r["subject"]), {})[r["category"]] = dict(r)
+        return CourseSnapshot(version, rows, aggregates)
+    finally:
+        conn.close()
+
+
+def get_snapshot(account_key=None):
+    """An account's course history, or None if nothing has been synced yet."""
+    path = store_path(account_key)
+    if path == STORE_PATH and not path.exists() and LEGACY_CSV_PATH.exists():
+        import_legacy_csv()
+
+    snapshot = _cache.get(account_key or DEFAULT_ACCOUNT, path)
+    return snapshot if snapshot is not None and len(snapshot) else None
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+from .ai_service import cache_completion
+from .llm_cache import get_cache
+from . import ai_service
+
+# The Batch API runs chat completions asynchronously (within 24h) at half
+# the price of the live endpoint; results are loaded into the same cache
+# _chat reads, under the same keys.
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+# the API's per-batch request limit
+BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "50000"))
+
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# ------------------ Work Items ------------------
+def custom_id(request):
+    # everything needed to store the result, so a batch can be loaded by id
+    # from a later run (--resume) without any local state
+    return f"{request.template}:{request.key}"
+
+
+def pending(requests):
+    """The requests not answered by the cache yet, one per key."""
+    llm_cache = get_cache()
+    unique = {}
+    for request in requests:
+        if request is not None and request.key not in unique and llm_cache.get(request.key) is None:
+            unique[request.key] = request
+    return list(unique.values())
+
+
+def batch_input(requests) -> bytes:
+    lines = [
+        json.dumps({"custom_id": custom_id(r), "method": "POST", "url": BATCH_ENDPOINT, "body": r.body()})
+        for r in requests
+    ]
+    return ("\n".join(lines) + "\n").encode()
+
+
+# ------------------ Batch API ------------------
+def submit(requests, description="precompute_llm_cache"):
+    """Upload the requests as a JSONL file and start batches over it; returns the Batch objects."""
+    batches = []
+    for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+        chunk = requests[start:start + BATCH_MAX_REQUESTS]
+        upload = ai_service.client.files.create(file=("precompute.jsonl", batch_input(chunk)), purpose="batch")
+        batches.append(ai_service.client.batches.create(
+            input_file_id=upload.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata={"description": description},
+        ))
+    return batches
+
+
+def wait(batch_id, poll_interval=30.0, timeout=None, on_poll=None):
+    """Poll a batch until it reaches a terminal status or `timeout` seconds pass; returns the last Batch seen."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        batch = ai_service.client.batches.retrieve(batch_id)
+        if on_poll is not None:
+            on_poll(batch)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if deadline is not None and time.monotonic() + poll_interval > deadline:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _jsonl(file_id):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in ai_service.client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def load_results(batch):
+    """
+    Download a batch's output (and error) file and cache every successful
+    completion. An expired or cancelled batch still has output for the
+    requests it finished. Returns {"cached", "failed", "usage", "errors"}.
+    """
+    report = {"cached": 0, "failed": 0, "usage": {"prompt_tokens": 0, "completion_tokens": 0}, "errors": []}
+
+    def fail(line, error):
+        report["failed"] += 1
+        report["errors"].append({"custom_id": line.get("custom_id"), "error": error})
+
+    for line in _jsonl(batch.output_file_id) + _jsonl(batch.error_file_id):
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            fail(line, line.get("error") or (response.get("body") or {}).get("error") or response.get("status_code"))
+            continue
+
+        template, _, key = line["custom_id"].partition(":")
+        body = response["body"]
+        try:
+            cache_completion(template, key, body["choices"][0]["message"]["content"])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            fail(line, f"unusable completion: {e}")
+            continue
+
+        report["cached"] += 1
+        for kind in report["usage"]:
+            report["usage"][kind] += (body.get("usage") or {}).get(kind) or 0
+    return report
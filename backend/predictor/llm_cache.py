@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from . import metrics
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", BASE_DIR / "llm_cache.sqlite3"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+
+
+# ------------------ Keys ------------------
+def _normalize(value):
+    # identical syllabi pasted with different spacing / line endings hash the same
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def cache_key(model, template, version, inputs) -> str:
+    """Content hash of (model, prompt template + version, normalized inputs)."""
+    payload = json.dumps(
+        {"model": model, "template": template, "version": version, "inputs": _normalize(inputs)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------ Backends ------------------
+class MemoryLRU:
+    """Per-process LRU with a TTL on every entry."""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self._lock:
+            self._data[key] = (value, expires_at or time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """Persistent tier shared by every worker process on the host."""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at >= ?",
+            (key, time.time()),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, value, expires_at=None):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at or time.time() + self.ttl),
+            )
+
+    def prune(self):
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+# ------------------ Two-tier Cache ------------------
+class LLMCache:
+    def __init__(self, memory=None, persistent=None):
+        self.memory = memory or MemoryLRU()
+        self.persistent = persistent
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "sets": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.persistent is not None:
+            try:
+                hit = self.persistent.get(key)
+            except sqlite3.Error:
+                hit = None
+                self._count("errors")
+            if hit is not None:
+                value, expires_at = hit
+                self.memory.set(key, value, expires_at)
+                self._count("persistent_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except sqlite3.Error:
+                self._count("errors")
+        self._count("sets")
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else None
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(persistent=SQLiteBackend() if LLM_CACHE_ENABLED else None)
+    return _cache
+
+
+metrics.REGISTRY.register_collector("predictor_llm_cache", "LLM completion cache lookups.", "stat", lambda: get_cache().stats())
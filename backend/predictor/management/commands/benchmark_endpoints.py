@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from predictor.benchmarks.fakes import FakeCanvas, FakeOpenAI, FakeRMP, FakeSupabase
+from predictor.benchmarks.harness import OfflineEnvironment, run_scenarios, format_report
+
+SCENARIOS = ["all-data", "predict", "predict-stream", "predict-batch"]
+
+
+class Command(BaseCommand):
+    help = ("Load-test the Canvas sync and predict endpoints against local fakes of Canvas, OpenAI, "
+            "RMP and Supabase; reports p50/p95/p99 latency, throughput and upstream call counts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                            help="scenario to run (repeatable, default: all)")
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--courses", type=int, default=20, help="courses in the fake Canvas account")
+        parser.add_argument("--page-size", type=int, default=10, help="max items per fake Canvas page")
+        parser.add_argument("--professors", type=int, default=5, help="distinct professors requested")
+        parser.add_argument("--syllabi", type=int, default=4, help="distinct syllabi requested (half need the LLM)")
+        parser.add_argument("--sync-runs", type=int, default=3, help="incremental all-data calls after the full sync")
+        parser.add_argument("--canvas-latency", type=float, default=0.02, help="seconds per fake Canvas call")
+        parser.add_argument("--openai-latency", type=float, default=0.3, help="seconds per fake OpenAI call")
+        parser.add_argument("--rmp-latency", type=float, default=0.5, help="seconds per fake RMP lookup")
+        parser.add_argument("--supabase-latency", type=float, default=0.02, help="seconds per fake Supabase call")
+        parser.add_argument("--llm-cache", action="store_true", help="let completions be served from the LLM cache")
+        parser.add_argument("--prediction-cache", action="store_true",
+                            help="let repeated predict-grade requests be served from the prediction cache")
+        parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    def handle(self, *args, **options):
+        env = OfflineEnvironment(
+            canvas=FakeCanvas(courses=options["courses"], page_size=options["page_size"], latency=options["canvas_latency"]),
+            openai=FakeOpenAI(latency=options["openai_latency"]),
+            rmp=FakeRMP(latency=options["rmp_latency"]),
+            supabase=FakeSupabase(latency=options["supabase_latency"]),
+            use_llm_cache=options["llm_cache"],
+            use_prediction_cache=options["prediction_cache"],
+        )
+
+        with env:
+            results = run_scenarios(
+                env,
+                options["scenario"] or SCENARIOS,
+                requests=options["requests"],
+                concurrency=options["concurrency"],
+                professors=options["professors"],
+                syllabus_count=options["syllabi"],
+                sync_runs=options["sync_runs"],
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(format_report(results))
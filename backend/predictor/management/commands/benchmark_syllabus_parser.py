@@ -0,0 +1,68 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from predictor.syllabus_parser import parse_grading_breakdown, CATEGORIES
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / "benchmarks" / "syllabus_corpus.json"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Measure accuracy, LLM calls avoided and latency of the local syllabus parser on a labelled corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+        parser.add_argument("--threshold", type=float, default=None,
+                            help="confidence needed to skip the LLM (default: SYLLABUS_PARSER_MIN_CONFIDENCE)")
+        parser.add_argument("--tolerance", type=float, default=1.0,
+                            help="max per-category error, in percentage points, to count as correct")
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if threshold is None:
+            from predictor.ai_service import SYLLABUS_PARSER_MIN_CONFIDENCE as threshold
+
+        corpus = json.loads(Path(options["corpus"]).read_text())
+        accepted = correct = false_accepts = 0
+        timings = []
+
+        for item in corpus:
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                result = parse_grading_breakdown(item["text"])
+                timings.append(time.perf_counter() - start)
+
+            expected = item.get("expected")
+            took_fast_path = result.weights is not None and result.confidence >= threshold
+
+            if took_fast_path:
+                accepted += 1
+                ok = expected is not None and all(
+                    abs(result.weights[k] - expected[k]) <= options["tolerance"] for k in CATEGORIES
+                )
+                correct += ok
+                false_accepts += not ok
+                verdict = "parser ok" if ok else "parser WRONG"
+            else:
+                verdict = "-> llm"
+
+            self.stdout.write(f"{item.get('name', '?'):<28} conf={result.confidence:<5} {verdict}")
+
+        total = len(corpus)
+        self.stdout.write("")
+        self.stdout.write(f"syllabi:               {total}")
+        self.stdout.write(f"LLM calls avoided:     {accepted}/{total} ({100.0 * accepted / max(total, 1):.0f}%)")
+        self.stdout.write(f"fast-path accuracy:    {correct}/{accepted}" + (f" ({100.0 * correct / accepted:.0f}%)" if accepted else ""))
+        self.stdout.write(f"false accepts:         {false_accepts}")
+        self.stdout.write(
+            f"parse latency:         p50={_percentile(timings, 50) * 1e6:.0f}us "
+            f"p95={_percentile(timings, 95) * 1e6:.0f}us p99={_percentile(timings, 99) * 1e6:.0f}us"
+        )
@@ -0,0 +1,123 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor import ai_service, llm_batch
+from predictor.ai_service import parsed_weights, weights_request
+
+
+CATALOG_KEYS = {"syllabus_text", "syllabus_file"}
+
+
+class Command(BaseCommand):
+    """
+    Batch-precomputes syllabus weights only. Advice used to be precomputed
+    too, from the CANVAS_TOKEN student's synced history, but its prompt
+    carries that student's strengths and predicted grade, so the cached
+    completions never matched any other account's request. Catalog keys it
+    used (professor_id, canvas_course_id) are reported as unused.
+    """
+
+    help = ("Precompute syllabus weights for a catalog of courses through the OpenAI Batch API and load the "
+            "completions into the LLM cache, so predict-grade needs no live OpenAI call to read those syllabi. "
+            "Advice is not precomputed: its prompt includes the requesting student's grades, so it is "
+            "generated per account at request time. Set OPENAI_BASE_URL to run against a local stand-in.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--catalog",
+                            help='JSON list of {"syllabus_text" | "syllabus_file"} (syllabus_file is relative to '
+                                 'the catalog; other keys are reported and ignored)')
+        parser.add_argument("--resume", action="append", metavar="BATCH_ID",
+                            help="wait for and load an already submitted batch (repeatable)")
+        parser.add_argument("--no-wait", action="store_true", help="submit and exit; load later with --resume")
+        parser.add_argument("--poll-interval", type=float, default=30.0, help="seconds between status checks")
+        parser.add_argument("--timeout", type=float, default=24 * 3600.0,
+                            help="give up waiting after this many seconds (the batch keeps running)")
+        parser.add_argument("--dry-run", action="store_true", help="count the work items without submitting")
+
+    def handle(self, *args, **options):
+        if not ai_service.LLM_CACHE_ENABLED:
+            raise CommandError("LLM_CACHE_ENABLED is off; there is no cache to load completions into.")
+        if not options["catalog"] and not options["resume"]:
+            raise CommandError("pass --catalog, --resume or both.")
+        self.options = options
+
+        for batch_id in options["resume"] or ():
+            self._finish(batch_id)
+        if not options["catalog"]:
+            return
+
+        items = self._catalog(Path(options["catalog"]))
+
+        # only weights: they depend on the syllabus alone, so one completion
+        # serves every student. Syllabi the local parser reads need no call.
+        requests = [weights_request(i["syllabus_text"]) for i in items
+                    if i["syllabus_text"] and parsed_weights(i["syllabus_text"]) is None]
+        self._run("weights", requests)
+
+    # ------------------ Work Items ------------------
+    def _catalog(self, path):
+        try:
+            entries = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"catalog {path}: {e}")
+        if not isinstance(entries, list):
+            raise CommandError(f"catalog {path}: expected a JSON list")
+
+        items, unused = [], set()
+        for n, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                raise CommandError(f"catalog entry {n}: expected an object")
+            unused.update(entry.keys() - CATALOG_KEYS)
+            syllabus_text = entry.get("syllabus_text")
+            if entry.get("syllabus_file"):
+                try:
+                    syllabus_text = (path.parent / entry["syllabus_file"]).read_text()
+                except OSError as e:
+                    raise CommandError(f"catalog entry {n}: {e}")
+            # stripped like the predict-grade form input, so keys match
+            items.append({"syllabus_text": (syllabus_text or "").strip()})
+        if unused:
+            self.stderr.write(f"catalog: ignoring {', '.join(sorted(unused))} (only syllabus weights are precomputed)")
+        return items
+
+    # ------------------ Batches ------------------
+    def _run(self, template, requests):
+        distinct = len({r.key for r in requests})
+        requests = llm_batch.pending(requests)
+        self.stdout.write(f"{template}: {distinct} distinct requests, {distinct - len(requests)} already cached, "
+                          f"{len(requests)} to batch")
+        if not requests or self.options["dry_run"]:
+            return
+        try:
+            batches = llm_batch.submit(requests)
+        except Exception as e:
+            raise CommandError(f"{template}: batch submission failed: {e}")
+        for batch in batches:
+            self.stdout.write(f"{template}: submitted batch {batch.id}")
+            if not self.options["no_wait"]:
+                self._finish(batch.id)
+
+    def _finish(self, batch_id):
+        try:
+            batch = llm_batch.wait(batch_id, self.options["poll_interval"], self.options["timeout"],
+                                   on_poll=self._progress)
+        except Exception as e:
+            raise CommandError(f"batch {batch_id}: {e}")
+        if batch.status not in llm_batch.TERMINAL_STATUSES:
+            raise CommandError(f"batch {batch_id}: still {batch.status} after {self.options['timeout']:.0f}s; "
+                               f"load it later with --resume {batch_id}")
+
+        report = llm_batch.load_results(batch)
+        usage = report["usage"]
+        self.stdout.write(f"batch {batch_id}: {batch.status}, {report['cached']} completions cached, "
+                          f"{report['failed']} failed ({usage['prompt_tokens']} prompt / "
+                          f"{usage['completion_tokens']} completion tokens)")
+        for error in report["errors"][:10]:
+            self.stderr.write(f"  {error['custom_id']}: {error['error']}")
+
+    def _progress(self, batch):
+        counts = batch.request_counts
+        done = f" ({counts.completed + counts.failed}/{counts.total})" if counts else ""
+        self.stdout.write(f"batch {batch.id}: {batch.status}{done}")
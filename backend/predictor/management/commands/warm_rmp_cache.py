@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor import rmp_store
+from predictor.rmp_service import warm_school, RMP_CACHE_TTL
+
+
+class Command(BaseCommand):
+    help = "Load every RateMyProfessor professor of one or more schools into the local professor store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--school", action="append", required=True,
+                            help="RMP school id (repeatable), e.g. --school 1381")
+        parser.add_argument("--force", action="store_true",
+                            help="refetch even if the school was loaded within RMP_CACHE_TTL")
+
+    def handle(self, *args, **options):
+        for school_id in options["school"]:
+            fetched_at = rmp_store.school_fetched_at(school_id)
+            if fetched_at and not options["force"] and time.time() - fetched_at < RMP_CACHE_TTL:
+                self.stdout.write(f"school {school_id}: fresh (loaded {int(time.time() - fetched_at)}s ago), skipping")
+                continue
+
+            start = time.perf_counter()
+            try:
+                loaded = warm_school(school_id)
+            except Exception as e:
+                raise CommandError(f"school {school_id}: {e}")
+            self.stdout.write(f"school {school_id}: {loaded} professors in {time.perf_counter() - start:.1f}s")
+
+        self.stdout.write(f"professors in store: {rmp_store.count()}")
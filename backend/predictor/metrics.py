@@ -0,0 +1,250 @@
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# latency buckets (seconds): sub-ms local reads up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# ------------------ Metric Types ------------------
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, key)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in sorted(values.items())]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            counts, total, n = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            # buckets are cumulative: every bound at or above the value counts it
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def samples(self):
+        with self._lock:
+            values = {k: (list(c), s, n) for k, (c, s, n) in self._values.items()}
+        lines = []
+        for key, (counts, total, n) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+# ------------------ Registry ------------------
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, help, labelname, func):
+        """
+        Export an existing stats dict (e.g. LLMCache.stats()) at scrape time:
+        every numeric entry of func() becomes one `name{labelname="key"}` sample.
+        """
+        with self._lock:
+            self._collectors.append((name, help, labelname, func))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+
+        for name, help, labelname, func in collectors:
+            try:
+                stats = func()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in _flatten(stats):
+                lines.append(f'{name}{{{labelname}="{_escape(key)}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats, prefix=""):
+    for key, value in sorted(stats.items()):
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "predictor_stage_seconds", "Time spent in one stage of a request (snapshot load, strengths, rmp, ...).", ["stage"],
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "predictor_request_seconds", "End-to-end request latency by route.", ["route", "method"],
+))
+UPSTREAM_CALLS = REGISTRY.register(Counter(
+    "predictor_upstream_calls_total", "Calls made to Canvas, OpenAI, RMP and Supabase.", ["service", "outcome"],
+))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "predictor_upstream_seconds", "Latency of calls to Canvas, OpenAI, RMP and Supabase.", ["service"],
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "predictor_llm_tokens_total", "OpenAI tokens by prompt template and kind (prompt/completion).", ["template", "kind"],
+))
+PROMPT_TOKENS = REGISTRY.register(Counter(
+    "predictor_prompt_tokens_estimated_total",
+    "Estimated prompt tokens per template before and after compaction (phase=raw/sent).", ["template", "phase"],
+))
+
+
+# ------------------ Server-Timing ------------------
+# The middleware installs a RequestMetrics per request; anything timed while
+# serving it (including pipeline stages, which run with a copy of the request
+# context) is summed into it and emitted as the Server-Timing header, and
+# prompt token counts as X-Prompt-Tokens.
+class RequestMetrics:
+    def __init__(self):
+        self.timings = {}
+        self.prompt_tokens = {}
+
+
+_request_metrics = contextvars.ContextVar("predictor_request_metrics", default=None)
+_timings_lock = threading.Lock()
+
+
+def begin_request():
+    current = RequestMetrics()
+    return current, _request_metrics.set(current)
+
+
+def end_request(token):
+    _request_metrics.reset(token)
+
+
+def _timing_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def record_timing(name, seconds):
+    current = _request_metrics.get()
+    if current is not None:
+        name = _timing_name(name)
+        with _timings_lock:
+            current.timings[name] = current.timings.get(name, 0.0) + seconds
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def record_prompt_tokens(template, raw, sent):
+    PROMPT_TOKENS.inc(raw, template=template, phase="raw")
+    PROMPT_TOKENS.inc(sent, template=template, phase="sent")
+    current = _request_metrics.get()
+    if current is not None:
+        with _timings_lock:
+            before, after = current.prompt_tokens.get(template, (0, 0))
+            current.prompt_tokens[template] = (before + raw, after + sent)
+
+
+def request_prompt_tokens():
+    """A copy of the prompt token counts recorded for the current request so far."""
+    current = _request_metrics.get()
+    if current is None:
+        return {}
+    with _timings_lock:
+        return dict(current.prompt_tokens)
+
+
+def prompt_tokens_header(prompt_tokens):
+    return ", ".join(f"{template};before={raw};after={sent}" for template, (raw, sent) in prompt_tokens.items())
+
+
+# ------------------ Hot-path Helpers ------------------
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_timing(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def upstream(service):
+    """Time and count one upstream call; exceptions are counted as errors."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_CALLS.inc(service=service, outcome=outcome)
+        UPSTREAM_SECONDS.observe(elapsed, service=service)
+        record_timing(service, elapsed)
+
+
+def render():
+    return REGISTRY.render()
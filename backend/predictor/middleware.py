@@ -0,0 +1,54 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request into predictor_request_seconds and returns the
+    per-stage / per-upstream breakdown collected while serving it as a
+    Server-Timing header (visible in the browser's network panel), plus
+    X-Prompt-Tokens with the estimated prompt tokens before/after
+    compaction for every LLM call it made.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        current, token = metrics.begin_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, current, start)
+
+    async def _acall(self, request):
+        current, token = metrics.begin_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, current, start)
+
+    def _finish(self, request, response, current, start):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        metrics.REQUEST_SECONDS.observe(elapsed, route=match.route if match else "unmatched", method=request.method)
+
+        response["Server-Timing"] = metrics.server_timing_header({**current.timings, "total": elapsed})
+        if current.prompt_tokens:
+            response["X-Prompt-Tokens"] = metrics.prompt_tokens_header(current.prompt_tokens)
+        return response
@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+
+# Sync stages run here rather than in the loop's default executor, so a
+# stage abandoned after its timeout never holds up the event loop shutting
+# down (which is what happens per request when served under WSGI).
+_stage_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PIPELINE_MAX_THREADS", "32")), thread_name_prefix="predictor-stage"
+)
+
+
+# ------------------ DAG Runner ------------------
+class StageTimeout(Exception):
+    pass
+
+
+class Degraded(Exception):
+    """
+    Raised by a stage function whose service already fell back on its own
+    (e.g. returned an {"error": ...} pack): `value` is used as the stage's
+    result, and the stage is still recorded in PipelineResult.errors.
+    """
+
+    def __init__(self, value, error):
+        super().__init__(str(error))
+        self.value = value
+
+
+class Stage:
+    """
+    One node of a pipeline. `func` receives the results of `deps` as keyword
+    arguments (by stage name). Sync functions run in a worker thread. If the
+    stage raises or exceeds `timeout` seconds, `fallback(error, **deps)` (or
+    the plain `fallback` value) is used as its result instead.
+    """
+
+    def __init__(self, name, func, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class PipelineResult:
+    def __init__(self):
+        self.values = {}
+        self.errors = {}
+        self.timings = {}
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+async def _run_stage(stage, tasks, result):
+    deps = {d: await tasks[d] for d in stage.deps}
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(stage.func):
+            call = stage.func(**deps)
+        else:
+            # run with the request's context so upstream timings reach Server-Timing
+            context = contextvars.copy_context()
+            call = asyncio.get_running_loop().run_in_executor(
+                _stage_pool, functools.partial(context.run, stage.func, **deps)
+            )
+        value = await asyncio.wait_for(call, stage.timeout)
+    except Degraded as e:
+        result.errors[stage.name] = e
+        value = e.value
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            e = StageTimeout(f"{stage.name} timed out after {stage.timeout}s")
+        result.errors[stage.name] = e
+        value = stage.fallback(e, **deps) if callable(stage.fallback) else stage.fallback
+    finally:
+        result.timings[stage.name] = time.perf_counter() - start
+        # "rmp:123" / "weights:<hash>" (batch stages) share one series
+        metrics.observe_stage(stage.name.split(":")[0], result.timings[stage.name])
+
+    result.values[stage.name] = value
+    return value
+
+
+async def run_pipeline(stages) -> PipelineResult:
+    """
+    Run stages as soon as their dependencies resolve, so independent stages
+    overlap and end-to-end latency follows the critical path.
+    """
+    result = PipelineResult()
+    tasks = {}
+    for stage in stages:
+        unknown = [d for d in stage.deps if d not in tasks]
+        if unknown:
+            raise ValueError(f"stage {stage.name!r} depends on unknown/later stages {unknown}")
+        tasks[stage.name] = asyncio.ensure_future(_run_stage(stage, tasks, result))
+
+    await asyncio.gather(*tasks.values())
+    return result
+
+
+async def iterate_in_thread(iterator):
+    """Drive a blocking iterator (e.g. an OpenAI stream) without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        item = await loop.run_in_executor(_stage_pool, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+# ------------------ Fire-and-forget ------------------
+# Work the response doesn't need to wait for.
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="predictor-bg")
+
+
+def run_in_background(func, *args, **kwargs):
+    return _background.submit(func, *args, **kwargs)
+
+
+# ------------------ Stage Timeouts ------------------
+def stage_timeout(name, default):
+    return float(os.getenv(f"STAGE_TIMEOUT_{name.upper()}", default))
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .ai_service import MODEL, PROMPT_VERSIONS, STRENGTHS_MODE, SYLLABUS_PARSER_MIN_CONFIDENCE
+from .llm_cache import cache_key
+from . import canvas_store
+from . import metrics
+
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "600"))
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "2048"))
+
+# bump when the shape or meaning of a cached /api/predict-grade/ response changes
+PREDICTION_CACHE_VERSION = 1
+
+
+# ------------------ Keys ------------------
+def prediction_key(account_key, snapshot_version, professor_id, syllabus_text, canvas_course_id):
+    """
+    Everything a predict_grade response depends on: whose history and which
+    sync of it, the form inputs (syllabus whitespace-normalized) and the
+    model / prompt versions / scoring modes that turn them into a result.
+    """
+    return cache_key(MODEL, "predict_grade", PREDICTION_CACHE_VERSION, {
+        "account": account_key,
+        "snapshot_version": snapshot_version,
+        "professor_id": str(professor_id) if professor_id is not None else None,
+        "syllabus": syllabus_text,
+        "canvas_course_id": str(canvas_course_id) if canvas_course_id is not None else None,
+        "prompt_versions": PROMPT_VERSIONS,
+        "strengths_mode": STRENGTHS_MODE,
+        "parser_min_confidence": SYLLABUS_PARSER_MIN_CONFIDENCE,
+    })
+
+
+# ------------------ Cache ------------------
+class PredictionCache:
+    """
+    Per-process LRU of finished predict_grade responses with a TTL on every
+    entry. Keys already change when an account re-syncs (snapshot version),
+    and a sync also drops that account's entries right away (see
+    canvas_store.on_invalidate) so they don't sit in memory until evicted.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES, ttl=PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (account_key, value, expires_at)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "invalidated": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] < time.time():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def set(self, key, account_key, value):
+        with self._lock:
+            self._data[key] = (account_key, value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            self.counters["sets"] += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, account_key=None):
+        """Drop one account's predictions (every account's when None)."""
+        with self._lock:
+            keys = [k for k, entry in self._data.items() if account_key is None or entry[0] == account_key]
+            for k in keys:
+                del self._data[k]
+            self.counters["invalidated"] += len(keys)
+
+    def stats(self):
+        with self._lock:
+            stats = {**self.counters, "entries": len(self._data)}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+_cache = PredictionCache()
+
+
+def get_prediction_cache() -> PredictionCache:
+    return _cache
+
+
+canvas_store.on_invalidate(lambda account_key: get_prediction_cache().invalidate(account_key))
+
+metrics.REGISTRY.register_collector(
+    "predictor_prediction_cache", "Memoized predict_grade responses.", "stat", lambda: get_prediction_cache().stats()
+)
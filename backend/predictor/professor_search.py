@@ -0,0 +1,184 @@
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from . import rmp_store
+
+# how often (seconds) a search checks whether the professor store changed
+SEARCH_INDEX_CHECK_INTERVAL = float(os.getenv("SEARCH_INDEX_CHECK_INTERVAL", "30"))
+# minimum trigram similarity for a fuzzy (typo-tolerant) match
+FUZZY_MIN_SIMILARITY = 0.2
+
+
+# ------------------ Normalization ------------------
+def normalize(text):
+    # "José O'Neil-Smith" -> "jose oneil smith"
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"['’`]", "", text)
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ------------------ Index ------------------
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+
+
+class ProfessorIndex:
+    """
+    In-memory name index over the local professor store.
+
+    Every name token is inserted into a prefix trie whose nodes hold the ids
+    of all professors below them, so "jo sm" is two trie walks and a set
+    intersection. Queries the trie can't satisfy (typos, missing letters)
+    fall back to trigram similarity between query tokens and the (much
+    smaller) vocabulary of distinct name tokens.
+    """
+
+    def __init__(self, professors):
+        self.docs = {}
+        self.root = _TrieNode()
+        self.token_ids = defaultdict(set)
+        self.trigram_postings = defaultdict(set)
+
+        for prof in professors:
+            full = normalize(f"{prof['first_name']} {prof['last_name']}")
+            if not full:
+                continue
+            pid = prof["legacy_id"]
+            self.docs[pid] = {**prof, "normalized": full}
+
+            for token in full.split():
+                node = self.root
+                for ch in token:
+                    node = node.children.setdefault(ch, _TrieNode())
+                    node.ids.add(pid)
+                self.token_ids[token].add(pid)
+
+        self.token_grams = {token: trigrams(token) for token in self.token_ids}
+        for token, grams in self.token_grams.items():
+            for gram in grams:
+                self.trigram_postings[gram].add(token)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _prefix_ids(self, token):
+        node = self.root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _prefix_matches(self, tokens):
+        # smallest posting set first keeps the intersection cheap
+        sets = sorted((self._prefix_ids(t) for t in tokens), key=len)
+        if not sets or not sets[0]:
+            return set()
+        matches = set(sets[0])
+        for s in sets[1:]:
+            matches &= s
+            if not matches:
+                break
+        return matches
+
+    def _similar_tokens(self, token):
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigram_postings.get(gram, ()):
+                shared[candidate] += 1
+        similar = {}
+        for candidate, n in shared.items():
+            similarity = n / (len(grams) + len(self.token_grams[candidate]) - n)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                similar[candidate] = similarity
+        return similar
+
+    def _fuzzy_matches(self, tokens):
+        # mean over query tokens of the best similarity any name token reaches
+        best = defaultdict(lambda: [0.0] * len(tokens))
+        for i, token in enumerate(tokens):
+            for candidate, similarity in self._similar_tokens(token).items():
+                for pid in self.token_ids[candidate]:
+                    if similarity > best[pid][i]:
+                        best[pid][i] = similarity
+        return {pid: sum(sims) / len(tokens) for pid, sims in best.items() if all(sims)}
+
+    def search(self, query, limit=10, school_id=None):
+        query = normalize(query)
+        if not query:
+            return []
+        tokens = query.split()
+
+        scored = {}
+        for pid in self._prefix_matches(tokens):
+            name = self.docs[pid]["normalized"]
+            # prefix hits outrank fuzzy ones; whole-name and whole-word hits first
+            scored[pid] = 2.0 + (name == query) + (name.startswith(query)) * 0.5
+        if len(scored) < limit:
+            for pid, similarity in self._fuzzy_matches(tokens).items():
+                scored.setdefault(pid, similarity)
+
+        results = []
+        for pid, score in scored.items():
+            doc = self.docs[pid]
+            if school_id is not None and doc["school_id"] != school_id:
+                continue
+            # break ties toward professors students actually rate
+            results.append((score + math.log1p(doc["num_ratings"] or 0) * 0.01, pid))
+        return [self._result(self.docs[pid], score) for score, pid in heapq.nlargest(limit, results)]
+
+    @staticmethod
+    def _result(doc, score):
+        return {
+            "professor_id": doc["legacy_id"],
+            "name": f"{doc['first_name']} {doc['last_name']}",
+            "department": doc["department"],
+            "school": doc["school_name"],
+            "school_id": doc["school_id"],
+            "avg_rating": doc["avg_rating"],
+            "num_ratings": doc["num_ratings"],
+            "score": round(score, 3),
+        }
+
+
+# ------------------ Shared Index ------------------
+_index = None
+_index_stamp = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index() -> ProfessorIndex:
+    """Built on first use, rebuilt when the professor store gains schools/professors."""
+    global _index, _index_stamp, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < SEARCH_INDEX_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        stamp = rmp_store.stamp()
+        if _index is None or stamp != _index_stamp:
+            _index = ProfessorIndex(rmp_store.iter_professors())
+            _index_stamp = stamp
+        _checked_at = now
+    return _index
+
+
+def search_professors(query, limit=10, school_id=None):
+    return get_index().search(query, limit=limit, school_id=school_id)
@@ -0,0 +1,106 @@
+import json
+import math
+import os
+import re
+
+from .utils import ASSIGNMENT_KEYWORDS, CATEGORY_KEYWORDS
+
+# English prose averages about 4 characters per token on OpenAI tokenizers;
+# close enough for budgeting and reporting without a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+
+DEFAULT_PROMPT_BUDGETS = {"strengths": 400, "weights": 1200, "advice": 800}
+
+# lines worth keeping on their own: the breakdown, extra credit, late policy
+_GRADING = re.compile(
+    r"grad(e|es|ing)\b|breakdown|weight|worth|extra credit|bonus|late\b|lateness|penalt|deduct|curve|"
+    r"drop(ped)? (the )?lowest|make-?up",
+    re.IGNORECASE,
+)
+# "40%", "25 percent", "300 points", "50 pts"
+_AMOUNT = re.compile(r"\d\s*(%|percent\b|pts?\b|points?\b)", re.IGNORECASE)
+_COMPONENT_WORDS = [k for keywords in CATEGORY_KEYWORDS.values() for k in keywords] + ASSIGNMENT_KEYWORDS
+# how far past a "Grading:" style heading to look for its table rows
+_TABLE_LOOKAHEAD = 12
+_MAX_ROW_CHARS = 80
+
+
+def estimate_tokens(text) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def messages_tokens(messages) -> int:
+    # ~4 tokens of framing per chat message
+    return sum(estimate_tokens(m.get("content")) + 4 for m in messages)
+
+
+def prompt_budget(template):
+    """Input-token budget for one call of a prompt template (PROMPT_TOKEN_BUDGET_<TEMPLATE> overrides)."""
+    return int(os.getenv(f"PROMPT_TOKEN_BUDGET_{template.upper()}", DEFAULT_PROMPT_BUDGETS[template]))
+
+
+def compact_json(value):
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def truncate_to_tokens(text, max_tokens):
+    limit = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+
+# ------------------ Syllabus Relevance ------------------
+def _has_component(line):
+    lowered = line.lower()
+    return any(k in lowered for k in _COMPONENT_WORDS)
+
+
+def relevant_syllabus(text, max_tokens):
+    """
+    The grading-relevant lines of a syllabus, in their original order: the
+    breakdown (table rows under a "Grading" heading included), extra credit
+    and late/make-up policy. Office hours, schedules, policies etc. are
+    dropped. Falls back to the head of the text when nothing matches, and
+    never exceeds max_tokens.
+    """
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in (text or "").splitlines()]
+    keep = set()
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        # amounts count on short, table-like lines or next to a component name
+        amount = _AMOUNT.search(line) and (len(line) <= _MAX_ROW_CHARS or _has_component(line))
+        if not (_GRADING.search(line) or amount):
+            continue
+        keep.add(i)
+        if len(line) > _MAX_ROW_CHARS or _AMOUNT.search(line):
+            continue
+        # a heading like "Grading Policy" is followed by its rows, which may
+        # be bare numbers ("Homework | 20"); the table ends at the first
+        # line that doesn't look like a row
+        for j in range(i + 1, min(i + 1 + _TABLE_LOOKAHEAD, len(lines))):
+            row = lines[j]
+            if not row or len(row) > _MAX_ROW_CHARS or not (re.search(r"\d", row) or _has_component(row)):
+                break
+            keep.add(j)
+
+    if not keep:
+        return truncate_to_tokens("\n".join(line for line in lines if line), max_tokens)
+    return truncate_to_tokens("\n".join(lines[i] for i in sorted(keep)), max_tokens)
+
+
+# ------------------ Per-call Budget ------------------
+def fit_messages(messages, max_tokens):
+    """
+    Trim the longest message until the call fits max_tokens. The
+    instructions are short, so in practice this cuts the pasted content.
+    """
+    overflow = messages_tokens(messages) - max_tokens
+    if overflow <= 0:
+        return messages
+    longest = max(range(len(messages)), key=lambda i: len(messages[i].get("content") or ""))
+    content = messages[longest].get("content") or ""
+    trimmed = truncate_to_tokens(content, estimate_tokens(content) - overflow)
+    return [{**m, "content": trimmed} if i == longest else m for i, m in enumerate(messages)]
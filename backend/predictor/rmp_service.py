@@ -1,16 +1,123 @@
+import logging
+import os
+import threading
+import time
 import RateMyProfessor_Database_APIs
+from . import rmp_store
+from .pipeline import run_in_background
+from .singleflight import coalesce
+from . import metrics
 from .utils import safe_float, safe_int
 
 
+# served straight from the local store while younger than this...
+RMP_CACHE_TTL = float(os.getenv("RMP_CACHE_TTL", str(24 * 3600)))
+# ...and served stale (refreshed in the background) until this old
+RMP_CACHE_MAX_STALE = float(os.getenv("RMP_CACHE_MAX_STALE", str(30 * 24 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+
+
+# ------------------ Live Fetch ------------------
+# concurrent misses/refreshes for one professor share a single scrape
+@coalesce("rmp")
+def _fetch_professor(professor_id: int):
+   with metrics.upstream("rmp"):
+       prof = RateMyProfessor_Database_APIs.fetch_a_professor(professor_id)
+   row = rmp_store.professor_row(prof)
+   rmp_store.upsert_professors([row])
+   return row
+
+
+def warm_school(school_id):
+   """Load every professor of a school into the local store in one pass."""
+   with metrics.upstream("rmp"):
+       professors = RateMyProfessor_Database_APIs.fetch_all_professors_from_a_school(school_id)
+   now = time.time()
+   rows = [rmp_store.professor_row(p, school_id=int(school_id), fetched_at=now) for p in professors]
+   rmp_store.save_school(school_id, rows)
+   return len(rows)
+
+
+
+
+# ------------------ Stale-while-revalidate ------------------
+_refreshing = set()
+_refresh_lock = threading.Lock()
+# updated from request threads and refresh threads alike
+counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+   with _counters_lock:
+       counters[name] += 1
+
+
+def _refresh(professor_id: int):
+   try:
+       _fetch_professor(professor_id)
+       _count("refreshes")
+   except Exception as e:
+       _count("errors")
+       logger.warning("RMP refresh failed for professor %s: %s", professor_id, e)
+   finally:
+       with _refresh_lock:
+           _refreshing.discard(professor_id)
+
+
+def _schedule_refresh(professor_id: int):
+   # one refresh in flight per professor, however many requests see it stale
+   with _refresh_lock:
+       if professor_id in _refreshing:
+           return
+       _refreshing.add(professor_id)
+   run_in_background(_refresh, professor_id)
+
+
+def _professor_info(row):
+   return {
+       "name": f"{row['first_name']} {row['last_name']}",
+       "avg_rating": safe_float(row["avg_rating"]),
+       "avg_difficulty": safe_float(row["avg_difficulty"]),
+       "num_ratings": safe_int(row["num_ratings"]),
+       "would_take_again_percent": safe_float(row["would_take_again_percent"]),
+   }
+
+
+def cache_stats():
+   with _counters_lock:
+       stats = dict(counters)
+   return {**stats, "professors": rmp_store.count()}
+
+
+metrics.REGISTRY.register_collector("predictor_rmp_cache", "RMP professor store lookups by outcome.", "stat", cache_stats)
+
+
+
+
 def get_professor_info(professor_id: int):
    try:
-       prof = RateMyProfessor_Database_APIs.fetch_a_professor(professor_id)
-       return {
-           "name": f"{prof.first_name} {prof.last_name}",
-           "avg_rating": safe_float(prof.avg_rating),
-           "avg_difficulty": safe_float(prof.avg_difficulty),
-           "num_ratings": safe_int(prof.num_ratings),
-           "would_take_again_percent": safe_float(prof.would_take_again_percent),
-       }
+       professor_id = int(professor_id)
+       row = rmp_store.get_professor(professor_id)
+       age = time.time() - row["fetched_at"] if row else None
+
+       if row and age < RMP_CACHE_TTL:
+           _count("fresh_hits")
+       elif row and age < RMP_CACHE_MAX_STALE:
+           _count("stale_hits")
+           _schedule_refresh(professor_id)
+       else:
+           _count("misses")
+           try:
+               row = _fetch_professor(professor_id)
+           except Exception:
+               # too old to serve without trying, but better than nothing
+               if row is None:
+                   raise
+       return _professor_info(row)
    except Exception as e:
-       return {"error": str(e)}
\ No newline at end of file
+       _count("errors")
+       return {"error": str(e)}
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+RMP_STORE_PATH = Path(os.getenv("RMP_STORE_PATH", BASE_DIR / "rmp_store.sqlite3"))
+
+PROFESSOR_COLUMNS = [
+    "legacy_id", "first_name", "last_name", "department", "school_id", "school_name",
+    "avg_rating", "avg_difficulty", "num_ratings", "would_take_again_percent", "fetched_at",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS professors (
+    legacy_id INTEGER PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    department TEXT,
+    school_id INTEGER,
+    school_name TEXT,
+    avg_rating REAL,
+    avg_difficulty REAL,
+    num_ratings INTEGER,
+    would_take_again_percent REAL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS professors_school ON professors (school_id);
+CREATE INDEX IF NOT EXISTS professors_name ON professors (last_name, first_name);
+CREATE TABLE IF NOT EXISTS schools (
+    school_id INTEGER PRIMARY KEY,
+    num_professors INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+# ------------------ Connections ------------------
+_local = threading.local()
+
+
+def _conn():
+    # one connection per thread (request threads + the background refresher)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(RMP_STORE_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+# ------------------ Rows ------------------
+def _school_legacy_id(school):
+    if not isinstance(school, dict):
+        return None
+    try:
+        return int(school.get("legacyId"))
+    except (TypeError, ValueError):
+        return None
+
+
+def professor_row(prof, school_id=None, fetched_at=None):
+    """Flatten a Professor / Professor_Gist from RateMyProfessor_Database_APIs."""
+    school = prof.school if isinstance(prof.school, dict) else {}
+    return {
+        "legacy_id": int(prof.legacy_id),
+        "first_name": prof.first_name,
+        "last_name": prof.last_name,
+        "department": prof.department,
+        "school_id": school_id if school_id is not None else _school_legacy_id(school),
+        "school_name": school.get("name"),
+        "avg_rating": prof.avg_rating,
+        "avg_difficulty": prof.avg_difficulty,
+        "num_ratings": prof.num_ratings,
+        "would_take_again_percent": prof.would_take_again_percent,
+        "fetched_at": fetched_at or time.time(),
+    }
+
+
+# ------------------ Reads ------------------
+def get_professor(legacy_id):
+    row = _conn().execute("SELECT * FROM professors WHERE legacy_id = ?", (int(legacy_id),)).fetchone()
+    return dict(row) if row else None
+
+
+def iter_professors(school_id=None):
+    if school_id is None:
+        rows = _conn().execute("SELECT * FROM professors")
+    else:
+        rows = _conn().execute("SELECT * FROM professors WHERE school_id = ?", (int(school_id),))
+    for row in rows:
+        yield dict(row)
+
+
+def school_fetched_at(school_id):
+    row = _conn().execute("SELECT fetched_at FROM schools WHERE school_id = ?", (int(school_id),)).fetchone()
+    return row["fetched_at"] if row else None
+
+
+def count():
+    return _conn().execute("SELECT COUNT(*) FROM professors").fetchone()[0]
+
+
+def stamp():
+    """Changes whenever a professor is added or a school is (re)loaded."""
+    conn = _conn()
+    (professors,) = conn.execute("SELECT COUNT(*) FROM professors").fetchone()
+    (schools,) = conn.execute("SELECT MAX(fetched_at) FROM schools").fetchone()
+    return professors, schools
+
+
+# ------------------ Writes ------------------
+def _upsert(conn, rows):
+    placeholders = ", ".join("?" for _ in PROFESSOR_COLUMNS)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO professors ({', '.join(PROFESSOR_COLUMNS)}) VALUES ({placeholders})",
+        [tuple(r[c] for c in PROFESSOR_COLUMNS) for r in rows],
+    )
+
+
+def upsert_professors(rows):
+    conn = _conn()
+    with conn:
+        _upsert(conn, rows)
+
+
+def save_school(school_id, rows):
+    """Store a whole school's professors (one transaction) and stamp the school."""
+    conn = _conn()
+    with conn:
+        _upsert(conn, rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO schools (school_id, num_professors, fetched_at) VALUES (?, ?, ?)",
+            (int(school_id), len(rows), time.time()),
+        )
@@ -0,0 +1,147 @@
+import numpy as np
+from .utils import normalize_weights
+
+CATEGORIES = ["projects", "assignments", "exams", "participation"]
+
+
+# ------------------ Strengths ------------------
+def strengths_matrix(means, default_overall):
+    """
+    Vectorized core of the strengths engine.
+
+    means: (n, 4) array of category percents in CATEGORIES order, NaN for missing.
+    default_overall: scalar or (n,) fallback used in place of missing categories.
+    Returns (filled (n, 4), overall (n,)).
+    """
+    means = np.asarray(means, dtype=float).reshape(-1, len(CATEGORIES))
+    fallback = np.broadcast_to(np.asarray(default_overall, dtype=float).reshape(-1, 1), means.shape)
+    filled = np.where(np.isnan(means), fallback, means)
+    return filled, filled.mean(axis=1)
+
+
+def _to_row(category_means):
+    return [np.nan if category_means.get(k) is None else float(category_means[k]) for k in CATEGORIES]
+
+
+def score_strengths_batch(category_means_list, default_overalls):
+    """Score many students / course histories in one call."""
+    if not category_means_list:
+        return []
+    filled, overall = strengths_matrix([_to_row(m) for m in category_means_list], default_overalls)
+    return [
+        {
+            "category_strengths": dict(zip(CATEGORIES, row.tolist())),
+            "overall_strength": float(o),
+            # lateness is already baked into the historical percents
+            "punctual_strength": 100.0,
+        }
+        for row, o in zip(filled, overall)
+    ]
+
+
+def score_strengths(category_means, default_overall):
+    return score_strengths_batch([category_means], [default_overall])[0]
+
+
+# ------------------ Prediction ------------------
+DEFAULT_WEIGHTS = {"projects": 25.0, "assignments": 35.0, "exams": 35.0, "participation": 5.0}
+
+PUNCTUAL_BONUS = 2.0
+EXTRA_CREDIT_BONUS = 3.0
+
+
+def _nan(val):
+    try:
+        return float(val) if val is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def predict_matrix(strengths, weights, avg_difficulty, would_take_again, punctual, extra_credit):
+    """
+    Vectorized grading formula over n predictions.
+
+    strengths, weights: (n, 4) in CATEGORIES order; weights already sum to 100.
+    avg_difficulty, would_take_again: (n,) RMP values, NaN when unknown.
+    punctual: (n,) punctual_strength; extra_credit: (n,) bool.
+    Returns (final_score, margin_of_error, low, high), each (n,).
+    """
+    strengths = np.asarray(strengths, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    difficulty = np.asarray(avg_difficulty, dtype=float)
+    wta = np.asarray(would_take_again, dtype=float)
+
+    base = (strengths * weights / 100.0).sum(axis=1)
+
+    # difficulty drag: 4.0-5.0 => -3, 3.3-3.99 => -2, 2.7-3.29 => -1
+    drag = np.select(
+        [difficulty >= 4.0, difficulty >= 3.3, difficulty >= 2.7],
+        [-3.0, -2.0, -1.0],
+        default=0.0,
+    )
+    bonus = np.where(np.asarray(punctual, dtype=float) > 90, PUNCTUAL_BONUS, 0.0)
+    bonus = bonus + np.where(np.asarray(extra_credit, dtype=bool), EXTRA_CREDIT_BONUS, 0.0)
+
+    # margin: unknown => 5, <30 => 6, 30-100 => 4, else 3
+    margin = np.select(
+        [np.isnan(wta), wta < 30, wta <= 100],
+        [5.0, 6.0, 4.0],
+        default=3.0,
+    )
+
+    final = np.clip(base + drag + bonus, 0.0, 100.0)
+    return final, margin, np.clip(final - margin, 0.0, 100.0), np.clip(final + margin, 0.0, 100.0)
+
+
+def resolve_weights(weights):
+    """Fall back to DEFAULT_WEIGHTS when any category is missing, then normalize to 100."""
+    resolved = {}
+    for k in CATEGORIES:
+        try:
+            resolved[k] = float(weights.get(k)) if weights and weights.get(k) is not None else None
+        except (TypeError, ValueError):
+            resolved[k] = None
+
+    if any(v is None for v in resolved.values()) or sum(resolved.values()) <= 0:
+        resolved = dict(DEFAULT_WEIGHTS)
+
+    return normalize_weights(resolved)
+
+
+def has_extra_credit(syllabus_text) -> bool:
+    return "extra credit" in (syllabus_text or "").lower()
+
+
+def score_predictions_batch(strengths, weights_list, rmp_packs, extra_credits):
+    """One strengths profile scored against many (weights, RMP) pairs in a single pass."""
+    resolved = [resolve_weights(w) for w in weights_list]
+    cs = strengths.get("category_strengths") or {}
+    strengths_row = [_nan(cs[k]) if cs.get(k) is not None else 85.0 for k in CATEGORIES]
+    rmps = [rmp or {} for rmp in rmp_packs]
+    n = len(resolved)
+    if not n:
+        return []
+
+    final, margin, low, high = predict_matrix(
+        np.tile(strengths_row, (n, 1)),
+        [[w[k] for k in CATEGORIES] for w in resolved],
+        [_nan(rmp.get("avg_difficulty")) for rmp in rmps],
+        [_nan(rmp.get("would_take_again_percent")) for rmp in rmps],
+        np.full(n, _nan(strengths.get("punctual_strength"))),
+        list(extra_credits),
+    )
+
+    return [
+        {
+            **{k: round(w[k], 2) for k in CATEGORIES},
+            "final_score": round(float(final[i]), 2),
+            "margin_of_error": float(margin[i]),
+            "range": [round(float(low[i]), 2), round(float(high[i]), 2)],
+        }
+        for i, w in enumerate(resolved)
+    ]
+
+
+def score_prediction(strengths, weights, rmp_pack, extra_credit=False):
+    """Deterministic final grade, margin and range for one prediction."""
+    return score_predictions_batch(strengths, [weights], [rmp_pack], [extra_credit])[0]
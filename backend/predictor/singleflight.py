@@ -0,0 +1,147 @@
+import asyncio
+import copy
+import functools
+import json
+import threading
+from concurrent.futures import Future
+
+from . import metrics
+
+
+# ------------------ Single-flight ------------------
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key (the
+    leader) runs the function, every caller that arrives while it is still
+    running waits for and shares its result (or exception). Nothing is
+    cached once the call finishes, so it composes with the real caches.
+
+    `do` is for threads (WSGI workers, pipeline stage threads), `do_async`
+    for coroutines, which coalesce across event loops too.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.counters = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            self.counters["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.counters["upstream"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            # followers get a copy so no caller can mutate another's result
+            return copy.deepcopy(future.result())
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key, func, *args, **kwargs):
+        # keyed on `key` alone: under WSGI every request runs on its own event
+        # loop, so callers on other loops await the leader's result through a
+        # thread-safe Future
+        with self._lock:
+            self.counters["calls"] += 1
+            future = self._tasks.get(key)
+            leader = future is None
+            if leader:
+                future = self._tasks[key] = Future()
+                self.counters["upstream"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if leader:
+            waiter = asyncio.ensure_future(func(*args, **kwargs))
+            waiter.add_done_callback(functools.partial(self._settle, key, future))
+        else:
+            waiter = asyncio.wrap_future(future)
+
+        try:
+            # shielded: a cancelled caller doesn't cancel the call others share
+            result = await asyncio.shield(waiter)
+        except Exception:
+            if leader:
+                self._count("errors")
+            raise
+        return result if leader else copy.deepcopy(result)
+
+    def _settle(self, key, future, task):
+        with self._lock:
+            self._tasks.pop(key, None)
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "in_flight": len(self._calls) + len(self._tasks)}
+
+
+# ------------------ Registry ------------------
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name) -> SingleFlight:
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def stats():
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {g.name: g.stats() for g in groups}
+
+
+metrics.REGISTRY.register_collector("predictor_singleflight", "Coalesced upstream calls by group.", "stat", stats)
+
+
+def call_key(*args, **kwargs):
+    return json.dumps([args, kwargs], sort_keys=True, separators=(",", ":"), default=str)
+
+
+def coalesce(name, key=call_key):
+    """Decorator: single-flight a sync or async function under group `name`."""
+    group = get_group(name)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await group.do_async((func.__qualname__, key(*args, **kwargs)), func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return group.do((func.__qualname__, key(*args, **kwargs)), func, *args, **kwargs)
+        return wrapper
+
+    return decorator
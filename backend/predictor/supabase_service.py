@@ -1,38 +1,483 @@
+import atexit
+import base64
+import json
+import logging
 import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
+from .llm_cache import MemoryLRU
+from . import metrics
 
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+BASE_DIR = Path(__file__).resolve().parent.parent
 
+PREDICTION_TABLE = "prediction"
+LOG_BATCH_SIZE = int(os.getenv("SUPABASE_LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_INTERVAL = float(os.getenv("SUPABASE_LOG_FLUSH_INTERVAL", "2.0"))
+LOG_QUEUE_SIZE = int(os.getenv("SUPABASE_LOG_QUEUE_SIZE", "1000"))
+LOG_SPOOL_PATH = Path(os.getenv("SUPABASE_SPOOL_PATH", BASE_DIR / "prediction_spool.sqlite3"))
+# per table (spool, rejected); the oldest rows go first
+LOG_SPOOL_MAX_ROWS = int(os.getenv("SUPABASE_SPOOL_MAX_ROWS", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+
+
+class SupabaseNotConfigured(Exception):
+   pass
 
 
 def get_supabase() -> Client:
    """Safely create client only when needed (not at module import)."""
    if not SUPABASE_URL or not SUPABASE_KEY:
-       raise Exception("Supabase credentials missing. Check .env values.")
+       raise SupabaseNotConfigured("Supabase credentials missing. Check .env values.")
    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
 
 
+# ------------------ Durable Spool ------------------
+class LogSpool:
+   """
+   Local SQLite file holding rows the upstream couldn't take yet, plus the
+   rows it refused outright (quarantined, never replayed). Each table keeps
+   at most `max_rows`, so a long outage can't fill the disk.
+   """
+
+   def __init__(self, path=LOG_SPOOL_PATH, max_rows=LOG_SPOOL_MAX_ROWS):
+       self.path = path
+       self.max_rows = max_rows
+       self._lock = threading.Lock()
+
+   def _connect(self):
+       conn = sqlite3.connect(self.path, timeout=30)
+       conn.execute("CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, row TEXT NOT NULL)")
+       conn.execute(
+           "CREATE TABLE IF NOT EXISTS rejected ("
+           " id INTEGER PRIMARY KEY AUTOINCREMENT, row TEXT NOT NULL, error TEXT, rejected_at REAL NOT NULL)"
+       )
+       return conn
+
+   def _trim(self, conn, table):
+       cursor = conn.execute(
+           f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} ORDER BY id DESC LIMIT -1 OFFSET ?)",
+           (self.max_rows,),
+       )
+       return cursor.rowcount
+
+   def push(self, rows):
+       """Returns how many of the oldest spooled rows were dropped to stay under max_rows."""
+       with self._lock:
+           conn = self._connect()
+           with conn:
+               conn.executemany("INSERT INTO spool (row) VALUES (?)", [(json.dumps(r),) for r in rows])
+               dropped = self._trim(conn, "spool")
+           conn.close()
+       return dropped
+
+   def peek(self, limit):
+       if not self.path.exists():
+           return []
+       with self._lock:
+           conn = self._connect()
+           rows = conn.execute("SELECT id, row FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+           conn.close()
+       return [(i, json.loads(r)) for i, r in rows]
+
+   def reject(self, row, error):
+       # kept for inspection, out of the replay path
+       with self._lock:
+           conn = self._connect()
+           with conn:
+               conn.execute("INSERT INTO rejected (row, error, rejected_at) VALUES (?, ?, ?)",
+                            (json.dumps(row), error, time.time()))
+               self._trim(conn, "rejected")
+           conn.close()
+
+   def rejected(self):
+       if not self.path.exists():
+           return []
+       with self._lock:
+           conn = self._connect()
+           rows = conn.execute("SELECT row, error FROM rejected ORDER BY id").fetchall()
+           conn.close()
+       return [(json.loads(r), e) for r, e in rows]
+
+   def delete(self, ids):
+       with self._lock:
+           conn = self._connect()
+           with conn:
+               conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+           conn.close()
+
+   def __len__(self):
+       if not self.path.exists():
+           return 0
+       with self._lock:
+           conn = self._connect()
+           (count,) = conn.execute("SELECT COUNT(*) FROM spool").fetchone()
+           conn.close()
+       return count
+
+
+
+
+# ------------------ Write-behind Writer ------------------
+class PredictionLogWriter:
+   """
+   Bounded in-process queue drained by one background thread that bulk
+   inserts batches of up to `batch_size` rows (or whatever arrived within
+   `flush_interval` seconds) through a long-lived Supabase client. Batches
+   the upstream rejects are spooled to a local SQLite file and replayed
+   after the next successful insert (and when the writer starts).
+
+   A batch PostgREST refuses (4xx, e.g. a professor_id that isn't an
+   integer) is retried row by row so one bad row can't hold back the rest;
+   the rows it refuses are quarantined in the spool's `rejected` table.
+
+   Without Supabase credentials there is nothing to replay to, so rows are
+   dropped (counted, with one warning) rather than spooled.
+   """
+
+   def __init__(self, client_factory=get_supabase, table=PREDICTION_TABLE, batch_size=LOG_BATCH_SIZE,
+                flush_interval=LOG_FLUSH_INTERVAL, max_queue=LOG_QUEUE_SIZE, spool=None):
+       self.client_factory = client_factory
+       self.table = table
+       self.batch_size = batch_size
+       self.flush_interval = flush_interval
+       self.spool = spool if spool is not None else LogSpool()
+       self._queue = queue.Queue(maxsize=max_queue)
+       self._client = None
+       self._thread = None
+       self._start_lock = threading.Lock()
+       self._idle = threading.Condition()
+       self._in_flight = 0
+       self._unconfigured = False
+       self._counters_lock = threading.Lock()
+       self.counters = {
+           "enqueued": 0, "inserted": 0, "batches": 0, "spooled": 0, "replayed": 0, "rejected": 0, "dropped": 0,
+           "failures": 0,
+       }
+
+   def _count(self, name, amount=1):
+       with self._counters_lock:
+           self.counters[name] += amount
+
+   # ---- producer side ----
+   def enqueue(self, row):
+       self._ensure_started()
+       try:
+           self._queue.put_nowait(row)
+           self._count("enqueued")
+       except queue.Full:
+           # never block a request on logging; keep the row durable instead
+           if self._unconfigured:
+               self._count("dropped")
+           else:
+               self._spool([row])
+
+   def flush(self, timeout=10.0):
+       """Block until everything queued so far has been inserted or spooled."""
+       deadline = time.monotonic() + timeout
+       with self._idle:
+           while (self._queue.unfinished_tasks or self._in_flight) and time.monotonic() < deadline:
+               self._idle.wait(min(0.05, max(0.0, deadline - time.monotonic())))
+       return self._queue.unfinished_tasks == 0
+
+   def stats(self):
+       with self._counters_lock:
+           counters = dict(self.counters)
+       return {**counters, "queued": self._queue.qsize(), "spool_backlog": len(self.spool)}
+
+   # ---- consumer side ----
+   def _ensure_started(self):
+       if self._thread is None:
+           with self._start_lock:
+               if self._thread is None:
+                   self._thread = threading.Thread(target=self._run, name="supabase-log-writer", daemon=True)
+                   self._thread.start()
+
+   def _next_batch(self):
+       batch = [self._queue.get()]
+       deadline = time.monotonic() + self.flush_interval
+       while len(batch) < self.batch_size:
+           remaining = deadline - time.monotonic()
+           if remaining <= 0:
+               break
+           try:
+               batch.append(self._queue.get(timeout=remaining))
+           except queue.Empty:
+               break
+       return batch
+
+   def _run(self):
+       # pick up anything a previous process left behind
+       if len(self.spool) and self._connect():
+           self._replay_spool()
+       while True:
+           batch = self._next_batch()
+           self._in_flight = len(batch)
+           try:
+               if not self._connect():
+                   self._count("dropped", len(batch))
+                   continue
+               remaining = self._insert(batch)
+               if remaining:
+                   self._spool(remaining)
+               else:
+                   self._replay_spool()
+           finally:
+               for _ in batch:
+                   self._queue.task_done()
+               self._in_flight = 0
+               with self._idle:
+                   self._idle.notify_all()
+
+   def _connect(self):
+       """False when Supabase is not configured; other errors are left to _insert."""
+       if self._client is None:
+           try:
+               self._client = self.client_factory()
+           except SupabaseNotConfigured as e:
+               if not self._unconfigured:
+                   logger.warning("Prediction logging disabled, rows are dropped: %s", e)
+               self._unconfigured = True
+               return False
+           except Exception:
+               pass
+       self._unconfigured = False
+       return True
+
+   def _insert(self, rows):
+       """
+       Returns the rows still to be written, a suffix of `rows`: empty once
+       every row was inserted or quarantined.
+       """
+       try:
+           if self._client is None:
+               self._client = self.client_factory()
+           with metrics.upstream("supabase"):
+               self._client.table(self.table).insert(rows).execute()
+       except Exception as e:
+           self._count("failures")
+           if not _is_rejection(e):
+               # rebuild the client next time in case the connection went bad
+               self._client = None
+               logger.warning("Supabase logging failed, keeping %d rows for retry: %s", len(rows), e)
+               return rows
+           if len(rows) == 1:
+               self._reject(rows[0], e)
+               return []
+           # the batch is refused as a whole; find the bad rows one at a time
+           for i, row in enumerate(rows):
+               if self._insert([row]):
+                   return rows[i:]
+           return []
+
+       self._count("inserted", len(rows))
+       self._count("batches")
+       return []
+
+   def _reject(self, row, error):
+       self._count("rejected")
+       logger.error("Supabase rejected a prediction row, quarantined: %s (%s)", error, row)
+       try:
+           self.spool.reject(row, str(error))
+       except sqlite3.Error as e:
+           logger.error("Supabase log spool failed, dropping rejected row: %s", e)
+
+   def _spool(self, rows):
+       try:
+           dropped = self.spool.push(rows)
+           self._count("spooled", len(rows))
+           if dropped:
+               self._count("dropped", dropped)
+               logger.warning("Supabase log spool is full, dropped the %d oldest rows", dropped)
+       except sqlite3.Error as e:
+           logger.error("Supabase log spool failed, dropping %d rows: %s", len(rows), e)
+
+   def _replay_spool(self):
+       while True:
+           pending = self.spool.peek(self.batch_size)
+           if not pending:
+               return
+           remaining = self._insert([row for _, row in pending])
+           done = len(pending) - len(remaining)
+           self.spool.delete([i for i, _ in pending[:done]])
+           self._count("replayed", done)
+           if remaining:
+               return
+
+
+def _is_rejection(error):
+   """
+   Whether PostgREST refused the rows themselves (a 4xx), so sending them
+   again as-is can never succeed. APIError carries the PostgreSQL SQLSTATE
+   or PGRST code rather than the HTTP status: classes 22 (bad value), 23
+   (constraint) and 42 (unknown column), and PGRST1xx/2xx request errors.
+   A non-JSON error body carries the HTTP status as its code.
+   """
+   if not isinstance(error, APIError):
+       return False
+   code = str(error.code or "")
+   if code.isdigit():
+       return 400 <= int(code) < 500 and int(code) not in (408, 429)
+   return code[:2] in ("22", "23", "42") or code.startswith(("PGRST1", "PGRST2"))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> PredictionLogWriter:
+   global _writer
+   if _writer is None:
+       with _writer_lock:
+           if _writer is None:
+               _writer = PredictionLogWriter()
+               atexit.register(_writer.flush, 5.0)
+   return _writer
+
+
+metrics.REGISTRY.register_collector(
+   "predictor_prediction_log", "Write-behind Supabase prediction logger.", "stat", lambda: get_log_writer().stats()
+)
+
+
+
+
 def log_prediction_to_db(payload: dict):
+   """Queue one prediction row; returns immediately (see PredictionLogWriter)."""
+   get_log_writer().enqueue({
+       "professor_id": payload.get("professor_id"),
+       "course_name": payload.get("course_name"),
+       "final_score": payload.get("final_score"),
+       "margin_of_error": payload.get("margin_of_error"),
+       "predicted_range": payload.get("predicted_range"),
+       "rmp_difficulty": payload.get("rmp_difficulty"),
+       "rmp_wta": payload.get("rmp_wta"),
+       "rmp_reliability": payload.get("rmp_reliability"),
+   })
+
+
+
+
+# ------------------ Prediction History ------------------
+# Newest first, keyset-paginated on (timestamp, id): the cursor is the last
+# row's pair and the next page is "strictly older than it", so every page
+# is one index range scan however deep the client pages (no OFFSET).
+# Indexes that keep this fast as the table grows (run once in Supabase):
+#   create index on prediction (timestamp desc, id desc);
+#   create index on prediction (professor_id, timestamp desc, id desc);
+#   create index on prediction (course_name, timestamp desc, id desc);
+HISTORY_COLUMNS = (
+   "id", "timestamp", "professor_id", "course_name", "final_score", "margin_of_error",
+   "predicted_range", "rmp_difficulty", "rmp_wta", "rmp_reliability",
+)
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+# recent pages are answered locally for this long (new rows show up after it)
+HISTORY_CACHE_TTL = float(os.getenv("PREDICTION_HISTORY_CACHE_TTL", "15"))
+
+_history_cache = MemoryLRU(max_entries=256, ttl=HISTORY_CACHE_TTL)
+_read_client = None
+_read_client_lock = threading.Lock()
+
+
+
+
+def _history_client() -> Client:
+   global _read_client
+   if _read_client is None:
+       with _read_client_lock:
+           if _read_client is None:
+               _read_client = get_supabase()
+   return _read_client
+
+
+
+
+def encode_cursor(row):
+   raw = json.dumps([row["timestamp"], row["id"]], separators=(",", ":")).encode()
+   return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+
+
+def decode_cursor(cursor):
+   # both values end up inside a PostgREST filter string, so only a real
+   # timestamp (re-serialized) and an integer id get through
    try:
-       supabase = get_supabase()
+       timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+       if not isinstance(timestamp, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+           raise ValueError("invalid cursor")
+       return _timestamp(timestamp, "cursor"), row_id
+   except (ValueError, TypeError):
+       raise ValueError("invalid cursor")
+
+
+
+
+def _timestamp(value, name):
+   try:
+       return datetime.fromisoformat(value).isoformat()
+   except ValueError:
+       raise ValueError(f"{name} must be an ISO 8601 date or timestamp")
+
+
+
+
+def fetch_prediction_history(fields=None, professor_id=None, course_name=None, since=None, until=None,
+                            cursor=None, limit=HISTORY_DEFAULT_LIMIT):
+   """
+   One page of logged predictions: {"items": [...], "next_cursor": str | None}.
+   `fields` projects columns (id and timestamp are always included, the
+   cursor is built from them); since/until bound timestamp as [since, until).
+   Raises ValueError on bad arguments.
+   """
+   unknown = [f for f in fields or () if f not in HISTORY_COLUMNS]
+   if unknown:
+       raise ValueError(f"unknown fields: {', '.join(unknown)}")
+   columns = ["id", "timestamp"] + [f for f in fields or HISTORY_COLUMNS if f not in ("id", "timestamp")]
+   limit = min(max(int(limit), 1), HISTORY_MAX_LIMIT)
+   since = _timestamp(since, "since") if since else None
+   until = _timestamp(until, "until") if until else None
+   after = decode_cursor(cursor) if cursor else None
 
+   key = json.dumps([columns, professor_id, course_name, since, until, after, limit], default=str)
+   page = _history_cache.get(key)
+   if page is not None:
+       return page
 
-       supabase.table("prediction").insert({
-           "professor_id": payload.get("professor_id"),
-           "course_name": payload.get("course_name"),
-           "final_score": payload.get("final_score"),
-           "margin_of_error": payload.get("margin_of_error"),
-           "predicted_range": payload.get("predicted_range"),
-           "rmp_difficulty": payload.get("rmp_difficulty"),
-           "rmp_wta": payload.get("rmp_wta"),
-           "rmp_reliability": payload.get("rmp_reliability"),
-       }).execute()
+   query = _history_client().table(PREDICTION_TABLE).select(",".join(columns))
+   if professor_id is not None:
+       query = query.eq("professor_id", professor_id)
+   if course_name:
+       query = query.eq("course_name", course_name)
+   if since:
+       query = query.gte("timestamp", since)
+   if until:
+       query = query.lt("timestamp", until)
+   if after:
+       timestamp, row_id = after
+       query = query.or_(f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt.{row_id})')
 
+   # one extra row tells us whether another page exists
+   query = query.order("timestamp", desc=True).order("id", desc=True).limit(limit + 1)
+   with metrics.upstream("supabase"):
+       rows = query.execute().data
 
-   except Exception as e:
-       print("Supabase logging failed:", e)
\ No newline at end of file
+   items = rows[:limit]
+   page = {"items": items, "next_cursor": encode_cursor(items[-1]) if len(rows) > limit else None}
+   _history_cache.set(key, page)
+   return page
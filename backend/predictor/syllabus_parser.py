@@ -0,0 +1,127 @@
+import re
+from .utils import ASSIGNMENT_KEYWORDS, CATEGORY_KEYWORDS, standardize_category
+
+CATEGORIES = ["projects", "assignments", "exams", "participation"]
+
+# lines that carry a percentage but are not part of the breakdown
+NOISE_KEYWORDS = [
+    "late", "penalty", "deduct", "per day", "curve", "drop", "lowest",
+    "total", "grade scale", "minimum", "at least", "office hour", "refund",
+    "extra credit", "bonus",
+]
+
+# "A 93-100%" / "90 - 100%: A" style grade-scale rows (but not "Test 1 - 15%")
+_RANGE = re.compile(r"^(?:[A-F][+-]?\s*[:=]?\s*)?\d{1,3}(?:\.\d+)?\s*[-–]\s*\d{1,3}(?:\.\d+)?\s*%")
+
+_NUMBER = r"(?P<num>\d{1,4}(?:\.\d+)?)"
+_UNIT = r"\s*(?P<unit>%|percent\b|pts\b|points\b)"
+_LABEL = r"(?P<label>[A-Za-z][A-Za-z0-9 &/'\-]{0,60}?)"
+
+# "Exams: 40%", "Projects ..... 300 points", "Homework | 25 percent"
+_LABEL_FIRST = re.compile(_LABEL + r"\s*[:=|.\-–—…\t ]*\s*" + _NUMBER + _UNIT, re.IGNORECASE)
+# "40% Exams", "40% - Final exam"
+_NUMBER_FIRST = re.compile(_NUMBER + _UNIT + r"\s*(?:of\b|for\b|[:=|\-–—])?\s*" + _LABEL + r"[\s.!]*$", re.IGNORECASE)
+
+_LETTER_GRADE = re.compile(r"^[A-F][+-]?(?:$|[\s\d])")
+
+
+class ParseResult:
+    def __init__(self, weights, confidence, components, unit):
+        self.weights = weights
+        self.confidence = confidence
+        self.components = components
+        self.unit = unit
+
+    def as_dict(self):
+        return {
+            "weights": self.weights,
+            "confidence": self.confidence,
+            "components": self.components,
+            "unit": self.unit,
+        }
+
+
+def _segments(text):
+    for line in (text or "").splitlines():
+        # "(2 x 15%)" style details would otherwise be read as their own rows
+        line = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", line)
+        for segment in re.split(r"[,;•]| {3,}(?=[A-Za-z])", line):
+            # "Final grade breakdown: 30% homework" -> "30% homework"
+            head, _, tail = segment.rpartition(":")
+            if head and re.search(r"[A-Za-z]", tail) and re.search(r"\d", tail):
+                segment = tail
+            segment = segment.strip(" \t*-–—:")
+            if segment:
+                yield segment
+
+
+def _is_known_heading(label):
+    n = label.lower()
+    return any(k in n for keywords in CATEGORY_KEYWORDS.values() for k in keywords) or any(
+        k in n for k in ASSIGNMENT_KEYWORDS
+    )
+
+
+def _components(text):
+    found, seen = [], set()
+    for segment in _segments(text):
+        lowered = segment.lower()
+        if any(k in lowered for k in NOISE_KEYWORDS) or _RANGE.match(segment):
+            continue
+
+        # "Homework 20% Quizzes 10% Midterm 30%" can sit on one line
+        matches = list(_LABEL_FIRST.finditer(segment)) or list(_NUMBER_FIRST.finditer(segment))
+        for match in matches:
+            label = match.group("label").strip(" .-")
+            if len(label) < 2 or _LETTER_GRADE.match(label):
+                continue
+
+            unit = "percent" if match.group("unit").lower() in ("%", "percent") else "points"
+            value = float(match.group("num"))
+
+            # the same breakdown is often repeated (summary table + details)
+            key = (label.lower(), value, unit)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            found.append({
+                "label": label,
+                "value": value,
+                "unit": unit,
+                "category": standardize_category(label),
+                "known": _is_known_heading(label),
+            })
+    return found
+
+
+def parse_grading_breakdown(text) -> ParseResult:
+    """
+    Find a literal percentage (or points) breakdown in syllabus text and map
+    each heading onto the four grading categories.
+
+    Confidence is 0-1: highest when several recognised headings add up to
+    ~100%, lower for points tables, unknown headings or odd totals.
+    """
+    components = _components(text)
+    percents = [c for c in components if c["unit"] == "percent" and c["value"] <= 100]
+    points = [c for c in components if c["unit"] == "points"]
+
+    rows, unit = (percents, "percent") if percents else (points, "points")
+    total = sum(c["value"] for c in rows)
+    if len(rows) < 2 or total <= 0:
+        return ParseResult(None, 0.0, components, unit)
+
+    weights = {k: 0.0 for k in CATEGORIES}
+    for c in rows:
+        weights[c["category"]] += c["value"] * 100.0 / total
+
+    known = sum(1 for c in rows if c["known"]) / len(rows)
+    if unit == "percent":
+        # a breakdown that doesn't reach 100% is probably missing a row
+        fit = max(0.0, 1.0 - abs(total - 100.0) / 20.0)
+    else:
+        fit = 0.85
+
+    confidence = round(fit * (0.5 + 0.5 * known) * (1.0 if len(rows) >= 3 else 0.8), 3)
+    return ParseResult({k: round(v, 2) for k, v in weights.items()}, confidence, rows, unit)
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from .canvas_client import canvas_loop, default_account
+from .canvas_service import fetch_all_data_async
+from . import metrics
+
+# finished jobs stay pollable for this long
+SYNC_JOB_RETENTION = float(os.getenv("SYNC_JOB_RETENTION", "900"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+# ------------------ Job ------------------
+class SyncJob:
+    """One Canvas sync; also the progress sink handed to fetch_all_data_async."""
+
+    def __init__(self, account, incremental):
+        self.id = uuid.uuid4().hex
+        self.account = account
+        self.account_key = account.key
+        self.incremental = incremental
+        self.status = QUEUED
+        self.courses_total = None
+        self.courses_done = 0
+        self.errors = []
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._lock = threading.Lock()
+
+    def start(self, total):
+        with self._lock:
+            self.courses_total = total
+
+    def advance(self, course_id, error=None):
+        with self._lock:
+            self.courses_done += 1
+            if error:
+                self.errors.append({"course_id": course_id, "error": error})
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self, include_result=True):
+        with self._lock:
+            job = {
+                "job_id": self.id,
+                "status": self.status,
+                "incremental": self.incremental,
+                "courses_done": self.courses_done,
+                "courses_total": self.courses_total,
+                "errors": list(self.errors),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+        if self.error:
+            job["error"] = self.error
+        if include_result and self.status == SUCCEEDED:
+            job["result"] = self.result
+        return job
+
+
+# ------------------ Runner ------------------
+class SyncJobRunner:
+    """
+    Runs Canvas syncs off the request path, on the long-lived Canvas event
+    loop (canvas_client.canvas_loop), so every job shares its
+    AsyncCanvasClient and connection pool. A sync requested while another
+    one is queued or running for the same account joins it instead of
+    crawling twice: an incremental request joins any active sync, a full
+    one (?full=1) only another full sync, since an incremental sync skips
+    courses a full one must re-read.
+
+    The store is only written when a sync finishes, in one transaction, so
+    predictions keep reading the previous snapshot while a job runs.
+    """
+
+    def __init__(self, sync=fetch_all_data_async, retention=SYNC_JOB_RETENTION):
+        self.sync = sync
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}  # (account key, incremental) -> job
+        self.counters = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0}
+
+    def submit(self, account, incremental=True):
+        """
+        Returns (job, created) for a CanvasAccount; created is False when an
+        active job for the same account was joined.
+        """
+        with self._lock:
+            self._prune()
+            joinable = [(account.key, False), (account.key, True)] if incremental else [(account.key, False)]
+            for key in joinable:
+                job = self._active.get(key)
+                if job is not None:
+                    self.counters["deduplicated"] += 1
+                    return job, False
+
+            job = SyncJob(account, incremental)
+            self._jobs[job.id] = self._active[(account.key, incremental)] = job
+            self.counters["submitted"] += 1
+            job.future = asyncio.run_coroutine_threadsafe(self._run(job), canvas_loop())
+            return job, True
+
+    async def _run(self, job):
+        job.started_at = time.time()
+        job.status = RUNNING
+        status, error, result = FAILED, "cancelled", None
+        try:
+            result = await self.sync(incremental=job.incremental, progress=job, account=job.account)
+            status, error = SUCCEEDED, None
+        except Exception as e:
+            error = str(e)
+        finally:
+            with job._lock:
+                # finished_at first: a job that reads as finished always has one
+                job.finished_at = time.time()
+                job.result, job.error, job.status = result, error, status
+            with self._lock:
+                self.counters[status] += 1
+                key = (job.account_key, job.incremental)
+                if self._active.get(key) is job:
+                    del self._active[key]
+        return job
+
+    def get(self, job_id, account=None):
+        """A job by id, only if it belongs to `account` (other users' grades stay private)."""
+        account = account or default_account()
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.account_key == account.key else None
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [j.id for j in self._jobs.values() if j.finished and (j.finished_at or 0) < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "active": len(self._active), "retained": len(self._jobs)}
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> SyncJobRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = SyncJobRunner()
+    return _runner
+
+
+metrics.REGISTRY.register_collector(
+    "predictor_sync_jobs", "Background Canvas sync jobs.", "stat", lambda: get_runner().stats()
+)
+
+
+def start_sync(account=None, incremental=True):
+    return get_runner().submit(account or default_account(), incremental)
+
+
+async def wait_for(job, timeout):
+    """Wait up to `timeout` seconds for a job; returns whether it finished."""
+    try:
+        await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return job.finished
@@ -1,4 +1,1771 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
+import RateMyProfessor_Database_APIs
+
+from django.core.management import CommandError, call_command
+
+from django.test import AsyncClient, Client, SimpleTestCase
+
+from predictor import (
+    ai_service, canvas_client, canvas_service, canvas_store, llm_batch, llm_cache, prediction_cache, professor_search,
+    prompt_compaction, rmp_service, rmp_store, scoring, supabase_service, sync_jobs, views,
+)
+from predictor.canvas_client import AsyncCanvasClient, CanvasAccount, CanvasClient, CanvasSettings
+from predictor.benchmarks.fakes import FAKE_ADVICE, FAKE_WEIGHTS, FakeCanvas, FakeOpenAI, FakeRMP, FakeSupabase
+from predictor.benchmarks.harness import FAKE_SUPABASE_KEY, FREEFORM_SYLLABUS, PARSEABLE_SYLLABUS, OfflineEnvironment
+from predictor.singleflight import SingleFlight
+from predictor.syllabus_parser import parse_grading_breakdown
+from predictor.utils import standardize_category
+
+
+# ------------------ Canvas Client ------------------
+class FlakyCanvas(FakeCanvas):
+    """FakeCanvas that answers the next `failures` requests with a 503."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = 0
+
+    def route(self, method, path, query, body, headers):
+        with self._lock:
+            failing, self.failures = self.failures > 0, max(self.failures - 1, 0)
+        if failing:
+            return 503, {}, {"errors": [{"message": "try again"}]}
+        return super().route(method, path, query, body, headers)
+
+
+class CanvasClientTests(SimpleTestCase):
+    """Each check runs against the requests client and its httpx counterpart."""
+
+    def setUp(self):
+        self.canvas = FlakyCanvas(courses=25, page_size=10).start()
+        self.addCleanup(self.canvas.stop)
+        self.settings = CanvasSettings(base_url=f"{self.canvas.url}/api/v1", token="test", max_retries=2,
+                                       backoff_factor=0)
+
+    def clients(self):
+        """(name, call) pairs; call(method, *args) runs a client method to completion."""
+        sync_client = CanvasClient(self.settings)
+
+        def call_async(method, *args):
+            async def run():
+                client = AsyncCanvasClient(self.settings)
+                try:
+                    return await getattr(client, method)(*args)
+                finally:
+                    await client.http.aclose()
+            return asyncio.run(run())
+
+        return [("sync", lambda method, *args: getattr(sync_client, method)(*args)), ("async", call_async)]
+
+    def test_get_all_follows_link_headers(self):
+        for name, call in self.clients():
+            with self.subTest(client=name):
+                before = self.canvas.total_calls
+                courses = call("get_all", "courses")
+                self.assertEqual([c["id"] for c in courses], [c["id"] for c in self.canvas.courses])
+                self.assertEqual(self.canvas.total_calls - before, 3)
+
+    def test_retries_5xx_then_gives_up(self):
+        for name, call in self.clients():
+            with self.subTest(client=name):
+                self.canvas.failures = 2
+                self.assertEqual(call("get_json", "courses/1000")["id"], 1000)
+
+                before = self.canvas.total_calls
+                self.canvas.failures = 5
+                response = call("get", "courses/1000")
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(self.canvas.total_calls - before, 3)
+                self.canvas.failures = 0
+
+    def test_get_all_if_changed(self):
+        path, params = "courses/1000/assignment_groups", {"include[]": "assignments"}
+        for name, call in self.clients():
+            with self.subTest(client=name):
+                groups, validators = call("get_all_if_changed", path, params)
+                self.assertEqual(len(groups), 4)
+                self.assertEqual(validators["etag"], '"groups-1000"')
+
+                self.assertEqual(call("get_all_if_changed", path, params, validators), (None, validators))
+
+    def test_error_body_is_returned_as_is(self):
+        for name, call in self.clients():
+            with self.subTest(client=name):
+                self.assertIn("errors", call("get_all", "courses/9999/assignment_groups"))
+
+
+# ------------------ Concurrent Canvas Fan-out ------------------
+class ConcurrencyCanvas(FakeCanvas):
+    """FakeCanvas that records the most requests it was serving at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = self.max_in_flight = 0
+
+    def route(self, method, path, query, body, headers):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.02)
+            return super().route(method, path, query, body, headers)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class CanvasFanOutTests(SimpleTestCase):
+    POOL_SIZE = 3
+
+    def setUp(self):
+        self.env = OfflineEnvironment(ConcurrencyCanvas(courses=8, page_size=50), FakeOpenAI(), FakeRMP(),
+                                      FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        patcher = mock.patch.object(canvas_client, "_client", CanvasClient(CanvasSettings(
+            base_url=f"{self.env.canvas.url}/api/v1", token="test", pool_size=self.POOL_SIZE,
+        )))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the next async client is built from the patched settings
+        canvas_client.close_async_client()
+
+    def test_requests_fan_out_up_to_the_pool_size(self):
+        all_data = canvas_service.fetch_all_data(incremental=False)
+        self.assertEqual(self.env.canvas.max_in_flight, self.POOL_SIZE)
+        self.assertEqual([c["id"] for c in all_data], [c["id"] for c in self.env.canvas.courses])
+
+    def test_output_matches_the_canvas_data(self):
+        canvas_service.fetch_all_data(incremental=False)
+        snapshot = canvas_store.get_snapshot()
+        for course in self.env.canvas.courses:
+            groups = {g["name"]: g for g in self.env.canvas._groups(course["id"])}
+            scores = {s["assignment_id"]: s["score"] for s in self.env.canvas._submissions(course["id"])}
+            for group, category in (("Exams", "exams"), ("Homework", "assignments"), ("Projects", "projects")):
+                assignments = groups[group]["assignments"]
+                expected = 100.0 * sum(scores[a["id"]] for a in assignments) / (10 * len(assignments))
+                with self.subTest(course=course["id"], category=category):
+                    self.assertAlmostEqual(snapshot.by_id[course["id"]][category], expected)
+            self.assertEqual(snapshot.by_id[course["id"]]["name"], course["name"])
+
+
+# ------------------ Async Canvas Parity ------------------
+class AsyncCanvasParityTests(SimpleTestCase):
+    def setUp(self):
+        # small pages, so both clients follow Link headers
+        canvas = FakeCanvas(courses=4, assignments_per_group=2, page_size=3)
+        self.env = OfflineEnvironment(canvas, FakeOpenAI(), FakeRMP(), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+
+    def test_courses(self):
+        courses = canvas_service.fetch_courses()
+        self.assertEqual([c["id"] for c in courses], [c["id"] for c in self.env.canvas.courses])
+        self.assertEqual(asyncio.run(canvas_service.fetch_courses_async()), courses)
+        self.assertEqual(Client().get("/api/canvas/courses/").json(), courses)
+
+    def test_category_grades(self):
+        for course in self.env.canvas.courses:
+            with self.subTest(course=course["id"]):
+                grades = canvas_service.fetch_category_grades(course["id"])
+                self.assertEqual(asyncio.run(canvas_service.fetch_category_grades_async(course["id"])), grades)
+                self.assertEqual(Client().get(f"/api/canvas/{course['id']}/grades/").json(), grades)
+
+    def test_all_data(self):
+        blocking = canvas_service.fetch_all_data(incremental=False)
+        awaited = asyncio.run(canvas_service.fetch_all_data_async(incremental=False))
+        self.assertEqual(awaited, blocking)
+        self.assertEqual(len(blocking), len(self.env.canvas.courses))
+
+    def test_blocking_wrapper_refuses_to_block_a_running_loop(self):
+        async def caller():
+            canvas_service.fetch_all_data()
+
+        with self.assertRaisesMessage(RuntimeError, "await fetch_all_data_async instead"):
+            asyncio.run(caller())
+
+    def test_async_client_is_bound_to_the_canvas_loop(self):
+        async def caller():
+            canvas_client.get_async_client()
+
+        with self.assertRaisesMessage(RuntimeError, "bound to canvas_loop()"):
+            asyncio.run(caller())
+
+
+# ------------------ Incremental Canvas Sync ------------------
+class RegradingCanvas(FakeCanvas):
+    """FakeCanvas whose `regraded` courses get full marks, graded after any previous sync."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.regraded = set()
+
+    def _submissions(self, cid):
+        subs = super()._submissions(cid)
+        if cid in self.regraded:
+            subs = [{**s, "score": 10, "graded_at": "2099-01-01T00:00:00Z"} for s in subs]
+        return subs
+
+
+class IncrementalSyncTests(SimpleTestCase):
+    # four courses, one page per list: 1001 and 1003 are concluded, 1000 and
+    # 1002 still active
+    ACTIVE = (1000, 1002)
+
+    def setUp(self):
+        self.env = OfflineEnvironment(RegradingCanvas(courses=4, page_size=50), FakeOpenAI(), FakeRMP(), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+
+    def sync(self, incremental=True):
+        before = self.env.canvas.total_calls
+        asyncio.run(canvas_service.fetch_all_data_async(incremental=incremental))
+        return self.env.canvas.total_calls - before
+
+    def test_unchanged_courses_cost_only_probes(self):
+        full = self.sync(incremental=False)
+        # the course list, then a two-request probe per active course
+        self.assertEqual(self.sync(), 1 + 2 * len(self.ACTIVE))
+        self.assertLess(1 + 2 * len(self.ACTIVE), full)
+
+    def test_new_grading_refetches_only_that_course(self):
+        self.sync(incremental=False)
+        before = canvas_store.get_snapshot().by_id[1002]
+        self.env.canvas.regraded.add(1000)
+
+        # the probes, then detail, enrollments, groups and submissions for 1000 only
+        self.assertEqual(self.sync(), 1 + 2 * len(self.ACTIVE) + 4)
+        snapshot = canvas_store.get_snapshot()
+        self.assertEqual(snapshot.by_id[1000]["exams"], 100.0)
+        self.assertEqual(snapshot.by_id[1002], before)
+
+    def test_full_sync_ignores_previous_state(self):
+        self.sync(incremental=False)
+        self.env.canvas.regraded.add(1001)
+        # a concluded course is never probed again, only a full sync sees it
+        self.sync()
+        self.assertNotEqual(canvas_store.get_snapshot().by_id[1001]["exams"], 100.0)
+        self.sync(incremental=False)
+        self.assertEqual(canvas_store.get_snapshot().by_id[1001]["exams"], 100.0)
+
+
+# ------------------ Category Aggregates ------------------
+def course_row(cid, course_code, term, percents, points=None):
+    return {
+        "course_id": cid, "name": f"Course {cid}", "course_code": course_code, "term": term,
+        "final_grade": "A", "final_score": 93.0, **{c: percents.get(c) for c in canvas_store.CATEGORIES},
+        "points": points or {},
+    }
+
+
+class CategoryAggregateTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "canvas_store.sqlite3"
+        patcher = mock.patch.object(canvas_store, "STORE_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        canvas_store.invalidate()
+        self.addCleanup(canvas_store.invalidate)
+
+    def aggregates(self, rebuild=False):
+        conn = canvas_store._connect(self.path)
+        try:
+            if rebuild:
+                canvas_store._rebuild_aggregates(conn)
+            rows = conn.execute("SELECT * FROM category_aggregates ORDER BY term, subject, category").fetchall()
+            return [tuple(r) for r in rows]
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def assertAggregatesEqual(self, actual, expected):
+        self.assertEqual([r[:3] for r in actual], [r[:3] for r in expected])
+        for a, e in zip(actual, expected):
+            for x, y in zip(a[3:], e[3:]):
+                self.assertAlmostEqual(x, y, places=9, msg=a[:3])
+
+    def test_deltas_match_a_full_rescan(self):
+        syncs = [
+            [
+                course_row(1, "2241 CS 0401", "Fall", {"exams": 80.0, "projects": 90.0}, {"exams": [8, 10]}),
+                course_row(2, "2241 MATH 0220", "Fall", {"exams": 70.0, "assignments": 95.0}),
+                course_row(3, "2244 CS 0445", "Spring", {"participation": 100.0}, {"participation": [5, 5]}),
+            ],
+            [
+                # 1 changed, 2 unchanged, 3 removed, 4 added
+                course_row(1, "2241 CS 0401", "Fall", {"exams": 60.0}, {"exams": [6, 10], "projects": [0, 4]}),
+                course_row(2, "2241 MATH 0220", "Fall", {"exams": 70.0, "assignments": 95.0}),
+                course_row(4, "2244 CS 1501", "Spring", {"exams": 100.0, "assignments": 85.0}),
+            ],
+            [],
+        ]
+        for rows in syncs:
+            canvas_store.save_sync(rows, {})
+            self.assertAggregatesEqual(self.aggregates(), self.aggregates(rebuild=True))
+        self.assertEqual(self.aggregates(), [])
+
+    def test_slice_means(self):
+        canvas_store.save_sync([
+            course_row(1, "2241 CS 0401", "Fall", {"exams": 80.0}, {"exams": [40, 50]}),
+            course_row(2, "2244 CS 0445", "Spring", {"exams": 60.0}, {"exams": [30, 50]}),
+            course_row(3, "2241 MATH 0220", "Fall", {"exams": 90.0}),
+        ], {})
+        snapshot = canvas_store.get_snapshot()
+        self.assertAlmostEqual(snapshot.category_means()["exams"], 230.0 / 3)
+        self.assertAlmostEqual(snapshot.category_means(subject="CS")["exams"], 70.0)
+        self.assertAlmostEqual(snapshot.category_means(term="Fall")["exams"], 85.0)
+        self.assertIsNone(snapshot.category_means(term="Fall")["projects"])
+        self.assertAlmostEqual(snapshot.point_weighted_means(subject="CS")["exams"], 70.0)
+        self.assertAlmostEqual(snapshot.point_weighted_means()["exams"], 70.0)
+
+
+# ------------------ Canvas Snapshot Cache ------------------
+class SnapshotCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = canvas_store.SnapshotCache()
+        for name, value in (
+            ("STORE_PATH", Path(tmp.name) / "canvas_store.sqlite3"),
+            ("CANVAS_STORE_DIR", Path(tmp.name) / "canvas_users"),
+            ("_cache", self.cache),
+        ):
+            patcher = mock.patch.object(canvas_store, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def save(self, account_key, *exams):
+        rows = [course_row(i, "2241 CS 0401", "Fall", {"exams": e}) for i, e in enumerate(exams, start=1)]
+        canvas_store.save_sync(rows, {}, account_key)
+
+    def test_repeated_reads_share_one_snapshot(self):
+        self.save("alice", 80.0)
+        first = canvas_store.get_snapshot("alice")
+        self.assertIs(canvas_store.get_snapshot("alice"), first)
+        self.assertEqual((self.cache.counters["loads"], self.cache.counters["hits"]), (1, 1))
+
+    def test_a_sync_replaces_the_snapshot(self):
+        self.save("alice", 80.0)
+        before = canvas_store.get_snapshot("alice")
+        self.save("alice", 80.0, 60.0)
+        after = canvas_store.get_snapshot("alice")
+        self.assertGreater(after.version, before.version)
+        self.assertEqual(len(after), 2)
+        self.assertAlmostEqual(after.category_means()["exams"], 70.0)
+        # the old snapshot is untouched for requests still holding it
+        self.assertEqual(len(before), 1)
+
+    def test_write_by_another_process_is_picked_up(self):
+        self.save("alice", 80.0)
+        before = canvas_store.get_snapshot("alice")
+        # what another worker's save_sync looks like from here: the file
+        # changes, but nothing calls invalidate() in this process
+        with mock.patch.object(canvas_store, "invalidate"):
+            self.save("alice", 50.0)
+        after = canvas_store.get_snapshot("alice")
+        self.assertIsNot(after, before)
+        self.assertAlmostEqual(after.category_means()["exams"], 50.0)
+
+    def test_file_change_without_a_new_version_keeps_the_snapshot(self):
+        self.save("alice", 80.0)
+        before = canvas_store.get_snapshot("alice")
+        conn = canvas_store._connect(canvas_store.store_path("alice"))
+        with conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('touched', '1')")
+        conn.close()
+        self.assertIs(canvas_store.get_snapshot("alice"), before)
+        self.assertEqual(self.cache.counters["loads"], 2)
+
+    def test_accounts_are_cached_separately(self):
+        self.save("alice", 80.0)
+        self.save("bob", 40.0)
+        alice, bob = canvas_store.get_snapshot("alice"), canvas_store.get_snapshot("bob")
+        self.save("bob", 45.0)
+        self.assertIs(canvas_store.get_snapshot("alice"), alice)
+        self.assertIsNot(canvas_store.get_snapshot("bob"), bob)
+        self.assertIsNone(canvas_store.get_snapshot("carol"))
+
+    def test_memory_budget_evicts_the_least_recently_used_account(self):
+        self.save("alice", 80.0)
+        self.save("bob", 40.0)
+        self.cache.budget = canvas_store.get_snapshot("alice").nbytes + 1
+        canvas_store.get_snapshot("bob")
+        stats = self.cache.stats()
+        self.assertEqual((stats["accounts"], stats["evictions"]), (1, 1))
+        self.assertLessEqual(stats["bytes"], self.cache.budget)
+        # an evicted account is simply read again
+        self.assertAlmostEqual(canvas_store.get_snapshot("alice").category_means()["exams"], 80.0)
+
+
+# ------------------ Syllabus Parser ------------------
+def weights(projects, assignments, exams, participation=0.0):
+    return {"projects": projects, "assignments": assignments, "exams": exams, "participation": participation}
+
+
+class SyllabusParserTests(SimpleTestCase):
+    CASES = [
+        # (syllabus text, expected weights or None, minimum confidence)
+        ("Exams 40%, Projects 25%, Homework 30%, Participation 5%", weights(25, 30, 40, 5), 1.0),
+        ("Final Project 30%, Homework 40%, Midterm 30%", weights(30, 40, 30), 1.0),
+        ("Final Paper 20%, Quizzes 30%, Labs 50%", weights(50, 20, 30), 1.0),
+        ("Test 1 - 15%\nTest 2 - 15%\nFinal Exam - 30%\nHomework - 40%", weights(0, 40, 60), 1.0),
+        ("40% Exams\n35% Problem sets\n25% Lab reports", weights(25, 35, 40), 1.0),
+        ("Homework ..... 300 points\nMidterm ..... 300 points\nFinal ..... 400 points", weights(0, 30, 70), 0.85),
+        ("Homework 20% Quizzes 10% Midterm 30% Final 40%", weights(0, 20, 80), 1.0),
+        ("Exams: 50% (2 x 25%); Project: 50%\nLate work: 10% per day", weights(50, 0, 50), 0.8),
+        ("Grading scale: A 93-100%, B 85-92%, C 75-84%", None, 0.0),
+        ("90 - 100%: A\n80 - 89%: B\n70 - 79%: C", None, 0.0),
+        ("Your grade reflects overall effort across the term.", None, 0.0),
+    ]
+
+    def test_breakdowns(self):
+        for text, expected, min_confidence in self.CASES:
+            with self.subTest(text=text):
+                result = parse_grading_breakdown(text)
+                self.assertEqual(result.weights, expected)
+                self.assertGreaterEqual(result.confidence, min_confidence)
+                if expected is None:
+                    self.assertEqual(result.confidence, 0.0)
+
+    def test_incomplete_breakdown_is_not_trusted(self):
+        result = parse_grading_breakdown("Exams 40%, Homework 20%")
+        self.assertLess(result.confidence, ai_service.SYLLABUS_PARSER_MIN_CONFIDENCE)
+
+    def test_standardize_category(self):
+        for name, category in [
+            ("Final Exam", "exams"),
+            ("Final", "exams"),
+            ("Midterm 2", "exams"),
+            ("Final Project", "projects"),
+            ("Midterm Project Report", "projects"),
+            ("Final Paper", "assignments"),
+            ("Lab Quiz", "exams"),
+            ("Quiz Lab", "projects"),
+            ("Discussion Posts", "participation"),
+            ("Problem Sets", "assignments"),
+            ("Misc", "assignments"),
+            ("", "assignments"),
+        ]:
+            with self.subTest(name=name):
+                self.assertEqual(standardize_category(name), category)
+
+
+# ------------------ Scoring Rules ------------------
+def strengths(percent, punctual=50.0):
+    return {
+        "category_strengths": {c: percent for c in scoring.CATEGORIES},
+        "overall_strength": percent,
+        "punctual_strength": punctual,
+    }
+
+
+class StrengthsEngineTests(SimpleTestCase):
+    def test_missing_categories_take_the_fallback(self):
+        result = scoring.score_strengths({"exams": 70.0, "projects": None, "assignments": 90.0}, 80.0)
+        self.assertEqual(result["category_strengths"],
+                         {"projects": 80.0, "assignments": 90.0, "exams": 70.0, "participation": 80.0})
+        self.assertAlmostEqual(result["overall_strength"], 80.0)
+        self.assertEqual(result["punctual_strength"], 100.0)
+
+    def test_batch_matches_single_scoring(self):
+        histories = [
+            ({"exams": 55.5, "projects": 99.0, "assignments": 70.0, "participation": 100.0}, 85.0),
+            ({}, 72.0),
+            ({"participation": 0.0}, 90.0),
+        ]
+        batch = scoring.score_strengths_batch([m for m, _ in histories], [d for _, d in histories])
+        self.assertEqual(batch, [scoring.score_strengths(m, d) for m, d in histories])
+        self.assertEqual(batch[1]["overall_strength"], 72.0)
+        self.assertEqual(scoring.score_strengths_batch([], []), [])
+
+    def test_local_mode_makes_no_llm_call(self):
+        with OfflineEnvironment(FakeCanvas(courses=1), FakeOpenAI(), FakeRMP(), FakeSupabase()) as env:
+            result = ai_service.compute_strengths({"exams": 70.0}, 80.0, mode="local")
+            self.assertEqual(env.openai.total_calls, 0)
+        self.assertNotIn("_note", result)
+
+    def test_llm_mode_falls_back_to_the_local_engine(self):
+        with OfflineEnvironment(FakeCanvas(courses=1), UnavailableOpenAI(), FakeRMP(), FakeSupabase()) as env:
+            result = ai_service.compute_strengths({"exams": 70.0}, 80.0, mode="llm")
+            self.assertEqual(env.openai.total_calls, 1)
+        self.assertTrue(result.pop("_note").startswith("AI strengths fallback due to:"))
+        self.assertEqual(result, scoring.score_strengths({"exams": 70.0}, 80.0))
+
+
+class ScorePredictionTests(SimpleTestCase):
+    def test_difficulty_bands(self):
+        bands = [(None, 0), (2.69, 0), (2.7, -1), (3.29, -1), (3.3, -2), (3.99, -2), (4.0, -3), (5.0, -3)]
+        for difficulty, drag in bands:
+            with self.subTest(difficulty=difficulty):
+                result = scoring.score_prediction(strengths(80.0), None, {"avg_difficulty": difficulty})
+                self.assertEqual(result["final_score"], 80.0 + drag)
+
+    def test_margin_bands(self):
+        for wta, margin in [(None, 5.0), (0.0, 6.0), (29.9, 6.0), (30.0, 4.0), (100.0, 4.0), ("n/a", 5.0)]:
+            with self.subTest(wta=wta):
+                result = scoring.score_prediction(strengths(80.0), None, {"would_take_again_percent": wta})
+                self.assertEqual(result["margin_of_error"], margin)
+                self.assertEqual(result["range"], [80.0 - margin, 80.0 + margin])
+
+    def test_bonuses(self):
+        self.assertEqual(scoring.score_prediction(strengths(80.0, punctual=90.0), None, None)["final_score"], 80.0)
+        self.assertEqual(scoring.score_prediction(strengths(80.0, punctual=95.0), None, None)["final_score"], 82.0)
+        self.assertEqual(scoring.score_prediction(strengths(80.0), None, None, extra_credit=True)["final_score"], 83.0)
+
+    def test_clamped_to_0_100(self):
+        high = scoring.score_prediction(strengths(100.0, punctual=100.0), None, None, extra_credit=True)
+        self.assertEqual(high["final_score"], 100.0)
+        self.assertEqual(high["range"], [95.0, 100.0])
+
+        low = scoring.score_prediction(strengths(1.0), None, {"avg_difficulty": 5.0})
+        self.assertEqual(low["final_score"], 0.0)
+        self.assertEqual(low["range"], [0.0, 5.0])
+
+    def test_weights(self):
+        # weighted by the syllabus, normalized to 100
+        uneven = strengths(50.0)
+        uneven["category_strengths"]["projects"] = 100.0
+        result = scoring.score_prediction(uneven, {"projects": 1, "assignments": 1, "exams": 2, "participation": 0}, None)
+        self.assertEqual(result["final_score"], 62.5)
+        self.assertEqual(result["projects"], 25.0)
+
+        # any missing or unusable category falls back to the default split
+        unusable = [None, {"projects": 50, "exams": 50}, dict.fromkeys(scoring.CATEGORIES, "x"),
+                    dict.fromkeys(scoring.CATEGORIES, 0)]
+        for weights in unusable:
+            with self.subTest(weights=weights):
+                self.assertEqual(scoring.resolve_weights(weights), scoring.DEFAULT_WEIGHTS)
+
+    def test_missing_strength_defaults_to_85(self):
+        result = scoring.score_prediction({"category_strengths": {}, "punctual_strength": 50.0}, None, None)
+        self.assertEqual(result["final_score"], 85.0)
+
+    def test_batch_matches_single(self):
+        weights = [None, {"projects": 10, "assignments": 20, "exams": 60, "participation": 10}]
+        rmps = [{"avg_difficulty": 4.2, "would_take_again_percent": 20}, {"avg_difficulty": 3.0}]
+        batch = scoring.score_predictions_batch(strengths(77.0), weights, rmps, [True, False])
+        singles = [scoring.score_prediction(strengths(77.0), w, r, e) for w, r, e in zip(weights, rmps, [True, False])]
+        self.assertEqual(batch, singles)
+
+
+# ------------------ Prediction Log Writer ------------------
+class PredictionLogWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.supabase = FakeSupabase().start()
+        self.addCleanup(self.supabase.stop)
+        for name, value in (("SUPABASE_URL", self.supabase.url), ("SUPABASE_KEY", FAKE_SUPABASE_KEY)):
+            patcher = mock.patch.object(supabase_service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool = supabase_service.LogSpool(Path(tmp.name) / "spool.sqlite3")
+
+    def writer(self):
+        return supabase_service.PredictionLogWriter(batch_size=10, flush_interval=0.05, spool=self.spool)
+
+    def written(self):
+        return sorted(str(r["professor_id"]) for r in self.supabase.tables.get("prediction", []))
+
+    def log(self, writer, *professor_ids):
+        for professor_id in professor_ids:
+            writer.enqueue({"professor_id": professor_id, "course_name": "CS 0401"})
+        self.assertTrue(writer.flush(5.0))
+
+    def test_outage_spools_then_replays(self):
+        writer = self.writer()
+        self.supabase.available = False
+        with self.assertLogs("predictor.supabase_service", "WARNING"):
+            self.log(writer, 1, 2, 3)
+        self.assertEqual(self.written(), [])
+        self.assertEqual(len(self.spool), 3)
+
+        self.supabase.available = True
+        self.log(writer, 4)
+        self.assertEqual(self.written(), ["1", "2", "3", "4"])
+        self.assertEqual(len(self.spool), 0)
+        self.assertEqual(writer.stats()["replayed"], 3)
+
+    def test_rejected_row_is_quarantined(self):
+        writer = self.writer()
+        with self.assertLogs("predictor.supabase_service", "ERROR"):
+            self.log(writer, 1, "abc", 3)
+        self.assertEqual(self.written(), ["1", "3"])
+        self.assertEqual(len(self.spool), 0)
+        [(row, error)] = self.spool.rejected()
+        self.assertEqual(row["professor_id"], "abc")
+        self.assertIn("22P02", error)
+
+    def test_rejected_row_does_not_block_the_spool(self):
+        writer = self.writer()
+        self.supabase.available = False
+        with self.assertLogs("predictor.supabase_service", "WARNING"):
+            self.log(writer, 1, "abc", 3)
+        self.supabase.available = True
+        with self.assertLogs("predictor.supabase_service", "ERROR"):
+            self.log(writer, 4)
+        self.assertEqual(self.written(), ["1", "3", "4"])
+        self.assertEqual(len(self.spool), 0)
+        self.assertEqual(len(self.spool.rejected()), 1)
+
+    def test_new_writer_replays_a_previous_spool(self):
+        self.spool.push([{"professor_id": 1}, {"professor_id": 2}])
+        self.log(self.writer(), 3)
+        self.assertEqual(self.written(), ["1", "2", "3"])
+        self.assertEqual(len(self.spool), 0)
+
+    def test_spool_keeps_the_newest_rows(self):
+        self.spool.max_rows = 3
+        self.assertEqual(self.spool.push([{"professor_id": i} for i in range(1, 5)]), 1)
+        self.assertEqual(self.spool.push([{"professor_id": 5}]), 1)
+        self.assertEqual([row["professor_id"] for _, row in self.spool.peek(10)], [3, 4, 5])
+
+        for i in range(5):
+            self.spool.reject({"professor_id": f"bad{i}"}, "22P02")
+        self.assertEqual([row["professor_id"] for row, _ in self.spool.rejected()], ["bad2", "bad3", "bad4"])
+
+    def test_full_spool_drops_the_oldest_rows(self):
+        self.spool.max_rows = 2
+        writer = self.writer()
+        self.supabase.available = False
+        with self.assertLogs("predictor.supabase_service", "WARNING") as logs:
+            self.log(writer, 1, 2, 3)
+        self.assertIn("dropped the 1 oldest rows", "\n".join(logs.output))
+        self.assertEqual(writer.stats()["dropped"], 1)
+
+        self.supabase.available = True
+        self.log(writer, 4)
+        self.assertEqual(self.written(), ["2", "3", "4"])
+
+    def test_unconfigured_writer_drops_rows_without_spooling(self):
+        self.spool.push([{"professor_id": 1}])
+        with mock.patch.object(supabase_service, "SUPABASE_KEY", None):
+            writer = self.writer()
+            with self.assertLogs("predictor.supabase_service", "WARNING") as logs:
+                self.log(writer, 2, 3)
+                self.log(writer, 4)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Supabase credentials missing", logs.output[0])
+        stats = writer.stats()
+        self.assertEqual((stats["dropped"], stats["spooled"], stats["failures"]), (3, 0, 0))
+        # rows spooled while configured are kept for a configured process
+        self.assertEqual(len(self.spool), 1)
+        self.assertEqual(self.written(), [])
+
+    def test_counters_are_exact_under_concurrent_producers(self):
+        writer = self.writer()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: writer.enqueue({"professor_id": i, "course_name": "CS 0401"}), range(400)))
+        self.assertTrue(writer.flush(10.0))
+        stats = writer.stats()
+        self.assertEqual((stats["enqueued"], stats["inserted"]), (400, 400))
+
+
+# ------------------ Single-flight ------------------
+class SingleFlightTests(SimpleTestCase):
+    CALLERS = 6
+
+    def setUp(self):
+        self.group = SingleFlight("test")
+        self.release = threading.Event()
+        self.calls = 0
+
+    def wait_for(self, stat, value):
+        deadline = time.monotonic() + 5.0
+        while self.group.stats()[stat] < value:
+            self.assertLess(time.monotonic(), deadline, f"{stat} never reached {value}")
+            time.sleep(0.005)
+
+    def blocking_call(self, result=None, error=None):
+        self.calls += 1
+        self.assertTrue(self.release.wait(5.0))
+        if error is not None:
+            raise error
+        return result
+
+    def run_callers(self, call):
+        """Run CALLERS calls at once, holding the leader until every follower has joined it."""
+        with ThreadPoolExecutor(max_workers=self.CALLERS) as pool:
+            futures = [pool.submit(call) for _ in range(self.CALLERS)]
+            self.wait_for("coalesced", self.CALLERS - 1)
+            self.release.set()
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result(5.0))
+                except Exception as e:
+                    outcomes.append(e)
+        return outcomes
+
+    def test_threads_share_one_call(self):
+        results = self.run_callers(lambda: self.group.do("key", self.blocking_call, {"score": 90}))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"score": 90}] * self.CALLERS)
+        # every follower gets its own copy
+        self.assertEqual(len({id(r) for r in results}), self.CALLERS)
+        self.assertEqual(self.group.stats(), {"calls": 6, "upstream": 1, "coalesced": 5, "errors": 0, "in_flight": 0})
+
+    def test_threads_share_one_error(self):
+        errors = self.run_callers(lambda: self.group.do("key", self.blocking_call, error=ValueError("upstream down")))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors), errors)
+        self.assertEqual(self.group.stats()["errors"], 1)
+
+    def test_nothing_is_cached_after_the_call(self):
+        self.release.set()
+        self.group.do("key", self.blocking_call, 1)
+        self.group.do("key", self.blocking_call, 2)
+        self.group.do("other", self.blocking_call, 3)
+        self.assertEqual(self.calls, 3)
+
+    async def async_call(self, result=None, error=None):
+        self.calls += 1
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        if error is not None:
+            raise error
+        return result
+
+    def test_coroutines_share_one_call_across_event_loops(self):
+        # each caller on its own loop, like async views under WSGI
+        results = self.run_callers(lambda: asyncio.run(self.group.do_async("key", self.async_call, [1, 2])))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [[1, 2]] * self.CALLERS)
+        self.assertEqual(self.group.stats()["in_flight"], 0)
+
+    def test_coroutines_share_one_error(self):
+        async def gather():
+            return await asyncio.gather(
+                *(self.group.do_async("key", self.async_call, error=ValueError("upstream down"))
+                  for _ in range(self.CALLERS)),
+                return_exceptions=True,
+            )
+
+        self.release.set()
+        errors = asyncio.run(gather())
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors), errors)
+        self.assertEqual(self.group.stats()["errors"], 1)
+
+
+# ------------------ Predict Grade Pipeline ------------------
+class UnavailableOpenAI(FakeOpenAI):
+    def route(self, method, path, query, body, headers):
+        return 503, {}, {"error": {"message": "overloaded"}}
+
+
+class PredictPipelineTests(SimpleTestCase):
+    def start(self, openai=None, rmp=None):
+        env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), openai or FakeOpenAI(), rmp or FakeRMP(),
+                                 FakeSupabase(), use_prediction_cache=True)
+        env.__enter__()
+        self.addCleanup(env.__exit__, None, None, None)
+        self.client = Client()
+        self.assertEqual(self.client.get("/api/canvas/all-data/?wait=25").status_code, 200)
+        return env
+
+    def predict(self, path="/api/predict-grade/", **payload):
+        payload = {"professor_id": 1, "syllabus_text": PARSEABLE_SYLLABUS.format(e=40, p=25, h=30), **payload}
+        return self.client.post(path, json.dumps(payload), content_type="application/json")
+
+    def test_body_must_be_a_json_object(self):
+        self.start()
+        for path in ("/api/predict-grade/", "/api/predict-grade/stream/"):
+            for body in ("[1, 2]", '"x"', "3", "{"):
+                response = self.client.post(path, body, content_type="application/json")
+                self.assertEqual(response.status_code, 400, (path, body))
+                self.assertEqual(response.json(), {"error": "Request body must be a JSON object."})
+
+    def test_slow_rmp_times_out_to_its_fallback(self):
+        self.start(rmp=FakeRMP(latency=1.0))
+        with mock.patch.dict(os.environ, {"STAGE_TIMEOUT_RMP": "0.1"}):
+            response = self.predict()
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["rmp"], {"error": "rmp timed out after 0.1s"})
+        self.assertIsNotNone(body["final_score"])
+        self.assertFalse(body["advice"].startswith("(Advice unavailable"))
+
+    def test_failing_openai_degrades_advice_only(self):
+        env = self.start(openai=UnavailableOpenAI())
+        first = self.predict()
+        self.assertEqual(first.status_code, 200)
+        body = first.json()
+        self.assertTrue(body["advice"].startswith("(Advice unavailable due to error:"))
+        self.assertIsNotNone(body["final_score"])
+        self.assertIsNotNone(body["rmp"].get("avg_difficulty"))
+        self.assertEqual(env.openai.calls["POST /v1/chat/completions"], 1)
+
+        # a degraded response is never memoized
+        self.assertFalse(self.predict().json()["cached"])
+        self.assertEqual(env.openai.calls["POST /v1/chat/completions"], 2)
+
+    def test_failing_openai_degrades_weights_to_defaults(self):
+        self.start(openai=UnavailableOpenAI())
+        response = self.predict(syllabus_text=FREEFORM_SYLLABUS)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()["final_score"])
+
+
+# ------------------ Predict Grade (batch) ------------------
+class BatchPredictTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), FakeOpenAI(), FakeRMP(), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.client = Client()
+        self.assertEqual(self.client.get("/api/canvas/all-data/?wait=25").status_code, 200)
+
+    def batch(self, body):
+        return self.client.post("/api/predict-grade/batch/", json.dumps(body), content_type="application/json")
+
+    def syllabus(self, exams):
+        return PARSEABLE_SYLLABUS.format(e=exams, p=25, h=70 - exams)
+
+    def test_results_keep_request_order_with_per_item_errors(self):
+        items = [
+            {"professor_id": 1, "syllabus_text": self.syllabus(20)},
+            "not an object",
+            {"professor_id": "abc", "syllabus_text": self.syllabus(20)},
+            {"professor_id": 2, "syllabus_text": self.syllabus(50), "canvas_course_id": 1001},
+            {"syllabus_text": self.syllabus(20)},
+        ]
+        response = self.batch({"items": items})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        results = body["results"]
+
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(body["errors"], 2)
+        self.assertEqual(results[1]["error"], "Invalid item: item must be an object")
+        self.assertEqual(results[2]["error"], "Invalid item: professor_id and canvas_course_id must be integers")
+        self.assertNotIn("error", results[0])
+        self.assertIsNone(results[0]["advice"])
+        self.assertIsNone(results[4]["rmp"])
+        self.assertEqual(results[3]["course_name"], "Benchmark Course 1")
+        self.assertEqual(results[3]["exams"], 50.0)
+        self.assertEqual(results[0]["exams"], 20.0)
+
+        # one RMP lookup per distinct professor, no LLM call for parseable syllabi
+        self.assertEqual(self.env.rmp.total_calls, 2)
+        self.assertEqual(self.env.openai.total_calls, 0)
+
+    def test_items_match_single_predictions(self):
+        item = {"professor_id": 1, "syllabus_text": self.syllabus(40)}
+        single = self.client.post("/api/predict-grade/", json.dumps(item), content_type="application/json").json()
+        batched = self.batch({"items": [item]}).json()["results"][0]
+        for field in ("final_score", "margin_of_error", "range", "exams", "projects", "assignments"):
+            self.assertEqual(batched[field], single[field], field)
+
+    def test_item_cap_and_request_shape(self):
+        item = {"syllabus_text": self.syllabus(20)}
+        cap = views.BATCH_MAX_ITEMS
+        self.assertEqual(self.batch({"items": [item] * cap}).status_code, 200)
+        response = self.batch({"items": [item] * (cap + 1)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": f"At most {cap} items per batch."})
+
+        for body in ({}, {"items": []}, {"items": "x"}):
+            self.assertEqual(self.batch(body).status_code, 400, body)
+        for body in ([1, 2], "x"):
+            response = self.batch(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.json(), {"error": "Request body must be a JSON object."})
+
+    def test_all_items_invalid(self):
+        response = self.batch({"items": [1, None]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["errors"], 2)
+
+
+# ------------------ Predict Grade (streamed) ------------------
+def sse_events(chunks):
+    text = b"".join(c if isinstance(c, bytes) else c.encode() for c in chunks).decode()
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class PredictStreamTests(SimpleTestCase):
+    def start(self, openai=None):
+        self.env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), openai or FakeOpenAI(), FakeRMP(),
+                                      FakeSupabase(), use_prediction_cache=True)
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.client = Client()
+        self.assertEqual(self.client.get("/api/canvas/all-data/?wait=25").status_code, 200)
+        self.body = json.dumps({"professor_id": 1, "syllabus_text": PARSEABLE_SYLLABUS.format(e=40, p=25, h=30)})
+
+    def stream(self):
+        response = self.client.post("/api/predict-grade/stream/", self.body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        return sse_events(response.streaming_content if response.streaming else [response.content])
+
+    def test_event_sequence(self):
+        self.start()
+        events = self.stream()
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "prediction")
+        self.assertEqual(names[-1], "done")
+        self.assertEqual(set(names[1:-1]), {"advice"})
+        self.assertGreater(len(names), 3)
+
+        prediction, done = events[0][1], events[-1][1]
+        self.assertFalse(prediction["cached"])
+        self.assertIsNone(prediction["advice"])
+        self.assertIsNotNone(prediction["final_score"])
+        advice = "".join(data["delta"] for _, data in events[1:-1])
+        self.assertEqual(done["advice"], advice)
+        self.assertEqual(advice.strip(), FAKE_ADVICE)
+        self.assertEqual(set(done["prompt_tokens"]), {"advice"})
+
+        # same numbers as the blocking endpoint
+        blocking = self.client.post("/api/predict-grade/", self.body, content_type="application/json").json()
+        self.assertTrue(blocking["cached"])
+        self.assertEqual(blocking["final_score"], prediction["final_score"])
+        self.assertEqual(blocking["advice"], FAKE_ADVICE)
+
+    def test_memo_hit_is_replayed(self):
+        self.start()
+        self.stream()
+        calls = self.env.openai.total_calls
+        events = self.stream()
+        self.assertEqual([name for name, _ in events], ["prediction", "advice", "done"])
+        self.assertTrue(events[0][1]["cached"])
+        self.assertEqual(events[1][1], {"delta": FAKE_ADVICE})
+        self.assertEqual(events[2][1], {"advice": FAKE_ADVICE, "prompt_tokens": {}})
+        self.assertEqual(self.env.openai.total_calls, calls)
+
+    def test_openai_error_becomes_an_advice_event(self):
+        self.start(openai=UnavailableOpenAI())
+        events = self.stream()
+        self.assertEqual([name for name, _ in events], ["prediction", "advice", "done"])
+        self.assertIsNotNone(events[0][1]["final_score"])
+        self.assertTrue(events[1][1]["delta"].startswith("(Advice unavailable due to error:"))
+        self.assertEqual(events[2][1]["advice"], events[1][1]["delta"])
+        # failed advice is not memoized
+        self.assertFalse(self.stream()[0][1]["cached"])
+
+    def test_error_after_partial_advice_keeps_the_text(self):
+        self.start()
+
+        def broken(*args, **kwargs):
+            yield "Start early."
+            raise RuntimeError("connection reset")
+
+        with mock.patch.object(views, "compute_advice_stream", broken):
+            events = self.stream()
+        self.assertEqual([name for name, _ in events], ["prediction", "advice", "advice", "done"])
+        self.assertEqual(events[-1][1]["advice"], "Start early.(Advice unavailable due to error: connection reset)")
+        self.assertFalse(self.stream()[0][1]["cached"])
+
+    async def test_event_sequence_under_asgi(self):
+        await asyncio.to_thread(self.start)
+        response = await AsyncClient().post("/api/predict-grade/stream/", self.body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        chunks = [chunk async for chunk in response.streaming_content]
+        events = sse_events(chunks)
+        self.assertEqual([events[0][0], events[-1][0]], ["prediction", "done"])
+        self.assertEqual(events[-1][1]["advice"].strip(), FAKE_ADVICE)
+
+
+# ------------------ Prediction Memo ------------------
+class PredictionCacheTests(SimpleTestCase):
+    def test_key_covers_every_input(self):
+        base = ("alice", 3, 1, "Exams 40%, Homework 60%", 1001)
+        key = prediction_cache.prediction_key(*base)
+        self.assertEqual(prediction_cache.prediction_key("alice", 3, "1", "Exams 40%,\n  Homework 60%", "1001"), key)
+        for i, other in enumerate(("bob", 4, 2, "Exams 50%, Homework 50%", 1002)):
+            changed = list(base)
+            changed[i] = other
+            self.assertNotEqual(prediction_cache.prediction_key(*changed), key, other)
+        with mock.patch.object(prediction_cache, "STRENGTHS_MODE", "llm"):
+            self.assertNotEqual(prediction_cache.prediction_key(*base), key)
+
+    def test_entries_expire_and_are_evicted(self):
+        cache = prediction_cache.PredictionCache(max_entries=2, ttl=60)
+        for key in ("a", "b", "c"):
+            cache.set(key, "alice", {"key": key})
+        self.assertEqual((cache.get("a"), cache.get("c")), (None, {"key": "c"}))
+
+        cache.ttl = -1
+        cache.set("d", "alice", {})
+        self.assertIsNone(cache.get("d"))
+        # "d" evicted "b" and was dropped once found expired
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_invalidate_one_account_or_all(self):
+        cache = prediction_cache.PredictionCache()
+        cache.set("a1", "alice", {})
+        cache.set("a2", "alice", {})
+        cache.set("b1", "bob", {})
+        cache.invalidate("alice")
+        self.assertEqual([cache.get(k) is not None for k in ("a1", "a2", "b1")], [False, False, True])
+        cache.invalidate()
+        self.assertIsNone(cache.get("b1"))
+        self.assertEqual(cache.stats()["invalidated"], 3)
+
+
+class PredictionMemoTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), FakeOpenAI(), FakeRMP(), FakeSupabase(),
+                                      use_prediction_cache=True)
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.client = Client()
+        self.sync()
+        self.body = json.dumps({"professor_id": 1, "syllabus_text": PARSEABLE_SYLLABUS.format(e=40, p=25, h=30)})
+
+    def sync(self):
+        self.assertEqual(self.client.get("/api/canvas/all-data/?full=1&wait=25").status_code, 200)
+
+    def predict(self):
+        response = self.client.post("/api/predict-grade/", self.body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeat_is_served_without_upstream_calls(self):
+        first = self.predict()
+        calls = self.env.upstream_calls()
+        second = self.predict()
+        self.assertEqual((first["cached"], second["cached"]), (False, True))
+        self.assertEqual({**second, "cached": False}, first)
+        self.assertEqual(self.env.upstream_calls(), calls)
+
+    def test_a_sync_drops_the_accounts_predictions(self):
+        self.predict()
+        self.sync()
+        self.assertEqual(prediction_cache.get_prediction_cache().stats()["entries"], 0)
+        self.assertFalse(self.predict()["cached"])
+
+    def test_other_accounts_syncs_keep_the_memo(self):
+        self.predict()
+        canvas_store.invalidate("someone-else")
+        self.assertTrue(self.predict()["cached"])
+        canvas_store.invalidate()
+        self.assertFalse(self.predict()["cached"])
+
+
+# ------------------ Prediction History ------------------
+def cursor_for(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+class PredictionHistoryTests(SimpleTestCase):
+    def setUp(self):
+        self.supabase = FakeSupabase().start()
+        self.addCleanup(self.supabase.stop)
+        for name, value in (
+            ("SUPABASE_URL", self.supabase.url),
+            ("SUPABASE_KEY", FAKE_SUPABASE_KEY),
+            ("_read_client", None),
+            ("_history_cache", llm_cache.MemoryLRU(ttl=supabase_service.HISTORY_CACHE_TTL)),
+        ):
+            patcher = mock.patch.object(supabase_service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # ten rows per month, sharing one timestamp, so pages split ties
+        self.rows = self.supabase.tables["prediction"] = [
+            {"id": i, "timestamp": f"2024-0{1 + (i - 1) // 10}-01T00:00:00+00:00", "professor_id": i % 3,
+             "course_name": f"CS {i % 2}", "final_score": 70.0 + i}
+            for i in range(1, 26)
+        ]
+
+    def newest_first(self, rows):
+        return [r["id"] for r in sorted(rows, key=lambda r: (r["timestamp"], r["id"]), reverse=True)]
+
+    def all_pages(self, **filters):
+        ids, cursor, pages = [], None, 0
+        while True:
+            page = supabase_service.fetch_prediction_history(cursor=cursor, **filters)
+            ids += [r["id"] for r in page["items"]]
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids, pages
+
+    def test_cursor_pages_through_everything_once(self):
+        ids, pages = self.all_pages(limit=7)
+        self.assertEqual(ids, self.newest_first(self.rows))
+        self.assertEqual(pages, 4)
+
+    def test_exact_last_page_has_no_cursor(self):
+        ids, pages = self.all_pages(limit=5)
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(pages, 5)
+
+    def test_filters(self):
+        ids, _ = self.all_pages(professor_id=1, course_name="CS 1", limit=2)
+        self.assertEqual(ids, self.newest_first([r for r in self.rows if r["professor_id"] == 1 and r["id"] % 2]))
+
+        page = supabase_service.fetch_prediction_history(since="2024-02-01T00:00:00+00:00", until="2024-03-01")
+        self.assertEqual([r["id"] for r in page["items"]], list(range(20, 10, -1)))
+
+        page = supabase_service.fetch_prediction_history(fields=["final_score"], limit=1)
+        self.assertEqual(page["items"], [{"id": 25, "timestamp": "2024-03-01T00:00:00+00:00", "final_score": 95.0}])
+
+    def test_bad_arguments(self):
+        for kwargs in ({"fields": ["password"]}, {"since": "yesterday"}, {"until": "2024-13-01"}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                supabase_service.fetch_prediction_history(**kwargs)
+
+    def test_decode_cursor_rejects_anything_but_a_timestamp_and_id(self):
+        row = {"timestamp": "2024-01-01T00:00:00+00:00", "id": 7}
+        self.assertEqual(supabase_service.decode_cursor(supabase_service.encode_cursor(row)), (row["timestamp"], 7))
+        for cursor in (
+            "zzz",
+            cursor_for({"timestamp": "2024-01-01", "id": 1}),
+            cursor_for(["2024-01-01", "1),id.gt.(0"]),
+            cursor_for(["2024-01-01", True]),
+            cursor_for(["2024-01-01\"),id.gt.(0", 1]),
+            cursor_for([20240101, 1]),
+        ):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                supabase_service.decode_cursor(cursor)
+
+    def test_endpoint(self):
+        client = Client()
+        response = client.get("/api/predictions/history/?limit=2&professor_id=0&fields=course_name")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["id"] for r in response.json()["items"]], [24, 21])
+
+        for query in ("limit=x", "professor_id=abc", "fields=password", "cursor=" + cursor_for(["x", 1])):
+            with self.subTest(query=query):
+                self.assertEqual(client.get(f"/api/predictions/history/?{query}").status_code, 400)
+
+
+# ------------------ RMP Cache ------------------
+class RMPCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=1), FakeOpenAI(), FakeRMP(), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        for patcher in (
+            mock.patch.object(rmp_service, "RMP_CACHE_TTL", 100.0),
+            mock.patch.object(rmp_service, "RMP_CACHE_MAX_STALE", 1000.0),
+            mock.patch.dict(rmp_service.counters, dict.fromkeys(rmp_service.counters, 0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def seed(self, professor_id, age, **fields):
+        prof = self.env.rmp.professor(professor_id)
+        for name, value in fields.items():
+            setattr(prof, name, value)
+        rmp_store.upsert_professors([rmp_store.professor_row(prof, fetched_at=time.time() - age)])
+
+    def wait_for_refreshes(self, count):
+        deadline = time.monotonic() + 5.0
+        while rmp_service.counters["refreshes"] + rmp_service.counters["errors"] < count or rmp_service._refreshing:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+    def test_miss_then_fresh_hit(self):
+        first = rmp_service.get_professor_info(7)
+        self.assertEqual(first["name"], "Alan Prof7")
+        self.assertEqual(rmp_service.get_professor_info(7), first)
+        self.assertEqual(self.env.rmp.calls["fetch_a_professor"], 1)
+        self.assertEqual((rmp_service.counters["misses"], rmp_service.counters["fresh_hits"]), (1, 1))
+
+    def test_stale_row_is_served_then_refreshed_once(self):
+        self.seed(7, age=500, avg_difficulty=1.0)
+        self.env.rmp.latency = 0.1
+        results = [rmp_service.get_professor_info(7) for _ in range(5)]
+        # answered from the old row without waiting on the scrape
+        self.assertTrue(all(r["avg_difficulty"] == 1.0 for r in results))
+        self.wait_for_refreshes(1)
+        self.assertEqual(self.env.rmp.calls["fetch_a_professor"], 1)
+        self.assertEqual(rmp_service.counters["stale_hits"], 5)
+
+        self.assertEqual(rmp_service.get_professor_info(7)["avg_difficulty"], self.env.rmp.professor(7).avg_difficulty)
+        self.assertEqual(rmp_service.counters["fresh_hits"], 1)
+
+    def test_failed_refresh_keeps_the_stale_row(self):
+        self.seed(7, age=500, avg_difficulty=1.0)
+        with mock.patch.object(RateMyProfessor_Database_APIs, "fetch_a_professor", side_effect=OSError("blocked")):
+            with self.assertLogs("predictor.rmp_service", "WARNING"):
+                self.assertEqual(rmp_service.get_professor_info(7)["avg_difficulty"], 1.0)
+                self.wait_for_refreshes(1)
+        self.assertEqual(rmp_service.counters["errors"], 1)
+        self.assertEqual(rmp_service.get_professor_info(7)["avg_difficulty"], 1.0)
+
+    def test_expired_row_is_refetched_before_answering(self):
+        self.seed(7, age=5000, avg_difficulty=1.0)
+        self.assertEqual(rmp_service.get_professor_info(7)["avg_difficulty"], self.env.rmp.professor(7).avg_difficulty)
+        self.assertEqual(rmp_service.counters["misses"], 1)
+
+    def test_expired_row_beats_a_failed_fetch(self):
+        self.seed(7, age=5000, avg_difficulty=1.0)
+        with mock.patch.object(RateMyProfessor_Database_APIs, "fetch_a_professor", side_effect=OSError("blocked")):
+            self.assertEqual(rmp_service.get_professor_info(7)["avg_difficulty"], 1.0)
+            self.assertEqual(rmp_service.get_professor_info(8), {"error": "blocked"})
+
+
+# ------------------ Professor Search ------------------
+def professor(legacy_id, first, last, school_id=1381, num_ratings=10):
+    return {
+        "legacy_id": legacy_id, "first_name": first, "last_name": last, "department": "Computer Science",
+        "school_id": school_id, "school_name": "Benchmark University", "avg_rating": 4.0, "num_ratings": num_ratings,
+    }
+
+
+class ProfessorIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = professor_search.ProfessorIndex([
+            professor(1, "John", "Smith", num_ratings=5),
+            professor(2, "Johnny", "Smithers", num_ratings=50),
+            professor(3, "Jane", "Smith", school_id=999),
+            professor(4, "José", "O'Neil-Smith"),
+            professor(5, "Joan", "Smyth", num_ratings=80),
+            professor(6, "", ""),
+        ])
+
+    def ids(self, query, **kwargs):
+        return [r["professor_id"] for r in self.index.search(query, **kwargs)]
+
+    def prefix_ids(self, query):
+        # prefix hits score above 2, fuzzy fill-ins below 1
+        return {r["professor_id"] for r in self.index.search(query) if r["score"] >= 2.0}
+
+    def test_prefix_tokens_in_any_order(self):
+        self.assertEqual(self.prefix_ids("jo sm"), {1, 2, 4, 5})
+        self.assertEqual(self.prefix_ids("smi jo"), {1, 2, 4})
+        self.assertEqual(self.prefix_ids("JANE"), {3})
+        self.assertEqual(len(self.index), 5)
+
+    def test_whole_name_outranks_prefix_and_popularity(self):
+        self.assertEqual(self.ids("john smith")[0], 1)
+        # among equal prefix hits, the more rated professor first
+        self.assertEqual(self.ids("joh")[:2], [2, 1])
+
+    def test_accents_and_punctuation_are_normalized(self):
+        self.assertEqual(self.prefix_ids("jose oneil"), {4})
+        self.assertEqual(self.ids("José O’Neil Smith")[0], 4)
+
+    def test_typos_fall_back_to_trigrams_below_prefix_hits(self):
+        self.assertEqual(self.prefix_ids("smitters"), set())
+        ids = self.ids("smitters")
+        self.assertEqual(ids[0], 2)
+        # the three Smiths tie on similarity; more ratings first
+        self.assertEqual(ids[1:4], [4, 3, 1])
+        results = self.index.search("smyth")
+        self.assertEqual(results[0]["professor_id"], 5)
+        self.assertGreater(results[0]["score"], 2.0)
+        self.assertTrue(all(r["score"] < 2.0 for r in results[1:]))
+        self.assertEqual(self.ids("xqzv"), [])
+
+    def test_school_filter_limit_and_empty_query(self):
+        self.assertEqual(self.ids("smith", school_id=999), [3])
+        self.assertNotIn(3, self.ids("smith", school_id=1381))
+        self.assertEqual(len(self.ids("j", limit=2)), 2)
+        self.assertEqual(self.ids("  '' "), [])
+
+
+class ProfessorSearchRebuildTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=1), FakeOpenAI(), FakeRMP(school_size=5), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        patcher = mock.patch.object(professor_search, "SEARCH_INDEX_CHECK_INTERVAL", 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, query):
+        response = Client().get("/api/professors/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [r["name"] for r in response.json()["results"]]
+
+    def test_index_follows_the_store(self):
+        self.assertEqual(self.names("ada"), [])
+        rmp_service.warm_school(1381)
+        self.assertEqual(self.names("ada prof5")[0], "Ada Prof5")
+        index = professor_search.get_index()
+        self.assertIs(professor_search.get_index(), index)
+
+        # a professor scraped on demand (a predict-grade miss) becomes searchable
+        rmp_service.get_professor_info(42)
+        self.assertEqual(self.names("prof42")[0], "Alan Prof42")
+        self.assertIsNot(professor_search.get_index(), index)
+
+    def test_index_is_rechecked_only_after_the_interval(self):
+        rmp_service.warm_school(1381)
+        self.assertEqual(self.names("prof1")[0], "Grace Prof1")
+        with mock.patch.object(professor_search, "SEARCH_INDEX_CHECK_INTERVAL", 3600.0):
+            rmp_service.get_professor_info(42)
+            self.assertNotIn("Alan Prof42", self.names("prof42"))
+        self.assertEqual(self.names("prof42")[0], "Alan Prof42")
+
+    def test_bad_parameters(self):
+        response = Client().get("/api/professors/search/", {"q": "ada", "limit": "many"})
+        self.assertEqual(response.status_code, 400)
+
+
+# ------------------ Prompt Compaction ------------------
+GRADED_SYLLABUS = """CS 101 Syllabus
+Office hours: Tuesdays 2-4pm in Room 204, or by appointment
+Grading Policy
+Homework | 25
+Projects | 35
+Exams | 40
+
+Week 1: Introduction and setup
+Extra credit: up to 2% for attending the research talks
+Late work loses 10% per day
+"""
+
+
+class PromptCompactionTests(SimpleTestCase):
+    def test_relevant_syllabus_keeps_only_the_grading_lines(self):
+        relevant = prompt_compaction.relevant_syllabus(GRADED_SYLLABUS, 200)
+        self.assertEqual(relevant.splitlines(), [
+            "Grading Policy", "Homework | 25", "Projects | 35", "Exams | 40",
+            "Extra credit: up to 2% for attending the research talks", "Late work loses 10% per day",
+        ])
+
+    def test_relevant_syllabus_stays_within_budget(self):
+        padded = GRADED_SYLLABUS + "".join(f"Quiz {i} is worth 1% of the grade\n" for i in range(500))
+        for budget in (5, 50, 300):
+            relevant = prompt_compaction.relevant_syllabus(padded, budget)
+            self.assertLessEqual(prompt_compaction.estimate_tokens(relevant), budget, budget)
+        self.assertTrue(prompt_compaction.relevant_syllabus(padded, 300).startswith("Grading Policy"))
+
+    def test_relevant_syllabus_falls_back_to_the_head_of_the_text(self):
+        text = "Welcome to the course\n\nWe meet on Mondays\n" + "Read the chapter before class\n" * 100
+        relevant = prompt_compaction.relevant_syllabus(text, 20)
+        self.assertTrue(relevant.startswith("Welcome to the course\nWe meet on Mondays\nRead"))
+        self.assertLessEqual(prompt_compaction.estimate_tokens(relevant), 20)
+
+    def test_fit_messages_trims_only_the_longest_message(self):
+        messages = [{"role": "system", "content": "Return JSON only."}, {"role": "user", "content": "x" * 4000}]
+        self.assertIs(prompt_compaction.fit_messages(messages, 2000), messages)
+
+        fitted = prompt_compaction.fit_messages(messages, 100)
+        self.assertLessEqual(prompt_compaction.messages_tokens(fitted), 100)
+        self.assertEqual(fitted[0], messages[0])
+        self.assertEqual(fitted[1]["role"], "user")
+        self.assertEqual(len(messages[1]["content"]), 4000)
+
+    def test_requests_fit_the_template_budget(self):
+        syllabus = GRADED_SYLLABUS + "Week 2: more material covered in lecture\n" * 2000
+        request = ai_service.weights_request(syllabus)
+        self.assertLessEqual(prompt_compaction.messages_tokens(request.messages), prompt_compaction.prompt_budget("weights"))
+        self.assertGreater(request.raw_tokens, prompt_compaction.messages_tokens(request.messages))
+
+        with mock.patch.dict(os.environ, {"PROMPT_TOKEN_BUDGET_ADVICE": "60"}):
+            advice = ai_service.advice_request({"final_score": 91.5}, {"category_strengths": {}}, "CS 101", {})
+        self.assertLessEqual(prompt_compaction.messages_tokens(advice.messages), 60)
+
+    def test_cache_key_uses_the_compacted_syllabus(self):
+        key = ai_service.weights_request(GRADED_SYLLABUS).key
+        moved = GRADED_SYLLABUS.replace("Tuesdays 2-4pm in Room 204", "Fridays 9-11am over Zoom")
+        self.assertEqual(ai_service.weights_request(moved).key, key)
+        self.assertEqual(ai_service.weights_request(moved + "Week 9: review\n").key, key)
+        self.assertNotEqual(ai_service.weights_request(GRADED_SYLLABUS.replace("| 35", "| 30")).key, key)
+
+
+# ------------------ LLM Cache ------------------
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "llm_cache.sqlite3"
+
+    def test_key_ignores_whitespace_but_not_the_prompt_version(self):
+        key = llm_cache.cache_key("gpt-4o-mini", "weights", 1, {"syllabus": "Exams 40%,\r\n  Homework 60%"})
+        self.assertEqual(key, llm_cache.cache_key("gpt-4o-mini", "weights", 1, {"syllabus": "Exams 40%, Homework 60%"}))
+        for other in (
+            ("gpt-4o", "weights", 1, {"syllabus": "Exams 40%, Homework 60%"}),
+            ("gpt-4o-mini", "weights", 2, {"syllabus": "Exams 40%, Homework 60%"}),
+            ("gpt-4o-mini", "advice", 1, {"syllabus": "Exams 40%, Homework 60%"}),
+            ("gpt-4o-mini", "weights", 1, {"syllabus": "Exams 45%, Homework 55%"}),
+        ):
+            self.assertNotEqual(llm_cache.cache_key(*other), key, other)
+
+    def test_memory_tier_expires_and_evicts(self):
+        memory = llm_cache.MemoryLRU(max_entries=2, ttl=60)
+        memory.set("a", "1")
+        memory.set("b", "2")
+        memory.get("a")
+        memory.set("c", "3")
+        self.assertEqual((memory.get("a"), memory.get("b"), memory.get("c")), ("1", None, "3"))
+
+        memory.set("old", "x", expires_at=time.time() - 1)
+        self.assertIsNone(memory.get("old"))
+
+    def test_persistent_hit_is_promoted_to_memory(self):
+        llm_cache.LLMCache(persistent=llm_cache.SQLiteBackend(self.path)).set("k", "v")
+        # another worker process: empty memory, same file
+        cache = llm_cache.LLMCache(persistent=llm_cache.SQLiteBackend(self.path))
+        self.assertEqual(cache.get("k"), "v")
+        self.assertEqual(cache.get("k"), "v")
+        self.assertIsNone(cache.get("missing"))
+        stats = cache.stats()
+        self.assertEqual((stats["persistent_hits"], stats["memory_hits"], stats["misses"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], round(2 / 3, 4))
+
+    def test_expired_rows_are_not_served_and_can_be_pruned(self):
+        backend = llm_cache.SQLiteBackend(self.path, ttl=60)
+        backend.set("old", "x", expires_at=time.time() - 1)
+        backend.set("new", "y")
+        self.assertIsNone(llm_cache.LLMCache(persistent=backend).get("old"))
+        self.assertEqual(backend.prune(), 1)
+        self.assertEqual(backend.get("new")[0], "y")
+
+    def test_a_broken_persistent_tier_is_a_miss(self):
+        backend = llm_cache.SQLiteBackend(self.path)
+        cache = llm_cache.LLMCache(persistent=backend)
+        with mock.patch.object(backend, "get", side_effect=sqlite3.OperationalError("disk I/O error")):
+            self.assertIsNone(cache.get("k"))
+        with mock.patch.object(backend, "set", side_effect=sqlite3.OperationalError("database is locked")):
+            cache.set("k", "v")
+        self.assertEqual(cache.get("k"), "v")
+        self.assertEqual(cache.stats()["errors"], 2)
+
+    def test_completions_are_served_from_the_cache(self):
+        syllabus = FREEFORM_SYLLABUS.format(i=1)
+        with OfflineEnvironment(FakeCanvas(courses=1), FakeOpenAI(), FakeRMP(), FakeSupabase(),
+                                use_llm_cache=True) as env:
+            self.assertEqual(ai_service.extract_weights(syllabus), (FAKE_WEIGHTS, "llm", None))
+            self.assertEqual(ai_service.extract_weights(syllabus.replace(" ", "  ") + "\r\n"), (FAKE_WEIGHTS, "llm", None))
+            self.assertEqual(env.openai.calls["POST /v1/chat/completions"], 1)
+
+            with mock.patch.object(ai_service, "LLM_CACHE_ENABLED", False):
+                ai_service.extract_weights(syllabus)
+            self.assertEqual(env.openai.calls["POST /v1/chat/completions"], 2)
+
+    def test_failed_or_unparseable_completions_are_not_cached(self):
+        syllabus = FREEFORM_SYLLABUS.format(i=1)
+        with OfflineEnvironment(FakeCanvas(courses=1), UnavailableOpenAI(), FakeRMP(), FakeSupabase(),
+                                use_llm_cache=True):
+            self.assertEqual(ai_service.extract_weights(syllabus)[1], "default")
+            self.assertEqual(llm_cache.get_cache().stats()["sets"], 0)
+            with self.assertRaises(ValueError):
+                ai_service.cache_completion("weights", "k", "not json")
+            self.assertIsNone(llm_cache.get_cache().get("k"))
+
+
+# ------------------ Batch Precompute ------------------
+class BatchPrecomputeTests(SimpleTestCase):
+    CHAT = "POST /v1/chat/completions"
+
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=1), FakeOpenAI(batch_polls=2), FakeRMP(), FakeSupabase(),
+                                      use_llm_cache=True)
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.syllabi = [FREEFORM_SYLLABUS.format(i=1), FREEFORM_SYLLABUS.format(i=3)]
+
+    def test_batch_output_answers_later_chats(self):
+        requests = llm_batch.pending([ai_service.weights_request(text) for text in self.syllabi + self.syllabi[:1]])
+        self.assertEqual(len(requests), 2)
+
+        [batch] = llm_batch.submit(requests)
+        batch = llm_batch.wait(batch.id, poll_interval=0.01)
+        self.assertEqual(batch.status, "completed")
+        report = llm_batch.load_results(batch)
+        self.assertEqual((report["cached"], report["failed"]), (2, 0))
+        self.assertGreater(report["usage"]["prompt_tokens"], 0)
+
+        self.assertEqual(llm_batch.pending(requests), [])
+        for text in self.syllabi:
+            self.assertEqual(ai_service.extract_weights(text), (FAKE_WEIGHTS, "llm", None))
+        self.assertEqual(self.env.openai.calls[self.CHAT], 0)
+
+    def test_failed_and_unusable_lines_are_not_cached(self):
+        weights = ai_service.weights_request(self.syllabi[0])
+
+        def line(custom_id, status_code=200, content="{}", error=None):
+            body = {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10}}
+            return {"custom_id": custom_id, "response": {"status_code": status_code, "body": body}, "error": error}
+
+        lines = {
+            "output": [
+                line(llm_batch.custom_id(weights), content="not json"),
+                line("advice:k1", status_code=500),
+                line("advice:k2", content="Start early."),
+            ],
+            "errors": [line("advice:k3", error={"code": "batch_expired"})],
+        }
+        with mock.patch.object(llm_batch, "_jsonl", lambda file_id: lines.get(file_id, [])):
+            report = llm_batch.load_results(SimpleNamespace(output_file_id="output", error_file_id="errors"))
+
+        self.assertEqual((report["cached"], report["failed"]), (1, 3))
+        self.assertEqual(report["usage"]["prompt_tokens"], 10)
+        self.assertEqual([e["custom_id"] for e in report["errors"]],
+                         [llm_batch.custom_id(weights), "advice:k1", "advice:k3"])
+        self.assertIsNone(llm_cache.get_cache().get(weights.key))
+        self.assertEqual(llm_cache.get_cache().get("k2"), "Start early.")
+
+    def test_command_batches_only_uncached_freeform_syllabi(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        catalog = Path(tmp.name) / "catalog.json"
+        (Path(tmp.name) / "s1.txt").write_text(self.syllabi[0] + "\n")
+        catalog.write_text(json.dumps([
+            {"syllabus_file": "s1.txt"},
+            {"syllabus_text": self.syllabi[0]},
+            {"syllabus_text": self.syllabi[1], "professor_id": 7},
+            {"syllabus_text": PARSEABLE_SYLLABUS.format(e=40, p=25, h=30)},
+        ]))
+
+        def run():
+            out, err = StringIO(), StringIO()
+            call_command("precompute_llm_cache", catalog=str(catalog), poll_interval=0.01, stdout=out, stderr=err)
+            self.assertIn("catalog: ignoring professor_id (only syllabus weights are precomputed)", err.getvalue())
+            return out.getvalue()
+
+        self.assertIn("weights: 2 distinct requests, 0 already cached, 2 to batch", run())
+        self.assertIn("weights: 2 distinct requests, 2 already cached, 0 to batch", run())
+        self.assertEqual(self.env.openai.calls["POST /v1/batches"], 1)
+        self.assertEqual(self.env.openai.calls[self.CHAT], 0)
+
+    def test_command_rejects_malformed_catalogs(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        catalog = Path(tmp.name) / "catalog.json"
+        for content, message in [
+            ("{}", "expected a JSON list"),
+            ('["syllabus"]', "catalog entry 0: expected an object"),
+            ('[{"syllabus_file": "missing.txt"}]', "catalog entry 0:"),
+        ]:
+            catalog.write_text(content)
+            with self.subTest(content=content), self.assertRaisesMessage(CommandError, message):
+                call_command("precompute_llm_cache", catalog=str(catalog), stdout=StringIO())
+
+
+# ------------------ Metrics ------------------
+_SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)'
+    r'(?:\{(?P<labels>[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*)\})?'
+    r' (?P<value>\S+)$'
+)
+
+
+def parse_exposition(text):
+    """{family: (type, [(sample name, labels, value)])}, failing on anything malformed."""
+    families, current = {}, None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in families, f"family {name} declared twice"
+            assert kind in ("counter", "gauge", "histogram"), line
+            families[name], current = (kind, []), name
+            continue
+        match = _SAMPLE.match(line)
+        assert match, f"malformed sample: {line!r}"
+        name = match.group("name")
+        suffixes = ("_bucket", "_sum", "_count") if families[current][0] == "histogram" else ()
+        assert name == current or name in [current + s for s in suffixes], f"{name} outside its family {current}"
+        families[current][1].append((name, match.group("labels") or "", float(match.group("value"))))
+    return families
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), FakeOpenAI(), FakeRMP(), FakeSupabase())
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.client = Client()
+        self.assertEqual(self.client.get("/api/canvas/all-data/?wait=25").status_code, 200)
+
+    def predict(self, **headers):
+        payload = {"professor_id": 1, "syllabus_text": FREEFORM_SYLLABUS.format(i=1)}
+        return self.client.post("/api/predict-grade/", json.dumps(payload), content_type="application/json", **headers)
+
+    def test_metrics_endpoint_renders_valid_exposition_text(self):
+        self.assertEqual(self.predict().status_code, 200)
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        families = parse_exposition(response.content.decode())
+
+        kind, samples = families["predictor_request_seconds"]
+        self.assertEqual(kind, "histogram")
+        self.assertTrue(any('route="api/predict-grade/"' in labels for _, labels, _ in samples))
+        for family, (kind, samples) in families.items():
+            if kind != "histogram":
+                continue
+            series = {}
+            for name, labels, value in samples:
+                key = re.sub(r',?le="[^"]*"', "", labels)
+                series.setdefault(key, {"buckets": [], "count": None})
+                if name.endswith("_bucket"):
+                    series[key]["buckets"].append(value)
+                elif name.endswith("_count"):
+                    series[key]["count"] = value
+            for key, s in series.items():
+                with self.subTest(family=family, labels=key):
+                    self.assertEqual(s["buckets"], sorted(s["buckets"]))
+                    self.assertEqual(s["buckets"][-1], s["count"])
+
+    def test_timing_headers_are_exposed_to_the_browser(self):
+        response = self.predict(HTTP_ORIGIN="http://localhost:5173")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertRegex(response["X-Prompt-Tokens"], r"weights;before=\d+;after=\d+")
+        exposed = {h.strip().lower() for h in response["Access-Control-Expose-Headers"].split(",")}
+        self.assertLessEqual({"server-timing", "x-prompt-tokens"}, exposed)
+
+
+# ------------------ Per-account Isolation ------------------
+class AccountIsolationTests(SimpleTestCase):
+    def setUp(self):
+        self.env = OfflineEnvironment(FakeCanvas(courses=2, page_size=50), FakeOpenAI(), FakeRMP(), FakeSupabase(),
+                                      use_prediction_cache=True)
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        patcher = mock.patch.object(canvas_client, "CANVAS_SINGLE_USER", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        self.payload = {"professor_id": 1, "syllabus_text": PARSEABLE_SYLLABUS.format(e=40, p=25, h=30)}
+
+    def sync(self, token):
+        response = self.client.get("/api/canvas/all-data/?wait=25", HTTP_X_CANVAS_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+
+    def predict(self, token):
+        return self.client.post("/api/predict-grade/", json.dumps(self.payload), content_type="application/json",
+                                HTTP_X_CANVAS_TOKEN=token)
+
+    def test_requests_without_a_token_are_refused(self):
+        for response in (
+            self.client.get("/api/canvas/courses/"),
+            self.client.get("/api/canvas/all-data/"),
+            self.client.post("/api/predict-grade/", json.dumps(self.payload), content_type="application/json"),
+        ):
+            self.assertEqual(response.status_code, 401)
+
+        with mock.patch.object(canvas_client, "CANVAS_SINGLE_USER", True):
+            self.assertEqual(self.client.get("/api/canvas/courses/").status_code, 200)
+
+    def test_snapshot_is_per_account(self):
+        self.sync("token-a")
+        self.assertEqual(self.predict("token-a").status_code, 200)
+        self.assertEqual(self.predict("token-b").status_code, 400)
+
+    def test_prediction_memo_is_per_account(self):
+        self.sync("token-a")
+        self.sync("token-b")
+        self.assertFalse(self.predict("token-a").json()["cached"])
+        self.assertTrue(self.predict("token-a").json()["cached"])
+        self.assertFalse(self.predict("token-b").json()["cached"])
+
+    def test_sync_job_is_per_account(self):
+        response = self.client.get("/api/canvas/all-data/", HTTP_X_CANVAS_TOKEN="token-a")
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url, HTTP_X_CANVAS_TOKEN="token-a").status_code, 200)
+        self.assertEqual(self.client.get(status_url, HTTP_X_CANVAS_TOKEN="token-b").status_code, 404)
+        self.assertEqual(self.client.get(status_url).status_code, 401)
+
+
+# ------------------ Sync Jobs ------------------
+class SyncJobRunnerTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.syncs = []
+        self.runner = sync_jobs.SyncJobRunner(sync=self.sync, retention=60)
+        self.alice = CanvasAccount("token-a", "alice")
+        self.bob = CanvasAccount("token-b", "bob")
+        self.addCleanup(self.release.set)
+
+    async def sync(self, incremental, progress, account):
+        self.syncs.append((account.key, incremental))
+        progress.start(2)
+        progress.advance(1)
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        progress.advance(2, "403 Forbidden" if account is self.bob else None)
+        if account.key == "broken":
+            raise RuntimeError("Canvas is down")
+        return [{"account": account.key, "incremental": incremental}]
+
+    def finish(self, *jobs):
+        self.release.set()
+        for job in jobs:
+            job.future.result(5.0)
+
+    def test_concurrent_requests_for_one_account_share_a_job(self):
+        job, created = self.runner.submit(self.alice)
+        self.assertTrue(created)
+        self.assertEqual(self.runner.submit(self.alice), (job, False))
+        other, created = self.runner.submit(self.bob)
+        self.assertTrue(created)
+        self.assertIsNot(other, job)
+        self.finish(job, other)
+        self.assertEqual(sorted(self.syncs), [("alice", True), ("bob", True)])
+        self.assertEqual(self.runner.stats()["deduplicated"], 1)
+
+    def test_full_sync_does_not_join_an_incremental_one(self):
+        incremental, _ = self.runner.submit(self.alice, incremental=True)
+        full, created = self.runner.submit(self.alice, incremental=False)
+        self.assertTrue(created)
+        # an incremental request is satisfied by either
+        self.assertIn(self.runner.submit(self.alice, incremental=True)[0], (incremental, full))
+        self.assertEqual(self.runner.submit(self.alice, incremental=False), (full, False))
+        self.finish(incremental, full)
+        self.assertEqual(sorted(self.syncs), [("alice", False), ("alice", True)])
+
+    def test_status_and_progress(self):
+        job, _ = self.runner.submit(self.bob)
+        deadline = time.monotonic() + 5.0
+        while job.to_dict()["courses_done"] < 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+        running = job.to_dict()
+        self.assertEqual((running["status"], running["courses_total"], running["finished_at"]), ("running", 2, None))
+        self.assertNotIn("result", running)
+
+        self.finish(job)
+        done = job.to_dict()
+        self.assertEqual(done["status"], "succeeded")
+        self.assertEqual(done["courses_done"], 2)
+        self.assertEqual(done["errors"], [{"course_id": 2, "error": "403 Forbidden"}])
+        self.assertEqual(done["result"], [{"account": "bob", "incremental": True}])
+        self.assertIsNotNone(done["finished_at"])
+
+    def test_failed_job(self):
+        job, _ = self.runner.submit(CanvasAccount("token-c", "broken"))
+        self.finish(job)
+        self.assertEqual((job.status, job.error), ("failed", "Canvas is down"))
+        self.assertNotIn("result", job.to_dict())
+        # a finished job no longer absorbs new requests
+        self.assertTrue(self.runner.submit(CanvasAccount("token-c", "broken"))[1])
+
+    def test_lookup_is_per_account_and_finished_jobs_expire(self):
+        job, _ = self.runner.submit(self.alice)
+        self.assertIs(self.runner.get(job.id, self.alice), job)
+        self.assertIsNone(self.runner.get(job.id, self.bob))
+
+        self.runner.retention = 0
+        # still running: never pruned
+        self.assertIs(self.runner.get(job.id, self.alice), job)
+        self.finish(job)
+        time.sleep(0.01)
+        self.assertIsNone(self.runner.get(job.id, self.alice))
+        self.assertEqual(self.runner.stats()["retained"], 0)
 
-# Create your tests here.
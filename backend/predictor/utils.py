@@ -14,10 +14,6 @@ def safe_int(val):
        return None
 
 
-def clamp(value, low=0.0, high=100.0):
-   return max(low, min(high, float(value)))
-
-
 def normalize_weights(weights):
    total = sum(weights.values())
    if total <= 0:
@@ -25,3 +21,41 @@ def normalize_weights(weights):
    return {k: (v * 100.0 / total) for k, v in weights.items()}
 
 
+# Shared grading-category taxonomy (Canvas assignment groups, syllabus headings)
+CATEGORY_KEYWORDS = {
+   "exams": ["exam", "midterm", "final", "quiz", "test"],
+   "projects": ["project", "capstone", "lab"],
+   "participation": ["participation", "attendance", "discussion", "poll", "peer"],
+}
+
+# headings that map to "assignments" on purpose (standardize_category's default)
+ASSIGNMENT_KEYWORDS = [
+   "homework", "assignment", "problem set", "pset", "hw", "essay", "paper",
+   "report", "reading", "response", "exercise", "writing", "reflection",
+   "journal", "presentation", "recitation", "worksheet", "portfolio",
+]
+
+# "Final Project", "Midterm Paper": these say when something is due, not
+# what it is, so they only decide the category when nothing else matches
+TIMING_KEYWORDS = ["final", "midterm"]
+
+
+def standardize_category(name: str) -> str:
+   n = (name or "").lower()
+
+   # when a heading names several kinds of work ("Lab Quiz"), the last
+   # keyword (the head noun) wins
+   best, best_end = None, -1
+   for category, keywords in CATEGORY_KEYWORDS.items():
+       for k in keywords:
+           start = n.rfind(k)
+           if start >= 0 and k not in TIMING_KEYWORDS and start + len(k) > best_end:
+               best, best_end = category, start + len(k)
+   if best:
+       return best
+
+   if any(k in n for k in ASSIGNMENT_KEYWORDS):
+       return "assignments"
+   if any(k in n for k in TIMING_KEYWORDS):
+       return "exams"
+   return "assignments"
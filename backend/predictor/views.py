@@ -1,18 +1,35 @@
+import functools
+import hashlib
+import json
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .supabase_service import log_prediction_to_db
+from .supabase_service import log_prediction_to_db, get_log_writer, fetch_prediction_history, HISTORY_DEFAULT_LIMIT
 
 
 from .canvas_service import (
-   fetch_courses,
-   fetch_all_data,
-   fetch_category_grades,
+   fetch_courses_async,
+   fetch_category_grades_async,
    load_cache_if_exists
 )
 
 
-from .rmp_service import get_professor_info
-from .ai_service import compute_strengths, compute_prediction, compute_advice
+from .canvas_client import CanvasAccount
+from .rmp_service import get_professor_info, cache_stats as rmp_cache_stats
+from .professor_search import search_professors
+from .ai_service import compute_strengths, compute_prediction, compute_advice, compute_advice_stream, extract_weights
+from .llm_cache import get_cache
+from .prediction_cache import PREDICTION_CACHE_ENABLED, get_prediction_cache, prediction_key
+from . import canvas_client
+from . import canvas_store
+from . import singleflight
+from . import sync_jobs
+from . import metrics
+from .pipeline import Degraded, Stage, run_pipeline, stage_timeout, iterate_in_thread
+from .scoring import score_strengths, score_prediction, score_predictions_batch, has_extra_credit
 
 
 
@@ -20,88 +37,238 @@ from .ai_service import compute_strengths, compute_prediction, compute_advice
 # ------------------ Health ------------------
 @api_view(["GET"])
 def health_check(_request):
-   return Response({"status": "ok"})
+   return Response({
+       "status": "ok",
+       "llm_cache": get_cache().stats(),
+       "prediction_cache": get_prediction_cache().stats(),
+       "prediction_log": get_log_writer().stats(),
+       "rmp_cache": rmp_cache_stats(),
+       "singleflight": singleflight.stats(),
+       "canvas_cache": canvas_store.cache_stats(),
+       "sync_jobs": sync_jobs.get_runner().stats(),
+   })
+
+
+
+
+# ------------------ Metrics ------------------
+# Prometheus text exposition (stage/request/upstream histograms, upstream
+# call and token counters, cache and coalescing stats).
+def metrics_view(_request):
+   return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 
 
 # ------------------ Canvas ------------------
-@api_view(["GET"])
-def get_canvas_courses(_request):
-   return Response(fetch_courses())
+# Each student sends their own Canvas token in X-Canvas-Token; it picks the
+# token used upstream and the student's own history store. Without it the
+# server's CANVAS_TOKEN account is used, but only in the single-user setup
+# (CANVAS_SINGLE_USER); otherwise the request gets a 401 (None here).
+def _canvas_account(request):
+   token = request.headers.get("X-Canvas-Token")
+   if not token and not canvas_client.CANVAS_SINGLE_USER:
+       return None
+   return CanvasAccount.for_token(token)
 
 
+def _canvas_token_required():
+   return JsonResponse({"error": "Send your Canvas access token in the X-Canvas-Token header."}, status=401)
 
 
-@api_view(["GET"])
-def get_canvas_all_data(_request):
-   return Response(fetch_all_data())
 
 
+# Async views on AsyncCanvasClient: under ASGI a request waiting on Canvas
+# holds no worker thread. The Canvas calls themselves run on one shared
+# loop (canvas_client.canvas_loop), so connections are pooled under WSGI too.
+@require_GET
+async def get_canvas_courses(request):
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   return JsonResponse(await fetch_courses_async(account), safe=False)
 
 
-@api_view(["GET"])
-def get_canvas_category_grades(_request, course_id: int):
-   return Response(fetch_category_grades(course_id))
 
 
+# The full sync runs as a background job (see sync_jobs.py): this starts
+# one, or joins the one already running for the account, and answers 202
+# with the job to poll. ?wait=<seconds> (max SYNC_MAX_WAIT) returns the
+# synced data directly if the job finishes within that time. Predictions
+# keep using the last stored snapshot until the job completes.
+SYNC_MAX_WAIT = 25.0
 
 
-# ------------------ Predict Grade ------------------
-@api_view(["POST"])
-def predict_grade(request):
-   professor_id = request.data.get("professor_id")
-   syllabus_text = (request.data.get("syllabus_text") or "").strip()
-   canvas_course_id = request.data.get("canvas_course_id")
+@require_GET
+async def get_canvas_all_data(request):
+   # incremental by default; ?full=1 forces a complete re-crawl
+   full = request.GET.get("full") in ("1", "true", "yes")
+   try:
+       wait = min(max(float(request.GET.get("wait", 0)), 0.0), SYNC_MAX_WAIT)
+   except ValueError:
+       return JsonResponse({"error": "wait must be a number of seconds."}, status=400)
+
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   job, created = sync_jobs.start_sync(account, incremental=not full)
+   if wait and await sync_jobs.wait_for(job, wait):
+       if job.status == sync_jobs.SUCCEEDED:
+           return JsonResponse(job.result, safe=False)
+       return JsonResponse({"job": job.to_dict()}, status=502)
+
+   return JsonResponse({
+       "job": job.to_dict(include_result=False),
+       "deduplicated": not created,
+       "status_url": f"/api/canvas/sync/{job.id}/",
+   }, status=202)
+
+
+
+
+@require_GET
+def get_canvas_sync_status(request, job_id):
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   job = sync_jobs.get_runner().get(job_id, account)
+   if job is None:
+       return JsonResponse({"error": "Unknown or expired sync job."}, status=404)
+   return JsonResponse(job.to_dict())
 
 
-   # load cached historical Canvas data
-   df = load_cache_if_exists()
-   if df is None:
-       return Response({"error": "No Canvas data cache found. Run /canvas/all-data first."}, status=400)
 
 
-   # compute average category strengths from history
-   category_means = {}
-   for cat in ["projects", "assignments", "exams", "participation"]:
-       if cat in df.columns:
-           valid = df[cat].dropna()
-           category_means[cat] = float(valid.mean()) if not valid.empty else None
-       else:
-           category_means[cat] = None
+@require_GET
+async def get_canvas_category_grades(request, course_id: int):
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   return JsonResponse(await fetch_category_grades_async(course_id, account))
 
 
+
+
+# ------------------ Professor Search ------------------
+# Typeahead over the local professor store (see warm_rmp_cache), e.g.
+#   GET /api/professors/search/?q=jon smi&school=1381&limit=10
+@api_view(["GET"])
+def search_professor(request):
+   query = request.query_params.get("q", "")
+   try:
+       limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+       school = request.query_params.get("school")
+       school_id = int(school) if school else None
+   except ValueError:
+       return Response({"error": "limit and school must be integers."}, status=400)
+
+   return Response({"query": query, "results": search_professors(query, limit=limit, school_id=school_id)})
+
+
+
+
+# ------------------ Predict Grade ------------------
+# predict_grade runs as an async DAG (see pipeline.py):
+#
+#   strengths ─┐
+#              ├─> prediction ─> advice ─> response
+#   rmp ───────┘                   (Supabase log is queued, written behind)
+#
+# Strengths and the RMP lookup overlap, and every stage has its own timeout
+# and fallback, so a slow upstream degrades one field instead of the request.
+def _request_data(request):
+   if request.content_type != "application/json":
+       return request.POST
+   data = json.loads(request.body or b"{}")
+   if not isinstance(data, dict):
+       raise ValueError("expected a JSON object")
+   return data
+
+
+def _history_inputs(snapshot):
+   # average category strengths from history (precomputed aggregates)
+   category_means = snapshot.category_means()
+
    # calculate fallback overall
    non_null_vals = [v for v in category_means.values() if v is not None]
    default_overall = float(sum(non_null_vals) / len(non_null_vals)) if non_null_vals else 85.0
+   return category_means, default_overall
+
+
+# The services fall back on their own (an {"error": ...} RMP pack, a
+# "_note" on a result scored with default weights); report that to the
+# pipeline so such a response counts as degraded and is never memoized.
+def _degraded_if(value, error):
+   if error:
+       raise Degraded(value, error)
+   return value
 
 
-   # AI: finalize strengths (with fallback)
+def _strengths(category_means, default_overall):
    strengths = compute_strengths(category_means, default_overall)
+   return _degraded_if(strengths, strengths.get("_note"))
 
 
-   # RMP enrichment
-   rmp_pack = get_professor_info(int(professor_id)) if professor_id else None
+def _professor_info(professor_id):
+   info = get_professor_info(int(professor_id))
+   return _degraded_if(info, info.get("error"))
 
 
-   # AI: produce weights + final grade + margin + range
+def _prediction(strengths, syllabus_text, rmp_pack):
    final = compute_prediction(strengths, syllabus_text, rmp_pack)
+   return _degraded_if(final, final.get("_note"))
 
 
-   # resolve course name (optional)
-   course_name = None
-   try:
-       if canvas_course_id:
-           row = df[df["course_id"] == int(canvas_course_id)]
-           if not row.empty:
-               course_name = str(row.iloc[0]["name"])
-   except:
-       course_name = None
+def _weights(syllabus_text):
+   extracted = extract_weights(syllabus_text)
+   return _degraded_if(extracted, extracted[2])
 
 
-   # AI: produce long-form advice
-   advice_text = compute_advice(final, strengths, course_name, rmp_pack)
-   log_prediction_to_db({
+def _strengths_stage(snapshot):
+   category_means, default_overall = _history_inputs(snapshot)
+   # local scoring engine (with fallback)
+   return Stage(
+       "strengths",
+       lambda: _strengths(category_means, default_overall),
+       timeout=stage_timeout("strengths", 20),
+       fallback=lambda e: {**score_strengths(category_means, default_overall), "_note": str(e)},
+   )
+
+
+def build_prediction_stages(snapshot, professor_id, syllabus_text, course_name):
+   return [
+       _strengths_stage(snapshot),
+       # RMP enrichment
+       Stage(
+           "rmp",
+           lambda: _professor_info(professor_id) if professor_id else None,
+           timeout=stage_timeout("rmp", 8),
+           fallback=lambda e: {"error": str(e)},
+       ),
+       # weights + final grade + margin + range
+       Stage(
+           "prediction",
+           lambda strengths, rmp: _prediction(strengths, syllabus_text, rmp),
+           deps=("strengths", "rmp"),
+           timeout=stage_timeout("prediction", 20),
+           fallback=lambda e, strengths, rmp: {
+               **score_prediction(strengths, None, rmp, extra_credit=has_extra_credit(syllabus_text)),
+               "_note": f"prediction fallback due to: {e}",
+           },
+       ),
+       # AI: produce long-form advice
+       Stage(
+           "advice",
+           lambda prediction, strengths, rmp: compute_advice(prediction, strengths, course_name, rmp),
+           deps=("prediction", "strengths", "rmp"),
+           timeout=stage_timeout("advice", 30),
+           fallback=lambda e, **_: f"(Advice unavailable due to error: {e})",
+       ),
+   ]
+
+
+def prediction_log_payload(professor_id, course_name, final, rmp_pack):
+   return {
        "professor_id": professor_id,
        "course_name": course_name,
        "final_score": final.get("final_score"),
@@ -110,11 +277,11 @@ def predict_grade(request):
        "rmp_difficulty": rmp_pack.get("avg_difficulty") if rmp_pack else None,
        "rmp_wta": rmp_pack.get("would_take_again_percent") if rmp_pack else None,
        "rmp_reliability": rmp_pack.get("reliability") if rmp_pack else None,
-   })
+   }
 
 
-  
-   return Response({
+def prediction_response(course_name, strengths, final, rmp_pack, advice_text):
+   return {
        "course_name": course_name,
        "category_strengths": strengths.get("category_strengths"),
        "overall_strength": strengths.get("overall_strength"),
@@ -128,12 +295,292 @@ def predict_grade(request):
        "participation": final.get("participation"),
        "rmp": rmp_pack,
        "advice": advice_text
-   })
+   }
+
+
+@csrf_exempt
+@require_POST
+async def predict_grade(request):
+   try:
+       data = _request_data(request)
+   except ValueError:
+       return JsonResponse({"error": "Request body must be a JSON object."}, status=400)
+
+   professor_id = data.get("professor_id")
+   syllabus_text = (data.get("syllabus_text") or "").strip()
+   canvas_course_id = data.get("canvas_course_id")
+
+
+   # load cached historical Canvas data (in-process snapshot of the local store)
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   with metrics.stage("canvas_snapshot"):
+       snapshot = load_cache_if_exists(account)
+   if snapshot is None:
+       return JsonResponse({"error": "No Canvas data cache found. Run /canvas/all-data first."}, status=400)
+
+
+   # an identical resubmission against the same sync is answered from memory
+   # (no LLM, RMP or Supabase work) and flagged "cached"
+   memo_key = None
+   if PREDICTION_CACHE_ENABLED:
+       memo_key = prediction_key(account.key, snapshot.version, professor_id, syllabus_text, canvas_course_id)
+       cached = get_prediction_cache().get(memo_key)
+       if cached is not None:
+           return JsonResponse({**cached, "cached": True})
+
+
+   # resolve course name (optional)
+   course = snapshot.get_course(canvas_course_id) if canvas_course_id else None
+   course_name = str(course["name"]) if course else None
+
+
+   result = await run_pipeline(build_prediction_stages(snapshot, professor_id, syllabus_text, course_name))
+   strengths, rmp_pack, final = result["strengths"], result["rmp"], result["prediction"]
+
+
+   # queued for the batched write-behind logger; never blocks the response
+   log_prediction_to_db(prediction_log_payload(professor_id, course_name, final, rmp_pack))
+
+
+   response = prediction_response(course_name, strengths, final, rmp_pack, result["advice"])
+   # a stage that fell back (timeout, upstream error, a service's own
+   # fallback) is not worth repeating
+   if memo_key is not None and not result.errors:
+       get_prediction_cache().set(memo_key, account.key, response)
+   return JsonResponse({**response, "cached": False})
 
 
-  
 
 
+# ------------------ Predict Grade (batch) ------------------
+# POST {"items": [{"professor_id", "syllabus_text", "canvas_course_id"}, ...]}
+#
+# Strengths are derived once for the whole request, each distinct professor
+# and syllabus is looked up once however many items share it, and every item
+# is then scored in one vectorized pass. Meant for comparing candidate
+# courses, so no advice is generated; invalid items get an "error" entry
+# without failing the rest.
+BATCH_MAX_ITEMS = 25
+
+
+def _syllabus_stage_name(text):
+   return "weights:" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _batch_item(raw):
+   if not isinstance(raw, dict):
+       raise ValueError("item must be an object")
+   professor_id = raw.get("professor_id")
+   course_id = raw.get("canvas_course_id")
+   try:
+       professor_id = int(professor_id) if professor_id not in (None, "") else None
+       course_id = int(course_id) if course_id not in (None, "") else None
+   except (TypeError, ValueError):
+       raise ValueError("professor_id and canvas_course_id must be integers")
+   return {
+       "professor_id": professor_id,
+       "canvas_course_id": course_id,
+       "syllabus_text": str(raw.get("syllabus_text") or "").strip(),
+   }
+
+
+def build_batch_stages(snapshot, items):
+   stages = [_strengths_stage(snapshot)]
+
+   for professor_id in sorted({i["professor_id"] for i in items if i["professor_id"]}):
+       stages.append(Stage(
+           f"rmp:{professor_id}",
+           functools.partial(_professor_info, professor_id),
+           timeout=stage_timeout("rmp", 8),
+           fallback=lambda e: {"error": str(e)},
+       ))
+
+   for text in {i["syllabus_text"] for i in items}:
+       stages.append(Stage(
+           _syllabus_stage_name(text),
+           functools.partial(_weights, text),
+           timeout=stage_timeout("prediction", 20),
+           fallback=lambda e: (None, "default", f"weight extraction fallback due to: {e}"),
+       ))
+
+   return stages
+
+
+@csrf_exempt
+@require_POST
+async def predict_grade_batch(request):
+   try:
+       data = _request_data(request)
+   except ValueError:
+       return JsonResponse({"error": "Request body must be a JSON object."}, status=400)
+
+   raw_items = data.get("items")
+   if not isinstance(raw_items, list) or not raw_items:
+       return JsonResponse({"error": "items must be a non-empty list."}, status=400)
+   if len(raw_items) > BATCH_MAX_ITEMS:
+       return JsonResponse({"error": f"At most {BATCH_MAX_ITEMS} items per batch."}, status=400)
+
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   with metrics.stage("canvas_snapshot"):
+       snapshot = load_cache_if_exists(account)
+   if snapshot is None:
+       return JsonResponse({"error": "No Canvas data cache found. Run /canvas/all-data first."}, status=400)
+
+   results = [None] * len(raw_items)
+   items = {}
+   for index, raw in enumerate(raw_items):
+       try:
+           items[index] = _batch_item(raw)
+       except (TypeError, ValueError) as e:
+           results[index] = {"index": index, "error": f"Invalid item: {e}"}
+
+   result = await run_pipeline(build_batch_stages(snapshot, list(items.values())))
+   strengths = result["strengths"]
+
+   # one vectorized scoring pass over every valid item
+   indices = list(items)
+   extracted = [result[_syllabus_stage_name(items[i]["syllabus_text"])] for i in indices]
+   rmp_packs = [result[f"rmp:{items[i]['professor_id']}"] if items[i]["professor_id"] else None for i in indices]
+   with metrics.stage("score"):
+       finals = score_predictions_batch(
+           strengths,
+           [weights for weights, _, _ in extracted],
+           rmp_packs,
+           [has_extra_credit(items[i]["syllabus_text"]) for i in indices],
+       )
+
+   for index, (_, source, note), rmp_pack, final in zip(indices, extracted, rmp_packs, finals):
+       item = items[index]
+       final["weights_source"] = source
+       if note:
+           final["_note"] = note
+
+       course = snapshot.get_course(item["canvas_course_id"]) if item["canvas_course_id"] else None
+       course_name = str(course["name"]) if course else None
+
+       log_prediction_to_db(prediction_log_payload(item["professor_id"], course_name, final, rmp_pack))
+       results[index] = {"index": index, **prediction_response(course_name, strengths, final, rmp_pack, None)}
+
+   return JsonResponse({"results": results, "errors": sum("error" in r for r in results)})
+
+
+
+
+# ------------------ Predict Grade (streamed) ------------------
+# Same inputs as /api/predict-grade/, answered as Server-Sent Events:
+#   event: prediction  -> every numeric field, sent as soon as scoring is done
+#   event: advice      -> {"delta": "..."} per generated chunk
+#   event: done        -> {"advice": "<full text>"}
+# Shares predict_grade's memo: a hit replays the stored response as one
+# prediction (with "cached": true), one advice and the done event.
+def _sse(event, data):
+   return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _advice_unavailable(e):
+   return f"(Advice unavailable due to error: {e})"
+
+
+def _sse_headers(response):
+   response["Cache-Control"] = "no-cache"
+   response["X-Accel-Buffering"] = "no"
+   return response
+
+
+def _replay_events(cached):
+   return "".join([
+       _sse("prediction", {**cached, "advice": None, "cached": True}),
+       _sse("advice", {"delta": cached["advice"]}),
+       _sse("done", {"advice": cached["advice"], "prompt_tokens": {}}),
+   ])
+
+
+@csrf_exempt
+@require_POST
+async def predict_grade_stream(request):
+   try:
+       data = _request_data(request)
+   except ValueError:
+       return JsonResponse({"error": "Request body must be a JSON object."}, status=400)
+
+   professor_id = data.get("professor_id")
+   syllabus_text = (data.get("syllabus_text") or "").strip()
+   canvas_course_id = data.get("canvas_course_id")
+
+   account = _canvas_account(request)
+   if account is None:
+       return _canvas_token_required()
+   with metrics.stage("canvas_snapshot"):
+       snapshot = load_cache_if_exists(account)
+   if snapshot is None:
+       return JsonResponse({"error": "No Canvas data cache found. Run /canvas/all-data first."}, status=400)
+
+   memo_key = None
+   if PREDICTION_CACHE_ENABLED:
+       memo_key = prediction_key(account.key, snapshot.version, professor_id, syllabus_text, canvas_course_id)
+       cached = get_prediction_cache().get(memo_key)
+       if cached is not None:
+           return _sse_headers(HttpResponse(_replay_events(cached), content_type="text/event-stream"))
+
+   course = snapshot.get_course(canvas_course_id) if canvas_course_id else None
+   course_name = str(course["name"]) if course else None
+
+   # everything up to the numeric prediction; advice is streamed below
+   stages = [s for s in build_prediction_stages(snapshot, professor_id, syllabus_text, course_name) if s.name != "advice"]
+   result = await run_pipeline(stages)
+   strengths, rmp_pack, final = result["strengths"], result["rmp"], result["prediction"]
+
+   log_prediction_to_db(prediction_log_payload(professor_id, course_name, final, rmp_pack))
+   response_body = prediction_response(course_name, strengths, final, rmp_pack, None)
+   head = _sse("prediction", {**response_body, "cached": False})
+   # X-Prompt-Tokens is already sent by the time advice streams, so the
+   # counts for this request go out in the done event instead
+   prompt_tokens = metrics.request_prompt_tokens()
+   advice = compute_advice_stream(final, strengths, course_name, rmp_pack, prompt_tokens)
+
+   def done(parts, failed):
+       advice_text = "".join(parts)
+       # memoized like predict_grade: only complete advice on a clean pipeline
+       if memo_key is not None and not failed and not result.errors:
+           get_prediction_cache().set(memo_key, account.key, {**response_body, "advice": advice_text.strip()})
+       return _sse("done", {
+           "advice": advice_text,
+           "prompt_tokens": {template: {"before": raw, "after": sent} for template, (raw, sent) in prompt_tokens.items()},
+       })
+
+   if isinstance(request, ASGIRequest):
+       async def events():
+           yield head
+           parts, failed = [], False
+           try:
+               async for delta in iterate_in_thread(advice):
+                   parts.append(delta)
+                   yield _sse("advice", {"delta": delta})
+           except Exception as e:
+               failed = True
+               parts.append(_advice_unavailable(e))
+               yield _sse("advice", {"delta": parts[-1]})
+           yield done(parts, failed)
+   else:
+       # WSGI buffers async iterators, so stream from a plain generator there
+       def events():
+           yield head
+           parts, failed = [], False
+           try:
+               for delta in advice:
+                   parts.append(delta)
+                   yield _sse("advice", {"delta": delta})
+           except Exception as e:
+               failed = True
+               parts.append(_advice_unavailable(e))
+               yield _sse("advice", {"delta": parts[-1]})
+           yield done(parts, failed)
+
+   return _sse_headers(StreamingHttpResponse(events(), content_type="text/event-stream"))
 
 
 
@@ -178,7 +625,32 @@ def explain_prediction(request):
    })
 
 
+# ------------------ Prediction History ------------------
+# GET /api/predictions/history/?limit=20&fields=final_score,course_name
+#     &professor_id=123&course_name=...&since=2024-01-01&until=2024-06-01
+# Follow "next_cursor" with ?cursor=... for older rows.
 @api_view(["GET"])
-def get_prediction_history(_request):
-   result = supabase.table("predictions").select("*").order("timestamp", desc=True).execute()
-   return Response(result.data)
+def get_prediction_history(request):
+   params = request.query_params
+   try:
+       professor = params.get("professor_id")
+       professor_id = int(professor) if professor else None
+       limit = int(params.get("limit", HISTORY_DEFAULT_LIMIT))
+   except ValueError:
+       return Response({"error": "limit and professor_id must be integers."}, status=400)
+
+   try:
+       page = fetch_prediction_history(
+           fields=[f for f in params.get("fields", "").split(",") if f] or None,
+           professor_id=professor_id,
+           course_name=params.get("course_name") or None,
+           since=params.get("since"),
+           until=params.get("until"),
+           cursor=params.get("cursor"),
+           limit=limit,
+       )
+   except ValueError as e:
+       return Response({"error": str(e)}, status=400)
+   except Exception as e:
+       return Response({"error": f"Prediction history unavailable: {e}"}, status=502)
+   return Response(page)
@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef } from "react";
-import axios from "axios";
+import { streamPrediction, searchProfessors } from "./api";
 import "./App.css"; // <- CSS file for styling
 
 // 🔹 Stable grade count-up (won't reset/glitch on re-renders)
@@ -107,6 +107,27 @@ function App() {
  const [syllabus, setSyllabus] = useState("");
  const [prediction, setPrediction] = useState(null);
  const [loading, setLoading] = useState(false);
+ const [professorMatches, setProfessorMatches] = useState([]);
+
+
+ // typeahead: a name (not a numeric ID) queries the professor index
+ useEffect(() => {
+   const query = professorId.trim();
+   if (query.length < 2 || /^\d+$/.test(query)) {
+     setProfessorMatches([]);
+     return;
+   }
+   const controller = new AbortController();
+   const timer = setTimeout(() => {
+     searchProfessors(query, { signal: controller.signal })
+       .then(setProfessorMatches)
+       .catch(() => {});
+   }, 120);
+   return () => {
+     clearTimeout(timer);
+     controller.abort();
+   };
+ }, [professorId]);
 
 
  const handleFinalPrediction = async (e) => {
@@ -123,13 +144,18 @@ function App() {
      };
 
 
-     const res = await axios.post(
-       "http://127.0.0.1:8000/api/predict-grade/",
-       payload
-     );
-     setPrediction(res.data);
+     // show the numbers as soon as they are scored; advice streams in after
+     await streamPrediction(payload, {
+       onPrediction: (data) => {
+         setPrediction({ ...data, advice: "" });
+         setLoading(false);
+       },
+       onAdvice: (delta) =>
+         setPrediction((prev) => ({ ...prev, advice: (prev?.advice || "") + delta })),
+       onDone: ({ advice }) => setPrediction((prev) => ({ ...prev, advice })),
+     });
    } catch (err) {
-     console.error("Prediction error:", err.response?.data || err.message);
+     console.error("Prediction error:", err.message);
    } finally {
      setLoading(false);
    }
@@ -157,9 +183,19 @@ function App() {
          type="text"
          value={professorId}
          onChange={(e) => setProfessorId(e.target.value)}
-         placeholder="Professor ID"
+         placeholder="Professor name or ID"
+         list="professor-matches"
          required
        />
+       <datalist id="professor-matches">
+         {professorMatches.map((m) => (
+           <option
+             key={m.professor_id}
+             value={m.professor_id}
+             label={`${m.name} — ${m.department || ""}${m.school ? `, ${m.school}` : ""}`}
+           />
+         ))}
+       </datalist>
        <input
          type="text"
          value={canvasCourseId}
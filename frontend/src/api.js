@@ -0,0 +1,53 @@
+const API_BASE = "http://127.0.0.1:8000/api";
+
+// Typeahead over the backend's local professor index.
+export async function searchProfessors(query, { limit = 8, signal } = {}) {
+  const params = new URLSearchParams({ q: query, limit });
+  const res = await fetch(`${API_BASE}/professors/search/?${params}`, { signal });
+  if (!res.ok) return [];
+  const data = await res.json();
+  return data.results || [];
+}
+
+// POST to the Server-Sent Events prediction endpoint and dispatch each event
+// as it arrives: the numeric prediction first, then advice text in chunks.
+export async function streamPrediction(payload, { onPrediction, onAdvice, onDone } = {}) {
+  const res = await fetch(`${API_BASE}/predict-grade/stream/`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    throw new Error(err.error || `HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+
+      const parsed = data ? JSON.parse(data) : null;
+      if (event === "prediction") onPrediction?.(parsed);
+      else if (event === "advice") onAdvice?.(parsed.delta);
+      else if (event === "done") onDone?.(parsed);
+    }
+  }
+}